@@ -0,0 +1,4 @@
+import time
+
+# when the app started importing; start-up time is reported relative to it
+IMPORT_STARTED = time.monotonic()
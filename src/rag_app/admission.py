@@ -0,0 +1,211 @@
+"""
+Admission control for the LLM-heavy endpoints (chat generation, PDF ingestion).
+
+Each `AdmissionController` bounds the requests running at once, overall and
+per user. A request over its user's limit is refused at once with 429: that
+user is already holding their share. A request over the global limit waits
+in a FIFO queue of at most `max_queue` requests, for at most
+`queue_timeout` seconds. A full queue or an expired wait is refused with
+503. Both refusals carry `Retry-After`, so clients back off instead of piling
+more work onto Ollama's own queue until its timeouts fire. A freed slot is
+handed straight to the oldest waiter, so new arrivals can't overtake the queue.
+
+Limits are per worker process (multiply by WEB_WORKERS for the whole server).
+`/metrics` exports the running and queued requests, the limit and the
+refusals of every controller; queue waits are timed as `admission_<name>`.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import suppress
+from typing import AsyncGenerator, Deque, Dict, Iterable, List, TypeVar
+
+from fastapi import HTTPException
+
+from rag_app.config import CONFIG
+from rag_app.tracing import observe, register_collector
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Rejected(HTTPException):
+    """Raised by `acquire` when a request is not admitted: a 429 / 503 response with Retry-After."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(status_code=status_code, detail=detail,
+                         headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """
+    One admitted request's slot. `release` is idempotent; a ticket dropped
+    without being released (say a streamed response that never started)
+    gives its slot back when it is garbage collected.
+    """
+
+    def __init__(self, controller: AdmissionController, user_id: str, loop: asyncio.AbstractEventLoop):
+        self._controller = controller
+        self._user_id = user_id
+        self._loop = loop
+        self._released = False
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._controller._release(self._user_id)
+        else:
+            with suppress(RuntimeError):  # loop already closed: nothing left to admit
+                self._loop.call_soon_threadsafe(self._controller._release, self._user_id)
+
+    def __enter__(self) -> Ticket:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+    def __del__(self):
+        self.release()
+
+
+class AdmissionController:
+    """Global and per-user concurrency limits with a bounded, deadline-limited wait queue; 0 disables a limit."""
+
+    def __init__(self, name: str, *, max_active: int, max_per_user: int = 0, max_queue: int = 0,
+                 queue_timeout: float = 0.0, retry_after: float = 5.0):
+        self.name = name
+        self.max_active = max_active
+        self.max_per_user = max_per_user
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # user -> requests running or queued
+        self._per_user: Dict[str, int] = {}
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"user_limit": 0, "queue_full": 0, "queue_timeout": 0}
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _reject(self, reason: str, status_code: int, detail: str) -> Rejected:
+        self.rejected[reason] += 1
+        logger.warning(f"Admission {self.name}: {detail}",
+                       extra={"admission": {"endpoint": self.name, "reason": reason, "active": self.active,
+                                            "queued": self.queued}})
+        return Rejected(status_code, detail, self.retry_after)
+
+    def _enter(self, user_id: str) -> None:
+        self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+
+    def _leave(self, user_id: str) -> None:
+        left = self._per_user.get(user_id, 0) - 1
+        if left > 0:
+            self._per_user[user_id] = left
+        else:
+            self._per_user.pop(user_id, None)
+
+    async def acquire(self, user_id: str) -> Ticket:
+        """A slot for one request of `user_id`, waiting in the queue if needed; raises `Rejected`."""
+        loop = asyncio.get_running_loop()
+        if 0 < self.max_per_user <= self._per_user.get(user_id, 0):
+            raise self._reject("user_limit", 429, f"Too many concurrent {self.name} requests for this user")
+        if self.max_active <= 0 or (self.active < self.max_active and not self._waiters):
+            self.active += 1
+            self._enter(user_id)
+            self.admitted += 1
+            return Ticket(self, user_id, loop)
+        if len(self._waiters) >= self.max_queue:
+            raise self._reject("queue_full", 503, f"Server at capacity for {self.name} requests")
+
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        self._enter(user_id)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout if self.queue_timeout > 0 else None)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                self._release(user_id)  # handed a slot just as it gave up: pass it on
+            else:
+                with suppress(ValueError):
+                    self._waiters.remove(waiter)
+                self._leave(user_id)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise self._reject("queue_timeout", 503, f"Timed out waiting for a {self.name} slot") from None
+        finally:
+            observe(f"admission_{self.name}", time.perf_counter() - start)
+        self.admitted += 1
+        return Ticket(self, user_id, loop)
+
+    def _release(self, user_id: str) -> None:
+        self._leave(user_id)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # the slot moves to the oldest waiter
+                return
+        self.active -= 1
+
+
+async def hold(ticket: Ticket, stream: AsyncGenerator[T, None]) -> AsyncGenerator[T, None]:
+    """`stream`, keeping `ticket`'s slot until it ends or is closed (which closes `stream` too)."""
+    try:
+        async for item in stream:
+            yield item
+    finally:
+        try:
+            await stream.aclose()
+        finally:
+            ticket.release()
+
+
+CHAT_ADMISSION = AdmissionController(
+    "chat",
+    max_active=CONFIG.CHAT_MAX_CONCURRENCY,
+    max_per_user=CONFIG.CHAT_MAX_PER_USER,
+    max_queue=CONFIG.ADMISSION_QUEUE_SIZE,
+    queue_timeout=CONFIG.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    retry_after=CONFIG.ADMISSION_RETRY_AFTER_SECONDS,
+)
+UPLOAD_ADMISSION = AdmissionController(
+    "upload",
+    max_active=CONFIG.UPLOAD_MAX_CONCURRENCY,
+    max_per_user=CONFIG.UPLOAD_MAX_PER_USER,
+    max_queue=CONFIG.ADMISSION_QUEUE_SIZE,
+    queue_timeout=CONFIG.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    retry_after=CONFIG.ADMISSION_RETRY_AFTER_SECONDS,
+)
+CONTROLLERS: List[AdmissionController] = [CHAT_ADMISSION, UPLOAD_ADMISSION]
+
+
+def _render_admission_metrics() -> Iterable[str]:
+    for name, kind, value in (("rag_admission_active", "gauge", lambda c: c.active),
+                              ("rag_admission_queued", "gauge", lambda c: c.queued),
+                              ("rag_admission_limit", "gauge", lambda c: c.max_active),
+                              ("rag_admission_admitted_total", "counter", lambda c: c.admitted)):
+        yield f"# TYPE {name} {kind}"
+        for controller in CONTROLLERS:
+            yield f'{name}{{endpoint="{controller.name}"}} {value(controller)}'
+    yield "# TYPE rag_admission_rejected_total counter"
+    for controller in CONTROLLERS:
+        for reason, count in sorted(controller.rejected.items()):
+            yield f'rag_admission_rejected_total{{endpoint="{controller.name}",reason="{reason}"}} {count}'
+
+
+register_collector(_render_admission_metrics)
@@ -1,9 +1,48 @@
-from typing import TypedDict, Annotated, List
+from datetime import datetime, timezone
+from typing import TypedDict, Annotated, List, NotRequired, Optional
 
-from langchain_core.messages import BaseMessage
-from langgraph.graph import add_messages
+from langchain_core.messages import BaseMessage, RemoveMessage, convert_to_messages
+from langgraph.graph.message import Messages, add_messages
+
+INTERACTION_ID = "interaction_id"
+TIMESTAMP = "timestamp"
+
+
+def _current_interaction_id(left: List[BaseMessage], right: List[BaseMessage]) -> Optional[str]:
+    # the turn's HumanMessage carries the interaction id; it is the newest human message
+    for message in reversed(right):
+        if message.type == "human":
+            return message.additional_kwargs.get(INTERACTION_ID)
+    for message in reversed(left):
+        if message.type == "human":
+            return message.additional_kwargs.get(INTERACTION_ID)
+    return None
+
+
+def add_enriched_messages(left: Messages, right: Messages) -> List[BaseMessage]:
+    """
+    `add_messages` that stamps each new message with the turn's interaction id
+    and a timestamp. Nodes return only the messages they produce; the history
+    is never rebuilt or rewritten by the nodes themselves.
+    """
+    left = convert_to_messages(left if isinstance(left, list) else [left])
+    right = convert_to_messages(right if isinstance(right, list) else [right])
+    interaction_id = _current_interaction_id(left, right)
+    now = datetime.now(timezone.utc).isoformat()
+    for message in right:
+        if isinstance(message, RemoveMessage):
+            continue
+        if message.additional_kwargs is None:
+            message.additional_kwargs = {}
+        message.additional_kwargs.setdefault(INTERACTION_ID, interaction_id)
+        message.additional_kwargs.setdefault(TIMESTAMP, now)
+    return add_messages(left, right)
 
 
 # Define state for application
 class State(TypedDict):
-    messages: Annotated[List[BaseMessage], add_messages]
+    messages: Annotated[List[BaseMessage], add_enriched_messages]
+    # rolling summary of the turns that left the prompt window
+    summary: NotRequired[str]
+    # how many conversation messages the summary already covers
+    summarized: NotRequired[int]
@@ -1,62 +1,113 @@
+import asyncio
 import json
 import logging
+import time
 from dataclasses import asdict
 from datetime import datetime, timezone
-from typing import Any, AsyncGenerator
+from typing import Any, AsyncGenerator, Awaitable, Callable, Optional
+from uuid import uuid4
 
-from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.messages import HumanMessage, AIMessage
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph import END, StateGraph
 from langgraph.graph.state import CompiledStateGraph
 from langgraph.prebuilt import ToolNode, tools_condition
+from langgraph.store.base import BaseStore
 
-from rag_app.agent.agent_state import State
+from rag_app.agent.agent_state import State, INTERACTION_ID, TIMESTAMP
 from rag_app.agent.graph_configuration import GraphRunConfig
-from rag_app.db_memory import create_postgres_checkpointer, create_postgres_store, store_user_conversation_history
-from rag_app.llm_singleton import get_llm
-from rag_app.retrieval.pdf_retriever import pdf_retriever, DocumentFound
+from rag_app.agent.prompt_builder import PromptBuilder, prompt_tokens, summary_prompt
+from rag_app.agent.router import Route, RouterMode, get_router
+from rag_app.agent.singleflight import SingleFlight, normalize_question
+from rag_app.agent.speculation import SPECULATIONS
+from rag_app.config import CONFIG
+from rag_app.db_memory import create_async_postgres_checkpointer, create_async_postgres_store
+from rag_app.llm_singleton import get_llm, get_llm_with_tools
+from rag_app.retrieval.pdf_retriever import get_pdf_retriever, DocumentFound
+from rag_app.retrieval.user_index import USER_INDEX_CACHE
+from rag_app.thread_registry import get_thread_registry
+from rag_app.tracing import current_trace, observe, observe_tokens, span
 
 logger = logging.getLogger(__name__)
 
-
-def add_messages(state: State, new_messages: list, config: RunnableConfig) -> State:
-    interaction_id = GraphRunConfig.from_runnable(config).interaction_id
-    enriched_messages = []
-    for message in new_messages:
-        # Ensure additional_kwargs exists
-        if not hasattr(message, "additional_kwargs") or message.additional_kwargs is None:
-            message.additional_kwargs = {}
-        # Inject interaction_id
-        message.additional_kwargs["interaction_id"] = interaction_id
-        message.additional_kwargs["timestamp"] = datetime.now(timezone.utc).isoformat()
-        enriched_messages.append(message)
-    state["messages"].extend(enriched_messages)
-    return state
+# how often a streaming request checks whether its SSE client went away
+DISCONNECT_POLL_SECONDS = 0.5
+TOOL_MSG_PREFIX = "TOOL_MSG:"
 
 
 @tool("retrieve_documents", response_format="content_and_artifact")
-def retrieve(query: str, config: RunnableConfig):
+async def retrieve(query: str, config: RunnableConfig):
     """ Retrieves documents from a user's collection. Use this to answer user query """
     config = GraphRunConfig.from_runnable(config)
-    documents: list[DocumentFound] = pdf_retriever.retriever(query=query, user_id=config.user_id)
+    documents: Optional[list[DocumentFound]] = None
+    if config.interaction_id:
+        documents = await SPECULATIONS.claim(config.interaction_id, query, CONFIG.SPECULATIVE_MATCH_THRESHOLD)
+    if documents is None:
+        documents = await _retrieve_documents(query, config.user_id)
     return documents, documents
 
 
+def _retrieve_documents(query: str, user_id: str) -> Awaitable[list[DocumentFound]]:
+    # embedding + SQL + CrossEncoder are blocking: keep them off the event loop
+    return asyncio.to_thread(get_pdf_retriever().retriever, query=query, user_id=user_id)
+
+
+# Step 0: Decide locally whether the message needs retrieval, without an LLM call.
+async def route(state: State, config: RunnableConfig):
+    """Emit a retrieve_documents tool call directly when the local router is sure."""
+    run_config = GraphRunConfig.from_runnable(config)
+    get_thread_registry().touch(run_config.user_id, run_config.thread_id)
+    mode = RouterMode.parse(run_config.router_mode) or RouterMode(CONFIG.ROUTER_MODE)
+    router = get_router(mode)
+    question = state["messages"][-1].content
+    if router is None:
+        return {}
+    with span("router"):
+        decision = await asyncio.to_thread(router.route, question)
+    logger.debug(f"Local router ({mode.value}) decision: {decision.value}")
+    if decision != Route.RETRIEVE:
+        return {}
+    tool_call = AIMessage(content="", tool_calls=[{
+        "name": retrieve.name,
+        "args": {"query": question},
+        "id": f"local-{uuid4()}",
+    }])
+    return {"messages": [tool_call]}
+
+
+def route_condition(state: State) -> str:
+    last = state["messages"][-1]
+    return "tools" if last.type == "ai" and last.tool_calls else "query_or_respond"
+
+
 # Step 1: Generate an AIMessage that may include a tool-call to be sent.
-def query_or_respond(state: State, config: RunnableConfig):
+async def query_or_respond(state: State, config: RunnableConfig):
     """Generate tool call for retrieval or respond."""
-    chat_model = get_llm()
-    llm_with_tools = chat_model.bind_tools([retrieve])
-
-    response = llm_with_tools.invoke(state["messages"])
-    state = add_messages(state, [response], config)
-    store_user_conversation_history(config=GraphRunConfig.from_runnable(config))
-    return {"messages": state["messages"]}
+    run_config = GraphRunConfig.from_runnable(config)
+    speculation_key = run_config.interaction_id if CONFIG.SPECULATIVE_RETRIEVAL else None
+    if speculation_key:
+        # retrieve on the raw message while the LLM decides; the tool reuses it if its query matches
+        question = state["messages"][-1].content
+        SPECULATIONS.start(speculation_key, question, _retrieve_documents(question, run_config.user_id))
+    llm_with_tools = get_llm_with_tools([retrieve])
+    try:
+        prompt = PromptBuilder.from_config().window(state["messages"], state.get("summary"))
+        observe_tokens("router", prompt_tokens(prompt))
+        with span("router_llm"):
+            response = await llm_with_tools.ainvoke(prompt)
+    except BaseException:
+        if speculation_key:
+            SPECULATIONS.discard(speculation_key)
+        raise
+    if speculation_key and not response.tool_calls:
+        SPECULATIONS.discard(speculation_key)
+    return {"messages": [response]}
 
 
 # Step 3: Generate a response using the retrieved content.
-def generate(state: State, config: RunnableConfig):
+async def generate(state: State):
     """Generate answer."""
     # Get generated ToolMessages
     recent_tool_messages = []
@@ -68,43 +119,31 @@ def generate(state: State, config: RunnableConfig):
     tool_message = recent_tool_messages[::-1]
 
     # Format into prompt
-    documents: DocumentFound = tool_message[0].artifact
-    docs_as_json = [asdict(doc) for doc in documents]
-    retrieved_documents_as_json_for_llm = json.dumps(docs_as_json)
-
-    system_message_content = (
-        "You are an assistant for question-answering tasks. "
-        "Use the following pieces of retrieved context to answer "
-        "the question. If you don't know the answer, say that you "
-        "don't know. You can specify the page number and the document name."
-        " Use three sentences maximum and keep the "
-        "answer concise."
-        "\n\n"
-        f"{retrieved_documents_as_json_for_llm}"
-    )
-    conversation_messages = [
-        message
-        for message in state["messages"]
-        if message.type in ("human", "system")
-           or (message.type == "ai" and not message.tool_calls)
-    ]
-    prompt = [SystemMessage(system_message_content)] + conversation_messages
+    documents: list[DocumentFound] = tool_message[0].artifact
+    prompt = PromptBuilder.from_config().build_answer_prompt(state["messages"], documents, state.get("summary"))
+    observe_tokens("answer", prompt_tokens(prompt))
 
     # Run
     chat_model = get_llm()
-    response = chat_model.invoke(prompt)
-    state = add_messages(state, [response], config)
-    return {"messages": state["messages"]}
+    with span("generate_llm"):
+        response = await chat_model.ainvoke(prompt)
+    return {"messages": [response]}
 
 
-def create_graph() -> CompiledStateGraph:
+def create_graph(checkpointer: BaseCheckpointSaver, store: BaseStore) -> CompiledStateGraph:
     graph_builder = StateGraph(State)
+    graph_builder.add_node(route)
     graph_builder.add_node(query_or_respond)
     tools = ToolNode([retrieve])
     graph_builder.add_node(tools)
     graph_builder.add_node(generate)
 
-    graph_builder.set_entry_point("query_or_respond")
+    graph_builder.set_entry_point("route")
+    graph_builder.add_conditional_edges(
+        "route",
+        route_condition,
+        {"tools": "tools", "query_or_respond": "query_or_respond"},
+    )
     graph_builder.add_conditional_edges(
         "query_or_respond",
         tools_condition,
@@ -113,29 +152,193 @@ def create_graph() -> CompiledStateGraph:
     graph_builder.add_edge("tools", "generate")
     graph_builder.add_edge("generate", END)
 
-    return graph_builder.compile(checkpointer=create_postgres_checkpointer(), store=create_postgres_store())
+    return graph_builder.compile(checkpointer=checkpointer, store=store)
+
+
+_GRAPH: Optional[CompiledStateGraph] = None
+_GRAPH_LOCK = asyncio.Lock()
+
+
+async def get_graph() -> CompiledStateGraph:
+    """ The compiled graph, built on first use: its async Postgres connections need a running loop """
+    global _GRAPH
+    if _GRAPH is None:
+        async with _GRAPH_LOCK:
+            if _GRAPH is None:
+                _GRAPH = create_graph(checkpointer=await create_async_postgres_checkpointer(),
+                                      store=await create_async_postgres_store())
+    return _GRAPH
+
+
+def _to_stream_output(message_chunk) -> Optional[str]:
+    chunk_type = message_chunk.type
+    if chunk_type == "AIMessageChunk" and message_chunk.content:
+        return message_chunk.content
+    elif chunk_type == "tool":
+        docs: list[DocumentFound] = message_chunk.artifact
+        docs_as_json = [asdict(doc) for doc in docs]
+        return TOOL_MSG_PREFIX + json.dumps(docs_as_json)
+    return None
+
+
+async def _cancel_on_disconnect(is_disconnected: Callable[[], Awaitable[bool]], task: asyncio.Task) -> None:
+    while not task.done():
+        if await is_disconnected():
+            logger.info("Client disconnected, cancelling generation")
+            task.cancel()
+            return
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
 
+# Off the response path: fold the turns leaving the prompt window into the rolling summary.
+async def summarize(config: GraphRunConfig) -> None:
+    """Update the conversation summary once a full turn has left the window."""
+    graph = await get_graph()
+    runnable = config.to_runnable()
+    state = (await graph.aget_state(runnable)).values
+    summarized = state.get("summarized", 0)
+    evicted = PromptBuilder.from_config().unsummarized(state.get("messages", []), summarized)
+    if len(evicted) < 2:
+        return
+    prompt = summary_prompt(state.get("summary"), evicted)
+    observe_tokens("summary", prompt_tokens(prompt))
+    with span("summary_llm"):
+        response = await get_llm().ainvoke(prompt)
+    # a turn of the same thread running meanwhile may overwrite this; the next summary then redoes it
+    await graph.aupdate_state(runnable, {"summary": response.content, "summarized": summarized + len(evicted)},
+                              as_node="generate")
 
-async def launch_graph(input_message: str, config: GraphRunConfig) -> AsyncGenerator[Any, Any]:
+
+# thread -> its summary update in flight
+_SUMMARIES: dict[str, asyncio.Task] = {}
+
+
+def schedule_summary(config: GraphRunConfig) -> None:
+    """
+    Run `summarize` for the thread in the background, once the answer has
+    been streamed, so it neither delays the end of the response nor holds
+    its admission slot. At most one runs per thread.
+    """
+    if config.thread_id in _SUMMARIES:
+        return
+
+    async def run() -> None:
+        try:
+            await summarize(config)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Could not update the summary of thread {config.thread_id}: {type(e).__name__}: {e}")
+
+    task = asyncio.create_task(run())
+    _SUMMARIES[config.thread_id] = task
+    task.add_done_callback(lambda _: _SUMMARIES.pop(config.thread_id, None))
+
+
+async def cancel_summaries() -> None:
+    """Cancel the summary updates still running (at shutdown)."""
+    tasks = list(_SUMMARIES.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+_STREAM_END = object()
+
+
+async def launch_graph(input_message: str, config: GraphRunConfig,
+                       is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None) -> AsyncGenerator[Any, Any]:
+    """
+    Stream the answer for one user message.
+    The graph runs in its own task so that a client disconnect (polled through
+    `is_disconnected`) or the response being closed cancels the in-flight LLM
+    call instead of letting it run to completion.
+    """
+    started = time.perf_counter()
+    graph = await get_graph()
     initial_state: State = {
         "messages": [HumanMessage(content=input_message,
-                                  additional_kwargs={"interaction_id": config.interaction_id,
-                                                     "timestamp": datetime.now(timezone.utc).isoformat()}
+                                  additional_kwargs={INTERACTION_ID: config.interaction_id,
+                                                     TIMESTAMP: datetime.now(timezone.utc).isoformat()}
                                   )],
     }
-    # Debug history.
-    for message_chunk, metadata in GRAPH.stream(
-            input=initial_state,
-            stream_mode="messages",
-            config=config.to_runnable(),
-    ):
-        chunk_type = message_chunk.type
-        if chunk_type == "AIMessageChunk" and message_chunk.content:
-            yield message_chunk.content
-        elif chunk_type == "tool":
-            docs: list[DocumentFound] = message_chunk.artifact
-            docs_as_json = [asdict(doc) for doc in docs]
-            yield "TOOL_MSG:" + json.dumps(docs_as_json)
-
-
-GRAPH = create_graph()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def produce():
+        try:
+            async for message_chunk, metadata in graph.astream(
+                    input=initial_state,
+                    stream_mode="messages",
+                    config=config.to_runnable(),
+                    durability=CONFIG.CHECKPOINT_DURABILITY,
+            ):
+                out = _to_stream_output(message_chunk)
+                if out is not None:
+                    queue.put_nowait(out)
+        finally:
+            queue.put_nowait(_STREAM_END)
+
+    producer = asyncio.create_task(produce())
+    watcher = asyncio.create_task(_cancel_on_disconnect(is_disconnected, producer)) if is_disconnected else None
+    first_token = True
+    try:
+        while (item := await queue.get()) is not _STREAM_END:
+            if first_token and not item.startswith(TOOL_MSG_PREFIX):
+                first_token = False
+                observe("ttft", time.perf_counter() - started)
+            yield item
+        try:
+            await producer  # surface graph errors
+        except asyncio.CancelledError:
+            # the watcher cancelled the graph because the client left: end quietly
+            if asyncio.current_task().cancelling():
+                raise
+        else:
+            schedule_summary(config)
+    finally:
+        producer.cancel()
+        if watcher is not None:
+            watcher.cancel()
+        if config.interaction_id:
+            SPECULATIONS.discard(config.interaction_id)
+        observe("chat_total", time.perf_counter() - started)
+        trace = current_trace()
+        if trace is not None:
+            logger.info("Chat turn finished", extra={"trace": trace.summary()})
+
+
+CHAT_FLIGHTS = SingleFlight()
+
+
+async def launch_shared_graph(input_message: str, config: GraphRunConfig) -> AsyncGenerator[Any, Any]:
+    """
+    `launch_graph` for the first message of a new thread, coalesced with the
+    same question already in flight for the same user and document set: one
+    run streams to every caller. Followers then record the question and the
+    shared answer in their own thread.
+    """
+    key = (config.user_id, USER_INDEX_CACHE.generation(config.user_id), config.router_mode,
+           normalize_question(input_message))
+    flight, leader = CHAT_FLIGHTS.join(key, lambda f: launch_graph(input_message, config, is_disconnected=f.abandoned))
+    if not leader:
+        logger.info("Joined an identical in-flight chat request")
+    async for chunk in flight.subscribe():
+        yield chunk
+    if not leader:
+        await _record_follower_turn(input_message, config, flight.chunks)
+
+
+async def _record_follower_turn(input_message: str, config: GraphRunConfig, chunks: list) -> None:
+    answer = "".join(c for c in chunks if isinstance(c, str) and not c.startswith(TOOL_MSG_PREFIX))
+    now = datetime.now(timezone.utc).isoformat()
+    graph = await get_graph()
+    await graph.aupdate_state(
+        config.to_runnable(),
+        {"messages": [
+            HumanMessage(content=input_message, additional_kwargs={INTERACTION_ID: config.interaction_id, TIMESTAMP: now}),
+            AIMessage(content=answer),
+        ]},
+        as_node="generate",
+    )
+    get_thread_registry().touch(config.user_id, config.thread_id)
+    schedule_summary(config)
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage, SystemMessage
+
+from rag_app.config import CONFIG
+from rag_app.retrieval.pdf_retriever import DocumentFound
+
+logger = logging.getLogger(__name__)
+
+# share of the budget kept for recent turns before documents are packed
+HISTORY_SHARE = 0.25
+# rough characters per token when no tokenizer is configured
+CHARS_PER_TOKEN = 3.5
+
+ANSWER_INSTRUCTIONS = (
+    "You are an assistant for question-answering tasks. "
+    "Use the following pieces of retrieved context to answer "
+    "the question. If you don't know the answer, say that you "
+    "don't know. You can specify the page number and the document name."
+    " Use three sentences maximum and keep the "
+    "answer concise."
+)
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+@lru_cache(maxsize=1)
+def get_tokenizer() -> Callable[[str], int]:
+    """
+    Token counter for PROMPT_TOKENIZER (a Hugging Face tokenizer name or path),
+    loaded once. Without one, tokens are estimated from the text length.
+    """
+    name = CONFIG.PROMPT_TOKENIZER
+    if name:
+        try:
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(name)
+            return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+        except Exception as e:
+            logger.warning(f"Could not load tokenizer {name!r}, estimating tokens instead: {type(e).__name__}: {e}")
+    return lambda text: int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """Token count of `text`; documents and past turns recur across turns, so counts are memoized."""
+    return get_tokenizer()(text)
+
+
+def message_tokens(message: BaseMessage) -> int:
+    # a few tokens of chat-template framing per message
+    return count_tokens(message.content if isinstance(message.content, str) else str(message.content)) + 4
+
+
+def prompt_tokens(messages: Sequence[BaseMessage]) -> int:
+    return sum(message_tokens(m) for m in messages)
+
+
+def format_document(position: int, doc: DocumentFound) -> str:
+    return f"[{position}] {doc.document_name} p.{doc.page_number}\n{doc.page_content}"
+
+
+def conversation_messages(messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+    """User/system turns and final AI answers; tool calls and tool results are left out."""
+    return [
+        m for m in messages
+        if m.type in ("human", "system") or (m.type == "ai" and not m.tool_calls)
+    ]
+
+
+def split_history(conversation: Sequence[BaseMessage], history_turns: int) -> Tuple[List[BaseMessage], List[BaseMessage]]:
+    """(older, recent): `recent` holds the last `history_turns` exchanges, the current message excluded."""
+    history = list(conversation[:-1])
+    keep = max(0, history_turns) * 2
+    cut = max(0, len(history) - keep)
+    return history[:cut], history[cut:]
+
+
+def _fit_recent(recent: Sequence[BaseMessage], budget: int) -> List[BaseMessage]:
+    """Newest messages that fit in `budget` tokens, in conversation order."""
+    kept: List[BaseMessage] = []
+    used = 0
+    for message in reversed(recent):
+        cost = message_tokens(message)
+        if used + cost > budget:
+            break
+        kept.append(message)
+        used += cost
+    return kept[::-1]
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(text[:mid]) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo]
+
+
+@dataclass(frozen=True)
+class PromptBuilder:
+    """
+    Builds prompts that stay within `token_budget` however long the thread is:
+    instructions, rolling summary and the current message always go in, then
+    re-ranked documents in rank order, then the most recent turns that still fit.
+    """
+    token_budget: int
+    history_turns: int
+
+    @classmethod
+    def from_config(cls) -> PromptBuilder:
+        return cls(token_budget=CONFIG.PROMPT_TOKEN_BUDGET, history_turns=CONFIG.PROMPT_HISTORY_TURNS)
+
+    def _header(self, instructions: str, summary: Optional[str]) -> str:
+        return f"{instructions}\n\n{SUMMARY_PREFIX}{summary}" if summary else instructions
+
+    def build_answer_prompt(self, messages: Sequence[BaseMessage], documents: Sequence[DocumentFound],
+                            summary: Optional[str] = None) -> List[BaseMessage]:
+        conversation = conversation_messages(messages)
+        current = conversation[-1:]
+        _, recent = split_history(conversation, self.history_turns)
+        header = self._header(ANSWER_INSTRUCTIONS, summary)
+
+        system_overhead = message_tokens(SystemMessage(header)) + 1  # +1: separator before the documents
+        remaining = self.token_budget - system_overhead - sum(message_tokens(m) for m in current)
+        history_reserve = min(sum(message_tokens(m) for m in recent), int(self.token_budget * HISTORY_SHARE))
+        doc_budget = max(0, remaining - history_reserve)
+
+        packed: List[str] = []
+        for position, doc in enumerate(documents, start=1):
+            text = format_document(position, doc)
+            cost = count_tokens(text) + 1
+            if cost > doc_budget:
+                if not packed:
+                    # always give the model the best document, cut to fit
+                    packed.append(_truncate(text, doc_budget))
+                    doc_budget = 0
+                break
+            packed.append(text)
+            doc_budget -= cost
+        context = "\n\n".join(p for p in packed if p)
+        system = SystemMessage(f"{header}\n\n{context}" if context else header)
+
+        history_budget = self.token_budget - message_tokens(system) - sum(message_tokens(m) for m in current)
+        return [system] + _fit_recent(recent, max(0, history_budget)) + current
+
+    def unsummarized(self, messages: Sequence[BaseMessage], summarized: int) -> List[BaseMessage]:
+        """
+        Messages that will fall out of the window on the next turn and are not
+        in the summary yet; `summarized` counts conversation messages already folded in.
+        """
+        conversation = conversation_messages(messages)
+        evicted = conversation[:max(0, len(conversation) - self.history_turns * 2)]
+        return evicted[summarized:]
+
+    def window(self, messages: Sequence[BaseMessage], summary: Optional[str] = None) -> List[BaseMessage]:
+        """Windowed conversation (summary first) for calls that take no documents, e.g. the tool decision."""
+        conversation = conversation_messages(messages)
+        current = conversation[-1:]
+        _, recent = split_history(conversation, self.history_turns)
+        prefix = [SystemMessage(SUMMARY_PREFIX + summary)] if summary else []
+        budget = self.token_budget - sum(message_tokens(m) for m in prefix + current)
+        return prefix + _fit_recent(recent, max(0, budget)) + current
+
+
+def summary_prompt(summary: Optional[str], evicted: Sequence[BaseMessage]) -> List[BaseMessage]:
+    """Prompt folding turns that left the window into the rolling summary."""
+    turns = "\n".join(f"{'User' if m.type == 'human' else 'Assistant'}: {m.content}" for m in evicted)
+    return [SystemMessage(
+        "Update the running summary of a conversation between a user and a document assistant. "
+        "Keep facts, names, documents and open questions the user may refer back to. "
+        "Answer with the updated summary only, at most 150 words.\n\n"
+        f"Current summary:\n{summary or '(empty)'}\n\nNew turns:\n{turns}"
+    )]
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import logging
+import re
+from enum import Enum
+from functools import lru_cache
+from typing import Optional, Protocol, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from rag_app.config import CONFIG
+from rag_app.llm_singleton import get_embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class Route(str, Enum):
+    RETRIEVE = "retrieve"  # go straight to retrieve_documents
+    UNSURE = "unsure"  # let the LLM decide (query_or_respond)
+
+
+class RouterMode(str, Enum):
+    LLM = "llm"  # no local routing, every turn asks the LLM
+    RULES = "rules"
+    EMBEDDING = "embedding"
+    ALWAYS = "always"  # every message is a document question
+
+    @classmethod
+    def parse(cls, value: Optional[str]) -> Optional[RouterMode]:
+        try:
+            return cls(value.strip().lower()) if value else None
+        except ValueError:
+            logger.warning(f"Unknown router mode {value!r}, using default")
+            return None
+
+
+class LocalRouter(Protocol):
+    def route(self, message: str) -> Route: ...
+
+
+class AlwaysRetrieveRouter:
+    def route(self, message: str) -> Route:
+        return Route.RETRIEVE
+
+
+_SMALL_TALK = re.compile(
+    r"^\s*(hi|hello|hey|ciao|salve|buongiorno|buonasera|thanks|thank you|grazie|ok|okay|bye|arrivederci)\b[\s!.?]*$",
+    re.IGNORECASE,
+)
+_QUESTION_CUES = re.compile(
+    r"\?|\b(what|which|who|whom|when|where|why|how|explain|summari[sz]e|list|describe|find|show|according|"
+    r"document|documents|pdf|page|section|report|contract|invoice|"
+    r"cosa|quale|quali|chi|quando|dove|perch[eé]|come|quanto|quanti|spiega|riassumi|elenca|descrivi|trova|"
+    r"documento|documenti|pagina|sezione|contratto|fattura)\b",
+    re.IGNORECASE,
+)
+
+
+class RuleRouter:
+    """
+    Cheap lexical rules: small talk is left to the LLM, anything that reads
+    like a question about content goes straight to retrieval.
+    """
+
+    def __init__(self, min_words: int = 3):
+        self._min_words = min_words
+
+    def route(self, message: str) -> Route:
+        if _SMALL_TALK.match(message):
+            return Route.UNSURE
+        if len(message.split()) >= self._min_words and _QUESTION_CUES.search(message):
+            return Route.RETRIEVE
+        return Route.UNSURE
+
+
+_RETRIEVE_EXAMPLES = (
+    "What does the document say about this topic?",
+    "Summarize the report",
+    "What is the total amount on the invoice?",
+    "On which page is the termination clause?",
+    "Explain the section about security requirements",
+    "Cosa dice il documento su questo argomento?",
+    "Riassumi il contratto",
+)
+_CHAT_EXAMPLES = (
+    "Hello, how are you?",
+    "Thanks a lot!",
+    "Who are you?",
+    "Tell me a joke",
+    "Ciao, come stai?",
+    "Grazie mille",
+)
+
+
+class EmbeddingRouter:
+    """
+    Nearest-centroid classifier over a handful of labeled examples.
+    Routes to retrieval only when the message is clearly closer to the
+    document-question centroid than to the chit-chat one.
+    """
+
+    def __init__(self, embeddings: Embeddings, margin: float,
+                 retrieve_examples: Sequence[str] = _RETRIEVE_EXAMPLES, chat_examples: Sequence[str] = _CHAT_EXAMPLES):
+        self._embeddings = embeddings
+        self._margin = margin
+        self._retrieve_examples = list(retrieve_examples)
+        self._chat_examples = list(chat_examples)
+        self._centroids: Optional[np.ndarray] = None
+
+    def _centroid(self, examples: list[str]) -> np.ndarray:
+        vectors = np.asarray(self._embeddings.embed_documents(examples), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        centroid = vectors.mean(axis=0)
+        return centroid / np.linalg.norm(centroid)
+
+    def _get_centroids(self) -> np.ndarray:
+        if self._centroids is None:
+            self._centroids = np.vstack([self._centroid(self._retrieve_examples), self._centroid(self._chat_examples)])
+        return self._centroids
+
+    def route(self, message: str) -> Route:
+        q = np.asarray(self._embeddings.embed_query(message), dtype=np.float32)
+        q /= np.linalg.norm(q) or 1.0
+        retrieve_sim, chat_sim = self._get_centroids() @ q
+        return Route.RETRIEVE if retrieve_sim - chat_sim >= self._margin else Route.UNSURE
+
+
+@lru_cache(maxsize=None)
+def get_router(mode: RouterMode) -> Optional[LocalRouter]:
+    """ Local router for a mode, None when routing is left to the LLM """
+    if mode == RouterMode.ALWAYS:
+        return AlwaysRetrieveRouter()
+    if mode == RouterMode.RULES:
+        return RuleRouter()
+    if mode == RouterMode.EMBEDDING:
+        return EmbeddingRouter(get_embeddings(), margin=CONFIG.ROUTER_EMBEDDING_MARGIN)
+    return None
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SPACES = re.compile(r"\s+")
+_TRAILING_PUNCT = re.compile(r"[\s?!.]+$")
+
+
+def normalize_question(text: str) -> str:
+    """Case, whitespace and trailing punctuation don't make two questions different."""
+    return _TRAILING_PUNCT.sub("", _SPACES.sub(" ", text.strip().lower()))
+
+
+class Flight:
+    """
+    One in-flight stream shared by every request with the same key.
+    The source is pumped by its own task, independent of any client: chunks
+    are buffered so late subscribers replay from the start, and the source is
+    cancelled only once every subscriber has gone away.
+    """
+
+    def __init__(self, on_done: Callable[[], None]):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._changed = asyncio.Condition()
+        self._on_done = on_done
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, source: AsyncIterator[Any]) -> None:
+        self._task = asyncio.create_task(self._pump(source))
+
+    async def abandoned(self) -> bool:
+        """Disconnect check for the source: true once nobody is listening any more."""
+        return self.subscribers == 0
+
+    async def _pump(self, source: AsyncIterator[Any]) -> None:
+        try:
+            async for chunk in source:
+                async with self._changed:
+                    self.chunks.append(chunk)
+                    self._changed.notify_all()
+        except asyncio.CancelledError:
+            self.error = asyncio.CancelledError()
+        except Exception as e:
+            self.error = e
+        finally:
+            self._on_done()
+            async with self._changed:
+                self.done = True
+                self._changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        """The flight's chunks from the first one; releases the slot taken by `SingleFlight.join`."""
+        sent = 0
+        try:
+            while True:
+                async with self._changed:
+                    await self._changed.wait_for(lambda: self.done or len(self.chunks) > sent)
+                    pending, finished = self.chunks[sent:], self.done
+                for chunk in pending:
+                    yield chunk
+                sent += len(pending)
+                if finished and sent == len(self.chunks):
+                    break
+            if self.error is not None and not isinstance(self.error, asyncio.CancelledError):
+                raise self.error
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and self._task is not None and not self._task.done():
+                self._task.cancel()
+
+
+class SingleFlight:
+    """Registry of in-flight streams: the first request for a key leads, the others follow."""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def join(self, key: Hashable, source_factory: Callable[[Flight], AsyncIterator[Any]]) -> Tuple[Flight, bool]:
+        """
+        The flight for `key` and whether this caller leads it. The caller holds
+        a subscriber slot until it has consumed `flight.subscribe()`. A leader's
+        `source_factory` is called with the new flight (e.g. to watch
+        `flight.abandoned`) and its stream starts right away.
+        """
+        flight = self._flights.get(key)
+        if flight is not None and not flight.done:
+            flight.subscribers += 1
+            return flight, False
+        flight = Flight(on_done=lambda: self._flights.pop(key, None) if self._flights.get(key) is flight else None)
+        flight.subscribers = 1
+        self._flights[key] = flight
+        flight.start(source_factory(flight))
+        return flight, True
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+from typing import Any, Awaitable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _terms(text: str) -> set[str]:
+    return set(_WORD.findall(text.lower()))
+
+
+def queries_match(original: str, tool_query: str, threshold: float) -> bool:
+    """
+    True when the query the LLM chose for the tool is close enough to the
+    user's message: the share of the tool query's words that also appear in
+    the message is >= threshold. The LLM usually condenses the message, so
+    words it drops don't count against the match.
+    """
+    message, query = _terms(original), _terms(tool_query)
+    if not message or not query:
+        return False
+    return len(message & query) / len(query) >= threshold
+
+
+class SpeculativeRetrievals:
+    """
+    Retrievals started on the raw user message while the router LLM call is
+    still deciding whether (and with which query) to call the tool.
+    Keyed by interaction id: `start` in query_or_respond, `claim` in the
+    retrieve tool, `discard` when the LLM answers without the tool.
+    A discarded retrieval already running in a worker thread finishes in the
+    background; only its result is dropped.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, Tuple[str, asyncio.Task]] = {}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._pending
+
+    def start(self, key: str, query: str, retrieval: Awaitable[Any]) -> None:
+        self.discard(key)
+        self._pending[key] = (query, asyncio.ensure_future(retrieval))
+
+    def discard(self, key: str) -> None:
+        entry = self._pending.pop(key, None)
+        if entry is not None:
+            entry[1].cancel()
+
+    async def claim(self, key: str, tool_query: str, threshold: float) -> Optional[Any]:
+        """Result of the speculative retrieval if it matches `tool_query`, else None."""
+        entry = self._pending.pop(key, None)
+        if entry is None:
+            return None
+        query, task = entry
+        if not queries_match(query, tool_query, threshold):
+            logger.debug("Speculative retrieval discarded: tool query differs from the user message")
+            task.cancel()
+            return None
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                raise
+            return None
+        except Exception as e:
+            logger.warning(f"Speculative retrieval failed, retrying: {type(e).__name__}: {e}")
+            return None
+
+
+SPECULATIONS = SpeculativeRetrievals()
@@ -0,0 +1,340 @@
+"""
+Pool of interchangeable model servers (Ollama replicas) behind one client.
+
+The pool plugs into the httpx clients that ChatOllama and OllamaEmbeddings
+own, as their transport: every request is sent to the healthy backend with
+the fewest requests in flight, whatever base URL the client was built with.
+A backend is ejected for `eject_seconds` after `eject_after` consecutive
+failures (connection errors or 5xx) and re-admitted early once a health check
+succeeds again. Connection errors happen before anything is sent, so those
+requests are retried on the next backend.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import httpx
+
+from rag_app.config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+# weight of the newest sample in the per-backend latency average
+LATENCY_EWMA_ALPHA = 0.2
+
+
+@dataclass(eq=False)
+class Backend:
+    url: str
+    outstanding: int = 0
+    requests: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    ejected_until: float = 0.0
+    latency_ms: Optional[float] = None
+    last_error: Optional[str] = None
+
+    def ejected(self, now: float) -> bool:
+        return now < self.ejected_until
+
+
+class BackendPool:
+    """
+    Least-outstanding-requests routing over `urls` with passive (request
+    outcomes) and active (periodic GET `health_path`) health tracking.
+    """
+
+    def __init__(self, urls: Sequence[str], *, eject_after: int = 3, eject_seconds: float = 30.0,
+                 health_path: str = "/api/version", health_interval: float = 10.0, health_timeout: float = 2.0,
+                 clock: Callable[[], float] = time.monotonic):
+        if not urls:
+            raise ValueError("A backend pool needs at least one URL")
+        self.backends = [Backend(url.rstrip("/")) for url in urls]
+        self._eject_after = max(1, eject_after)
+        self._eject_seconds = eject_seconds
+        self._health_path = health_path
+        self._health_interval = health_interval
+        self._health_timeout = health_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._rotation = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def urls(self) -> List[str]:
+        return [b.url for b in self.backends]
+
+    def acquire(self, exclude: Sequence[Backend] = ()) -> Optional[Backend]:
+        """
+        The backend for the next request, counted as outstanding until `release`.
+        Ejected backends are only used when every candidate is ejected (the one
+        coming back soonest); None when `exclude` covers the whole pool.
+        """
+        self._ensure_started()
+        now = self._clock()
+        with self._lock:
+            n = len(self.backends)
+            candidates = [(i, b) for i, b in enumerate(self.backends) if b not in exclude]
+            if not candidates:
+                return None
+            healthy = [(i, b) for i, b in candidates if not b.ejected(now)]
+            if healthy:
+                # ties go round-robin so idle backends share the load
+                _, backend = min(healthy, key=lambda ib: (ib[1].outstanding, (ib[0] - self._rotation) % n))
+            else:
+                _, backend = min(candidates, key=lambda ib: ib[1].ejected_until)
+            self._rotation = (self._rotation + 1) % n
+            backend.outstanding += 1
+            backend.requests += 1
+            return backend
+
+    def release(self, backend: Backend, elapsed: float, ok: bool, error: Optional[str] = None) -> None:
+        with self._lock:
+            backend.outstanding -= 1
+            if ok:
+                ms = elapsed * 1000
+                backend.latency_ms = ms if backend.latency_ms is None else (
+                    LATENCY_EWMA_ALPHA * ms + (1 - LATENCY_EWMA_ALPHA) * backend.latency_ms)
+        if ok:
+            self._succeeded(backend)
+        else:
+            self._failed(backend, error or "request failed")
+
+    def _succeeded(self, backend: Backend) -> None:
+        with self._lock:
+            if backend.ejected_until:
+                logger.info(f"Backend {backend.url} is healthy again")
+            backend.consecutive_failures = 0
+            backend.ejected_until = 0.0
+
+    def _failed(self, backend: Backend, error: str) -> None:
+        with self._lock:
+            backend.failures += 1
+            backend.consecutive_failures += 1
+            backend.last_error = error
+            if backend.consecutive_failures >= self._eject_after:
+                was_ejected = backend.ejected(self._clock())
+                backend.ejected_until = self._clock() + self._eject_seconds
+                if not was_ejected:
+                    logger.warning(f"Ejecting backend {backend.url} for {self._eject_seconds}s after "
+                                   f"{backend.consecutive_failures} failures: {error}")
+
+    def check(self, backend: Backend) -> bool:
+        """Active health check; a success re-admits an ejected backend."""
+        try:
+            response = httpx.get(backend.url + self._health_path, timeout=self._health_timeout)
+            ok = response.status_code < 500
+            error = None if ok else f"health check returned {response.status_code}"
+        except httpx.HTTPError as e:
+            ok, error = False, f"{type(e).__name__}: {e}"
+        if ok:
+            self._succeeded(backend)
+        else:
+            self._failed(backend, error)
+        return ok
+
+    def check_all(self) -> Dict[str, bool]:
+        return {b.url: self.check(b) for b in self.backends}
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = self._clock()
+        with self._lock:
+            return [{
+                "url": b.url,
+                "healthy": not b.ejected(now),
+                "outstanding": b.outstanding,
+                "requests": b.requests,
+                "failures": b.failures,
+                "latency_ms": None if b.latency_ms is None else round(b.latency_ms, 1),
+                "last_error": b.last_error,
+            } for b in self.backends]
+
+    def _ensure_started(self) -> None:
+        if self._thread is None and self._health_interval > 0 and not self._stop.is_set():
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="backend-health", daemon=True)
+                    self._thread.start()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self._health_interval):
+            self.check_all()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self._health_timeout + 1.0)
+            self._thread = None
+
+
+def _retarget(request: httpx.Request, url: str, path: str) -> None:
+    """Point `request` (originally for `path`) at the backend `url`, keeping any path prefix of the backend."""
+    target = httpx.URL(url)
+    request.url = request.url.copy_with(scheme=target.scheme, host=target.host, port=target.port,
+                                        path=target.path.rstrip("/") + path)
+    request.headers["Host"] = request.url.netloc.decode("ascii")
+
+
+class _Outcome:
+    """Releases the backend once, when the response body is closed."""
+
+    def __init__(self, pool: BackendPool, backend: Backend, started: float, status_code: int):
+        self._pool = pool
+        self._backend = backend
+        self._started = started
+        self.ok = status_code < 500
+        self.error = None if self.ok else f"HTTP {status_code}"
+        self._released = False
+
+    def fail(self, e: Exception) -> None:
+        self.ok, self.error = False, f"{type(e).__name__}: {e}"
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._pool.release(self._backend, time.perf_counter() - self._started, self.ok, self.error)
+
+
+class _TrackedStream(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, outcome: _Outcome):
+        self._stream = stream
+        self._outcome = outcome
+
+    def __iter__(self) -> Iterator[bytes]:
+        try:
+            yield from self._stream
+        except httpx.TransportError as e:
+            self._outcome.fail(e)
+            raise
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._outcome.release()
+
+
+class _AsyncTrackedStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, outcome: _Outcome):
+        self._stream = stream
+        self._outcome = outcome
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        except httpx.TransportError as e:
+            self._outcome.fail(e)
+            raise
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._outcome.release()
+
+
+class PoolTransport(httpx.BaseTransport):
+    """Sync httpx transport sending each request to a backend of `pool`, one connection pool per backend."""
+
+    def __init__(self, pool: BackendPool, limits: httpx.Limits = httpx.Limits()):
+        self._pool = pool
+        self._transports = {url: httpx.HTTPTransport(limits=limits) for url in pool.urls}
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        tried: List[Backend] = []
+        path = request.url.path
+        while True:
+            backend = self._pool.acquire(exclude=tried)
+            _retarget(request, backend.url, path)
+            started = time.perf_counter()
+            try:
+                response = self._transports[backend.url].handle_request(request)
+            except httpx.TransportError as e:
+                self._pool.release(backend, time.perf_counter() - started, False, f"{type(e).__name__}: {e}")
+                tried.append(backend)
+                if isinstance(e, httpx.ConnectError) and len(tried) < len(self._pool.backends):
+                    continue
+                raise
+            response.stream = _TrackedStream(response.stream, _Outcome(self._pool, backend, started,
+                                                                       response.status_code))
+            return response
+
+    def close(self) -> None:
+        for transport in self._transports.values():
+            transport.close()
+
+
+class AsyncPoolTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of `PoolTransport`, sharing the same pool (and so the same counters)."""
+
+    def __init__(self, pool: BackendPool, limits: httpx.Limits = httpx.Limits()):
+        self._pool = pool
+        self._transports = {url: httpx.AsyncHTTPTransport(limits=limits) for url in pool.urls}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        tried: List[Backend] = []
+        path = request.url.path
+        while True:
+            backend = self._pool.acquire(exclude=tried)
+            _retarget(request, backend.url, path)
+            started = time.perf_counter()
+            try:
+                response = await self._transports[backend.url].handle_async_request(request)
+            except httpx.TransportError as e:
+                self._pool.release(backend, time.perf_counter() - started, False, f"{type(e).__name__}: {e}")
+                tried.append(backend)
+                if isinstance(e, httpx.ConnectError) and len(tried) < len(self._pool.backends):
+                    continue
+                raise
+            response.stream = _AsyncTrackedStream(response.stream, _Outcome(self._pool, backend, started,
+                                                                            response.status_code))
+            return response
+
+    async def aclose(self) -> None:
+        for transport in self._transports.values():
+            await transport.aclose()
+
+
+def client_kwargs(pool: BackendPool, limits: httpx.Limits = httpx.Limits()) -> Dict[str, Dict[str, Any]]:
+    """`sync_client_kwargs` / `async_client_kwargs` routing a ChatOllama or OllamaEmbeddings through `pool`."""
+    return {
+        "sync_client_kwargs": {"transport": PoolTransport(pool, limits)},
+        "async_client_kwargs": {"transport": AsyncPoolTransport(pool, limits)},
+    }
+
+
+@lru_cache(maxsize=None)
+def _pool_for(urls: Tuple[str, ...]) -> BackendPool:
+    return BackendPool(
+        urls,
+        eject_after=CONFIG.BACKEND_EJECT_AFTER_FAILURES,
+        eject_seconds=CONFIG.BACKEND_EJECT_SECONDS,
+        health_path=CONFIG.BACKEND_HEALTH_PATH,
+        health_interval=CONFIG.BACKEND_HEALTH_INTERVAL_SECONDS,
+    )
+
+
+def get_chat_pool() -> Optional[BackendPool]:
+    """Pool over LLM_HOSTS, None when no host is configured (client defaults apply)."""
+    return _pool_for(tuple(CONFIG.LLM_HOSTS)) if CONFIG.LLM_HOSTS else None
+
+
+def get_embedding_pool() -> Optional[BackendPool]:
+    """Pool over EMBEDDING_HOSTS; the same pool as chat when both lists are equal."""
+    return _pool_for(tuple(CONFIG.EMBEDDING_HOSTS)) if CONFIG.EMBEDDING_HOSTS else None
+
+
+def all_pools() -> List[BackendPool]:
+    return [p for p in {id(p): p for p in (get_chat_pool(), get_embedding_pool()) if p}.values()]
+
+
+def close_pools() -> None:
+    for pool in all_pools():
+        pool.close()
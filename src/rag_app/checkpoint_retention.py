@@ -0,0 +1,351 @@
+"""
+Retention for the LangGraph Postgres checkpoint tables.
+
+PostgresSaver never deletes anything. This module:
+  - keeps only the newest `keep_last` checkpoints per thread (and namespace),
+    together with the writes and channel blobs they still reference;
+  - drops threads whose newest checkpoint is older than `ttl_days`,
+    including their entries in the transcript table and the legacy store, and
+    tombstones them in the thread registry; tombstones older than
+    `_THREAD_TOMBSTONE_DAYS` are dropped in the same pass;
+  - runs as a throttled background job that works through a bounded batch
+    of threads per transaction and pauses between batches.
+
+`delete_thread` is the same code path the DELETE /chat/{thread_id} endpoint uses.
+
+    APP_ENV=.env.local python -m rag_app.checkpoint_retention
+"""
+from __future__ import annotations
+
+import json
+import logging
+import sys
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Callable, ContextManager, List, Optional, Sequence
+
+import psycopg
+
+from rag_app.config import CONFIG
+from rag_app.db_pool import transaction
+from rag_app import transcript
+from rag_app.thread_registry import get_thread_registry
+
+logger = logging.getLogger(__name__)
+
+CHAT_HISTORY_PREFIX = "chat_history"
+
+# a deleted thread's registry row outlives any bump still pending in a worker by this much
+_THREAD_TOMBSTONE_DAYS = 1
+
+# each statement returns (rows deleted, bytes of the deleted rows)
+_DELETE_OLD_CHECKPOINTS = """
+    WITH ranked AS (
+        SELECT thread_id, checkpoint_ns, checkpoint_id,
+               row_number() OVER (PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC) AS rn
+        FROM checkpoints
+        WHERE thread_id = ANY(%(thread_ids)s)
+    ), deleted AS (
+        DELETE FROM checkpoints c
+        USING ranked r
+        WHERE c.thread_id = r.thread_id
+          AND c.checkpoint_ns = r.checkpoint_ns
+          AND c.checkpoint_id = r.checkpoint_id
+          AND r.rn > %(keep)s
+        RETURNING pg_column_size(c.*) AS size
+    )
+    SELECT count(*), coalesce(sum(size), 0) FROM deleted;
+    """
+
+_DELETE_ORPHAN_WRITES = """
+    WITH deleted AS (
+        DELETE FROM checkpoint_writes w
+        WHERE w.thread_id = ANY(%(thread_ids)s)
+          AND NOT EXISTS (
+              SELECT 1 FROM checkpoints c
+              WHERE c.thread_id = w.thread_id
+                AND c.checkpoint_ns = w.checkpoint_ns
+                AND c.checkpoint_id = w.checkpoint_id)
+        RETURNING pg_column_size(w.*) AS size
+    )
+    SELECT count(*), coalesce(sum(size), 0) FROM deleted;
+    """
+
+_DELETE_ORPHAN_BLOBS = """
+    WITH deleted AS (
+        DELETE FROM checkpoint_blobs b
+        WHERE b.thread_id = ANY(%(thread_ids)s)
+          AND NOT EXISTS (
+              SELECT 1 FROM checkpoints c
+              WHERE c.thread_id = b.thread_id
+                AND c.checkpoint_ns = b.checkpoint_ns
+                AND c.checkpoint->'channel_versions'->>b.channel = b.version)
+        RETURNING pg_column_size(b.*) AS size
+    )
+    SELECT count(*), coalesce(sum(size), 0) FROM deleted;
+    """
+
+_DELETE_THREAD_ROWS = """
+    WITH deleted AS (
+        DELETE FROM {table} t
+        WHERE t.thread_id = ANY(%(thread_ids)s)
+        RETURNING pg_column_size(t.*) AS size
+    )
+    SELECT count(*), coalesce(sum(size), 0) FROM deleted;
+    """
+
+_DELETE_CHAT_HISTORY = """
+    WITH deleted AS (
+        DELETE FROM store s
+        WHERE s.prefix LIKE %(history_prefix)s
+          AND s.key = ANY(%(thread_ids)s)
+        RETURNING pg_column_size(s.*) AS size
+    )
+    SELECT count(*), coalesce(sum(size), 0) FROM deleted;
+    """
+
+_THREAD_OWNER = """
+    SELECT user_id FROM chat_threads
+    WHERE thread_id = %(thread_id)s AND deleted_at IS NULL
+    FOR UPDATE;
+    """
+
+# a tombstone, not a DELETE: the registry's upsert never revives it (see thread_registry)
+_DELETE_REGISTERED_THREADS = """
+    WITH deleted AS (
+        UPDATE chat_threads t SET deleted_at = now()
+        WHERE t.thread_id = ANY(%(thread_ids)s)
+          AND (%(user_id)s::text IS NULL OR t.user_id = %(user_id)s)
+          AND t.deleted_at IS NULL
+        RETURNING 1
+    )
+    SELECT count(*), 0 FROM deleted;
+    """
+
+_DELETE_THREAD_TOMBSTONES = """
+    WITH deleted AS (
+        DELETE FROM chat_threads t
+        WHERE t.deleted_at < now() - make_interval(days => %(days)s)
+        RETURNING pg_column_size(t.*) AS size
+    )
+    SELECT count(*), coalesce(sum(size), 0) FROM deleted;
+    """
+
+_THREADS_OVER_LIMIT = """
+    SELECT DISTINCT thread_id
+    FROM (SELECT thread_id
+          FROM checkpoints
+          GROUP BY thread_id, checkpoint_ns
+          HAVING count(*) > %(keep)s) over_limit
+    LIMIT %(limit)s;
+    """
+
+_IDLE_THREADS = """
+    SELECT thread_id
+    FROM checkpoints
+    WHERE checkpoint_ns = ''
+    GROUP BY thread_id
+    HAVING max((checkpoint->>'ts')::timestamptz) < now() - make_interval(days => %(ttl_days)s)
+    LIMIT %(limit)s;
+    """
+
+
+class ThreadNotOwned(LookupError):
+    """`delete_thread` was asked for a thread that is not a live thread of the given user."""
+
+
+@dataclass
+class RetentionReport:
+    threads_compacted: int = 0
+    threads_expired: int = 0
+    checkpoints_deleted: int = 0
+    writes_deleted: int = 0
+    blobs_deleted: int = 0
+    history_entries_deleted: int = 0
+    transcript_entries_deleted: int = 0
+    bytes_reclaimed: int = 0
+    seconds: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def rows_deleted(self) -> int:
+        return (self.checkpoints_deleted + self.writes_deleted + self.blobs_deleted + self.history_entries_deleted
+                + self.transcript_entries_deleted)
+
+    def merge(self, other: RetentionReport) -> None:
+        for name in ("threads_compacted", "threads_expired", "checkpoints_deleted", "writes_deleted",
+                     "blobs_deleted", "history_entries_deleted", "transcript_entries_deleted", "bytes_reclaimed"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.errors.extend(other.errors)
+
+
+def _delete(cur: psycopg.Cursor, sql: str, params: dict) -> tuple[int, int]:
+    cur.execute(sql, params)
+    rows, size = cur.fetchone()
+    return int(rows), int(size)
+
+
+def _delete_threads(cur: psycopg.Cursor, thread_ids: Sequence[str], user_id: Optional[str] = None) -> RetentionReport:
+    report = RetentionReport()
+    # store namespaces are flattened as "chat_history.<user_id>"
+    history_prefix = f"{CHAT_HISTORY_PREFIX}.{user_id}" if user_id else f"{CHAT_HISTORY_PREFIX}.%"
+    params = {"thread_ids": list(thread_ids), "history_prefix": history_prefix, "user_id": user_id}
+    for table, attr in (("checkpoint_writes", "writes_deleted"), ("checkpoint_blobs", "blobs_deleted"),
+                        ("checkpoints", "checkpoints_deleted"), ("chat_transcript", "transcript_entries_deleted")):
+        rows, size = _delete(cur, _DELETE_THREAD_ROWS.format(table=table), params)
+        setattr(report, attr, rows)
+        report.bytes_reclaimed += size
+    for sql in (_DELETE_REGISTERED_THREADS, _DELETE_CHAT_HISTORY):
+        rows, size = _delete(cur, sql, params)
+        report.history_entries_deleted += rows
+        report.bytes_reclaimed += size
+    registry = get_thread_registry()
+    for thread_id in thread_ids:
+        registry.forget(thread_id)
+        transcript.forget_thread(thread_id)
+    return report
+
+
+def _compact_threads(cur: psycopg.Cursor, thread_ids: Sequence[str], keep_last: int) -> RetentionReport:
+    report = RetentionReport(threads_compacted=len(thread_ids))
+    params = {"thread_ids": list(thread_ids), "keep": keep_last}
+    for sql, attr in ((_DELETE_OLD_CHECKPOINTS, "checkpoints_deleted"), (_DELETE_ORPHAN_WRITES, "writes_deleted"),
+                      (_DELETE_ORPHAN_BLOBS, "blobs_deleted")):
+        rows, size = _delete(cur, sql, params)
+        setattr(report, attr, rows)
+        report.bytes_reclaimed += size
+    return report
+
+
+def delete_thread(thread_id: str, user_id: Optional[str] = None,
+                  connect: Callable[[], ContextManager[psycopg.Connection]] = transaction) -> RetentionReport:
+    """
+    Remove every checkpoint, write, blob and chat-history entry of one thread.
+    With `user_id`, the thread must be registered to that user: otherwise
+    nothing is deleted and `ThreadNotOwned` is raised.
+    """
+    start = time.perf_counter()
+    get_thread_registry().setup()
+    transcript.setup()
+    with connect() as conn, conn.cursor() as cur:
+        if user_id is not None:
+            # the checkpoint tables only know the thread id: check the owner, and hold the row, first
+            cur.execute(_THREAD_OWNER, {"thread_id": thread_id})
+            row = cur.fetchone()
+            if row is None or row[0] != user_id:
+                raise ThreadNotOwned(thread_id)
+        report = _delete_threads(cur, [thread_id], user_id)
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+class CheckpointRetention:
+    """
+    Batched retention pass over the checkpoint tables.
+    Each batch of at most `batch_size` threads is one transaction; the job
+    sleeps `pause_seconds` between batches so it never monopolises the DB.
+    """
+
+    def __init__(self, *, keep_last: int, ttl_days: int, batch_size: int = 100, pause_seconds: float = 0.5,
+                 max_batches: int = 1000, connect: Callable[[], ContextManager[psycopg.Connection]] = transaction,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.keep_last = max(1, keep_last)
+        self.ttl_days = ttl_days
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+        self.max_batches = max_batches
+        self._connect = connect
+        self._sleep = sleep
+
+    @classmethod
+    def from_config(cls) -> CheckpointRetention:
+        return cls(
+            keep_last=CONFIG.CHECKPOINT_KEEP_LAST,
+            ttl_days=CONFIG.CHECKPOINT_THREAD_TTL_DAYS,
+            batch_size=CONFIG.CHECKPOINT_RETENTION_BATCH_SIZE,
+            pause_seconds=CONFIG.CHECKPOINT_RETENTION_PAUSE_SECONDS,
+        )
+
+    def _batches(self, select_sql: str, params: dict, apply: Callable[[psycopg.Cursor, List[str]], RetentionReport],
+                 report: RetentionReport, should_stop: Callable[[], bool]) -> None:
+        for n in range(self.max_batches):
+            if should_stop():
+                return
+            if n:
+                self._sleep(self.pause_seconds)
+            with self._connect() as conn, conn.cursor() as cur:
+                cur.execute(select_sql, {**params, "limit": self.batch_size})
+                thread_ids = [row[0] for row in cur.fetchall()]
+                if not thread_ids:
+                    return
+                report.merge(apply(cur, thread_ids))
+            if len(thread_ids) < self.batch_size:
+                return
+
+    def run_once(self, should_stop: Callable[[], bool] = lambda: False) -> RetentionReport:
+        start = time.perf_counter()
+        report = RetentionReport()
+        if self.ttl_days > 0:
+            get_thread_registry().setup()
+            transcript.setup()
+
+            def expire(cur: psycopg.Cursor, thread_ids: List[str]) -> RetentionReport:
+                expired = _delete_threads(cur, thread_ids)
+                expired.threads_expired = len(thread_ids)
+                return expired
+            try:
+                self._batches(_IDLE_THREADS, {"ttl_days": self.ttl_days}, expire, report, should_stop)
+                with self._connect() as conn, conn.cursor() as cur:
+                    _, size = _delete(cur, _DELETE_THREAD_TOMBSTONES, {"days": _THREAD_TOMBSTONE_DAYS})
+                report.bytes_reclaimed += size
+            except Exception as e:
+                logger.error(f"Checkpoint TTL pruning failed: {type(e).__name__}: {e}")
+                report.errors.append(f"ttl: {type(e).__name__}: {e}")
+        try:
+            self._batches(_THREADS_OVER_LIMIT, {"keep": self.keep_last},
+                          lambda cur, ids: _compact_threads(cur, ids, self.keep_last), report, should_stop)
+        except Exception as e:
+            logger.error(f"Checkpoint compaction failed: {type(e).__name__}: {e}")
+            report.errors.append(f"compaction: {type(e).__name__}: {e}")
+        report.seconds = time.perf_counter() - start
+        logger.info("Checkpoint retention pass", extra={"retention": asdict(report)})
+        return report
+
+
+class RetentionJob:
+    """Runs CheckpointRetention every `interval_seconds` on a daemon thread."""
+
+    def __init__(self, retention: CheckpointRetention, interval_seconds: float):
+        self._retention = retention
+        self._interval = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_report: Optional[RetentionReport] = None
+
+    def start(self) -> None:
+        if self._interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="checkpoint-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self._interval):
+            self.last_report = self._retention.run_once(should_stop=self._stop.is_set)
+
+
+def main() -> None:
+    """One retention pass with the configured limits; prints the report as JSON."""
+    report = CheckpointRetention.from_config().run_once()
+    sys.stdout.write(json.dumps({**asdict(report), "rows_deleted": report.rows_deleted}, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
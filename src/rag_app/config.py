@@ -21,9 +21,11 @@ def _load_env_file() -> Optional[str]:
         raise FileNotFoundError(f"No .env file found at {app_env}")
 
 
-def _int_env(name: str) -> int:
+def _int_env(name: str, default: Optional[int] = None) -> int:
     v = os.getenv(name)
     if v is None or v == "":
+        if default is not None:
+            return default
         raise ValueError(f"{name} is not present in .env file")
     try:
         return int(v)
@@ -31,6 +33,34 @@ def _int_env(name: str) -> int:
         raise ValueError(f"{name} must be an integer, got {v!r}")
 
 
+def _float_env(name: str, default: float) -> float:
+    v = os.getenv(name)
+    if v is None or v == "":
+        return default
+    try:
+        return float(v)
+    except ValueError:
+        raise ValueError(f"{name} must be a number, got {v!r}")
+
+
+def _bool_env(name: str, default: bool) -> bool:
+    v = os.getenv(name)
+    if v is None or v == "":
+        return default
+    if v.strip().lower() in ("1", "true", "yes", "on"):
+        return True
+    if v.strip().lower() in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"{name} must be a boolean, got {v!r}")
+
+
+def _csv_env(name: str, default: Optional[List[str]] = None) -> List[str]:
+    v = os.getenv(name)
+    if v is None or v.strip() == "":
+        return list(default or [])
+    return [item.strip() for item in v.split(",") if item.strip()]
+
+
 def _json_list_env(name: str) -> List[str]:
     v = os.getenv(name)
     if not v:
@@ -56,6 +86,11 @@ class AppConfig:
     DB_USER: Optional[str]
     DB_PWD: Optional[str]
     DOCUMENTS_COLLECTION: Optional[str]
+    DB_POOL_MIN_SIZE: int
+    DB_POOL_MAX_SIZE: int
+    DB_POOL_TIMEOUT_SECONDS: float
+    DB_POOL_MAX_LIFETIME_SECONDS: float
+    DB_POOL_MAX_IDLE_SECONDS: float
 
     # ---- Logging ----
     LEVEL: str
@@ -68,6 +103,47 @@ class AppConfig:
     CHAT_MODEL: Optional[str]
     EMBEDDING_MODEL: Optional[str]
     LLM_HOST: Optional[str]
+    LLM_HOSTS: List[str]
+    EMBEDDING_HOSTS: List[str]
+    BACKEND_HEALTH_PATH: str
+    BACKEND_HEALTH_INTERVAL_SECONDS: float
+    BACKEND_EJECT_AFTER_FAILURES: int
+    BACKEND_EJECT_SECONDS: float
+    LLM_KEEP_ALIVE: str
+    LLM_MAX_CONNECTIONS: int
+    LLM_TIMEOUT_SECONDS: float
+    ROUTER_MODE: str
+    ROUTER_EMBEDDING_MARGIN: float
+    SPECULATIVE_RETRIEVAL: bool
+    SPECULATIVE_MATCH_THRESHOLD: float
+    PROMPT_TOKEN_BUDGET: int
+    PROMPT_HISTORY_TURNS: int
+    PROMPT_TOKENIZER: Optional[str]
+    CHECKPOINT_DURABILITY: str
+    CHECKPOINT_KEEP_LAST: int
+    CHECKPOINT_THREAD_TTL_DAYS: int
+    CHECKPOINT_RETENTION_INTERVAL_SECONDS: int
+    CHECKPOINT_RETENTION_BATCH_SIZE: int
+    CHECKPOINT_RETENTION_PAUSE_SECONDS: float
+    THREAD_REGISTRY_FLUSH_SECONDS: float
+    TRANSCRIPT_CACHE_THREADS: int
+    STARTUP_WARMUP: bool
+    READINESS_RETRY_SECONDS: float
+    WEB_WORKERS: int
+    WORKER_MAX_REQUESTS: int
+    WORKER_MAX_REQUESTS_JITTER: int
+    WORKER_GRACEFUL_TIMEOUT_SECONDS: float
+    CHAT_MAX_CONCURRENCY: int
+    CHAT_MAX_PER_USER: int
+    UPLOAD_MAX_CONCURRENCY: int
+    UPLOAD_MAX_PER_USER: int
+    ADMISSION_QUEUE_SIZE: int
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float
+    ADMISSION_RETRY_AFTER_SECONDS: float
+    DOCUMENT_PURGE_INTERVAL_SECONDS: float
+    DOCUMENT_PURGE_BATCH_SIZE: int
+    DOCUMENT_PURGE_PAUSE_SECONDS: float
+    CHAT_COALESCING: bool
 
     # ---- PDF PARSER ----
     CHUNK_SIZE: int
@@ -81,9 +157,26 @@ class AppConfig:
     RERANKER_MODEL_NAME: str
     RERANKER_TOP_N_RETRIEVED_DOCS: int
 
+    # ---- RETRIEVAL ----
+    USER_INDEX_ENABLED: bool
+    USER_INDEX_MEMORY_BUDGET_MB: int
+    USER_INDEX_HOT_THRESHOLD: int
+    MMR_TOP_K: int
+    MMR_LAMBDA: float
+    RETRIEVAL_MODE: str
+    EARLY_EXIT_SIMILARITY_GAP: float
+    RERANK_STAGE_SIZE: int
+    RERANK_CONFIDENT_MARGIN: float
+    EXPAND_SCOPE: str
+    EXPAND_WINDOW: int
+    EXPAND_MAX_CHARS: int
+
     # ---- AUTH
     JWT_SECRET: str
     JWT_ALG: str
+    JWT_JWKS_URL: str
+    JWT_JWKS_CACHE_SECONDS: int
+    JWT_CLAIMS_CACHE_SIZE: int
     GOTRUE_URL: str
 
     # Which env file was loaded (informational)
@@ -92,6 +185,7 @@ class AppConfig:
     @classmethod
     def from_env(cls) -> "AppConfig":
         loaded = _load_env_file()
+        llm_hosts = _csv_env("LLM_HOSTS", [os.getenv("LLM_HOST")] if os.getenv("LLM_HOST") else [])
 
         return cls(
             loaded_env_file=loaded,
@@ -101,6 +195,11 @@ class AppConfig:
             DB_USER=os.getenv("DB_USER"),
             DB_PWD=os.getenv("DB_PWD"),
             DOCUMENTS_COLLECTION=os.getenv("DOCUMENTS_COLLECTION"),
+            DB_POOL_MIN_SIZE=_int_env("DB_POOL_MIN_SIZE", 2),
+            DB_POOL_MAX_SIZE=_int_env("DB_POOL_MAX_SIZE", 10),
+            DB_POOL_TIMEOUT_SECONDS=_float_env("DB_POOL_TIMEOUT_SECONDS", 30.0),
+            DB_POOL_MAX_LIFETIME_SECONDS=_float_env("DB_POOL_MAX_LIFETIME_SECONDS", 1800.0),
+            DB_POOL_MAX_IDLE_SECONDS=_float_env("DB_POOL_MAX_IDLE_SECONDS", 300.0),
             # LOGGING
             LEVEL=os.getenv("LEVEL"),
             UVICORN_LEVEL=os.getenv("UVICORN_LEVEL"),
@@ -110,6 +209,47 @@ class AppConfig:
             CHAT_MODEL=os.getenv("CHAT_MODEL"),
             EMBEDDING_MODEL=os.getenv("EMBEDDING_MODEL"),
             LLM_HOST=os.getenv("LLM_HOST"),
+            LLM_HOSTS=llm_hosts,
+            EMBEDDING_HOSTS=_csv_env("EMBEDDING_HOSTS", llm_hosts),
+            BACKEND_HEALTH_PATH=os.getenv("BACKEND_HEALTH_PATH") or "/api/version",
+            BACKEND_HEALTH_INTERVAL_SECONDS=_float_env("BACKEND_HEALTH_INTERVAL_SECONDS", 10.0),
+            BACKEND_EJECT_AFTER_FAILURES=_int_env("BACKEND_EJECT_AFTER_FAILURES", 3),
+            BACKEND_EJECT_SECONDS=_float_env("BACKEND_EJECT_SECONDS", 30.0),
+            LLM_KEEP_ALIVE=os.getenv("LLM_KEEP_ALIVE") or "30m",
+            LLM_MAX_CONNECTIONS=_int_env("LLM_MAX_CONNECTIONS", 32),
+            LLM_TIMEOUT_SECONDS=_float_env("LLM_TIMEOUT_SECONDS", 120.0),
+            ROUTER_MODE=os.getenv("ROUTER_MODE") or "rules",
+            ROUTER_EMBEDDING_MARGIN=_float_env("ROUTER_EMBEDDING_MARGIN", 0.05),
+            SPECULATIVE_RETRIEVAL=_bool_env("SPECULATIVE_RETRIEVAL", True),
+            SPECULATIVE_MATCH_THRESHOLD=_float_env("SPECULATIVE_MATCH_THRESHOLD", 0.6),
+            PROMPT_TOKEN_BUDGET=_int_env("PROMPT_TOKEN_BUDGET", 3000),
+            PROMPT_HISTORY_TURNS=_int_env("PROMPT_HISTORY_TURNS", 4),
+            PROMPT_TOKENIZER=os.getenv("PROMPT_TOKENIZER") or None,
+            CHECKPOINT_DURABILITY=os.getenv("CHECKPOINT_DURABILITY") or "async",
+            CHECKPOINT_KEEP_LAST=_int_env("CHECKPOINT_KEEP_LAST", 5),
+            CHECKPOINT_THREAD_TTL_DAYS=_int_env("CHECKPOINT_THREAD_TTL_DAYS", 0),
+            CHECKPOINT_RETENTION_INTERVAL_SECONDS=_int_env("CHECKPOINT_RETENTION_INTERVAL_SECONDS", 3600),
+            CHECKPOINT_RETENTION_BATCH_SIZE=_int_env("CHECKPOINT_RETENTION_BATCH_SIZE", 100),
+            CHECKPOINT_RETENTION_PAUSE_SECONDS=_float_env("CHECKPOINT_RETENTION_PAUSE_SECONDS", 0.5),
+            THREAD_REGISTRY_FLUSH_SECONDS=_float_env("THREAD_REGISTRY_FLUSH_SECONDS", 5.0),
+            TRANSCRIPT_CACHE_THREADS=_int_env("TRANSCRIPT_CACHE_THREADS", 1024),
+            STARTUP_WARMUP=_bool_env("STARTUP_WARMUP", True),
+            READINESS_RETRY_SECONDS=_float_env("READINESS_RETRY_SECONDS", 5.0),
+            WEB_WORKERS=_int_env("WEB_WORKERS", 1),
+            WORKER_MAX_REQUESTS=_int_env("WORKER_MAX_REQUESTS", 0),
+            WORKER_MAX_REQUESTS_JITTER=_int_env("WORKER_MAX_REQUESTS_JITTER", 0),
+            WORKER_GRACEFUL_TIMEOUT_SECONDS=_float_env("WORKER_GRACEFUL_TIMEOUT_SECONDS", 30.0),
+            CHAT_MAX_CONCURRENCY=_int_env("CHAT_MAX_CONCURRENCY", 16),
+            CHAT_MAX_PER_USER=_int_env("CHAT_MAX_PER_USER", 2),
+            UPLOAD_MAX_CONCURRENCY=_int_env("UPLOAD_MAX_CONCURRENCY", 2),
+            UPLOAD_MAX_PER_USER=_int_env("UPLOAD_MAX_PER_USER", 1),
+            ADMISSION_QUEUE_SIZE=_int_env("ADMISSION_QUEUE_SIZE", 32),
+            ADMISSION_QUEUE_TIMEOUT_SECONDS=_float_env("ADMISSION_QUEUE_TIMEOUT_SECONDS", 10.0),
+            ADMISSION_RETRY_AFTER_SECONDS=_float_env("ADMISSION_RETRY_AFTER_SECONDS", 5.0),
+            DOCUMENT_PURGE_INTERVAL_SECONDS=_float_env("DOCUMENT_PURGE_INTERVAL_SECONDS", 300.0),
+            DOCUMENT_PURGE_BATCH_SIZE=_int_env("DOCUMENT_PURGE_BATCH_SIZE", 500),
+            DOCUMENT_PURGE_PAUSE_SECONDS=_float_env("DOCUMENT_PURGE_PAUSE_SECONDS", 0.1),
+            CHAT_COALESCING=_bool_env("CHAT_COALESCING", True),
             # PDF PARSER
             CHUNK_SIZE=_int_env("CHUNK_SIZE"),
             CHUNK_OVERLAP=_int_env("CHUNK_OVERLAP"),
@@ -121,8 +261,24 @@ class AppConfig:
             UNSTRUCTURED_MODE=os.getenv("UNSTRUCTURED_MODE"),
             RERANKER_MODEL_NAME=os.getenv("RERANKER_MODEL_NAME"),
             RERANKER_TOP_N_RETRIEVED_DOCS=int(os.getenv("RERANKER_TOP_N_RETRIEVED_DOCS")),
+            # RETRIEVAL
+            USER_INDEX_ENABLED=_bool_env("USER_INDEX_ENABLED", False),
+            USER_INDEX_MEMORY_BUDGET_MB=_int_env("USER_INDEX_MEMORY_BUDGET_MB", 512),
+            USER_INDEX_HOT_THRESHOLD=_int_env("USER_INDEX_HOT_THRESHOLD", 3),
+            MMR_TOP_K=_int_env("MMR_TOP_K", 12),
+            MMR_LAMBDA=_float_env("MMR_LAMBDA", 0.7),
+            RETRIEVAL_MODE=os.getenv("RETRIEVAL_MODE") or "rerank",
+            EARLY_EXIT_SIMILARITY_GAP=_float_env("EARLY_EXIT_SIMILARITY_GAP", 0.15),
+            RERANK_STAGE_SIZE=_int_env("RERANK_STAGE_SIZE", 8),
+            RERANK_CONFIDENT_MARGIN=_float_env("RERANK_CONFIDENT_MARGIN", 3.0),
+            EXPAND_SCOPE=os.getenv("EXPAND_SCOPE") or "neighbors",
+            EXPAND_WINDOW=_int_env("EXPAND_WINDOW", 1),
+            EXPAND_MAX_CHARS=_int_env("EXPAND_MAX_CHARS", 4000),
             JWT_SECRET=os.getenv("JWT_SECRET"),
             JWT_ALG=os.getenv("JWT_ALG"),
+            JWT_JWKS_URL=os.getenv("JWT_JWKS_URL") or "",
+            JWT_JWKS_CACHE_SECONDS=_int_env("JWT_JWKS_CACHE_SECONDS", 300),
+            JWT_CLAIMS_CACHE_SIZE=_int_env("JWT_CLAIMS_CACHE_SIZE", 10_000),
             GOTRUE_URL=os.getenv("GOTRUE_URL"),
         )
 
@@ -144,4 +300,3 @@ class AppConfig:
 
 
 CONFIG = AppConfig.from_env()
-CONFIG.pretty_print()
\ No newline at end of file
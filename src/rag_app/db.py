@@ -1,10 +1,10 @@
 import bs4
 from langchain_community.document_loaders import WebBaseLoader
-from langchain_ollama import OllamaEmbeddings
 from langchain_postgres import PGVector
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-from rag_app.config import CONFIG, get_postgres_connection_string
+from rag_app.config import get_postgres_connection_string
+from rag_app.llm_singleton import get_embeddings
 
 
 def index_document(vector_store: PGVector):
@@ -25,7 +25,7 @@ def index_document(vector_store: PGVector):
 
 
 def create_vector_store() -> PGVector:
-    embeddings = OllamaEmbeddings(model=CONFIG.EMBEDDING_MODEL)
+    embeddings = get_embeddings()
     return PGVector(
         embeddings=embeddings,
         collection_name="my_docs",
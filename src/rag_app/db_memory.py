@@ -1,41 +1,59 @@
+from contextlib import nullcontext
+from functools import lru_cache
+
 from langgraph.checkpoint.postgres import PostgresSaver
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 from langgraph.store.postgres import PostgresStore
-from psycopg import Connection
+from langgraph.store.postgres.aio import AsyncPostgresStore
+from psycopg_pool import AsyncConnectionPool
 
-from rag_app.agent.graph_configuration import GraphRunConfig
-from rag_app.config import get_postgres_connection_string
+from rag_app.db_pool import get_async_pool, get_pool
+from rag_app.tracing import TimedCheckpointSaver
+from rag_app.transcript import TranscriptRecorder
 
 
 def create_postgres_checkpointer():
-    db_conn = get_postgres_connection_string()
-    conn = Connection.connect(db_conn, **{
-        "autocommit": True,
-        "prepare_threshold": 0,
-    })
-    checkpointer = PostgresSaver(conn)
+    checkpointer = PostgresSaver(get_pool())
     checkpointer.setup()
     return checkpointer
 
 
-CHECKPOINTER = create_postgres_checkpointer()
+@lru_cache(maxsize=1)
+def get_checkpointer() -> PostgresSaver:
+    """ sync checkpointer for scripts and worker threads, created (and migrated) on first use """
+    return create_postgres_checkpointer()
+
 
 def create_postgres_store():
-    db_conn = get_postgres_connection_string()
-    conn = Connection.connect(db_conn, **{
-        "autocommit": True,
-        "prepare_threshold": 0,
-    })
-    store = PostgresStore(conn)
+    store = PostgresStore(get_pool())
     store.setup()
     return store
 
 
-STORE = create_postgres_store()
+@lru_cache(maxsize=1)
+def get_store() -> PostgresStore:
+    return create_postgres_store()
+
+
+class TimedAsyncPostgresSaver(TranscriptRecorder, TimedCheckpointSaver, AsyncPostgresSaver):
+    """ AsyncPostgresSaver reporting its writes as the checkpoint_write stage and recording the transcript """
+
+    def __init__(self, conn, *args, **kwargs):
+        super().__init__(conn, *args, **kwargs)
+        if isinstance(conn, AsyncConnectionPool):
+            # the saver's lock only guards a single shared connection; the pool never hands one
+            # out twice (AsyncPostgresStore skips it the same way), so threads run concurrently
+            self.lock = nullcontext()
 
 
-def store_user_conversation_history(config: GraphRunConfig):
-    """ stores the thread ids chat history using the user_id as a key"""
-    serializable_state = {
-        "config": config.model_dump()
-    }
-    STORE.put(namespace=("chat_history", config.user_id), key=config.thread_id, value=serializable_state)
+async def create_async_postgres_checkpointer() -> AsyncPostgresSaver:
+    """ checkpointer for the async graph; must be created inside the running event loop """
+    checkpointer = TimedAsyncPostgresSaver(await get_async_pool())
+    await checkpointer.setup()
+    return checkpointer
+
+
+async def create_async_postgres_store() -> AsyncPostgresStore:
+    store = AsyncPostgresStore(await get_async_pool())
+    await store.setup()
+    return store
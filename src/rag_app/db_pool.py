@@ -0,0 +1,130 @@
+"""
+Process-wide psycopg connection pools.
+
+Every Postgres user in the app (LangGraph checkpointer and store, document and
+vector SQL, thread registry, retention) borrows connections from these pools
+instead of holding a dedicated connection or opening a new one per call. The
+sync pool is for blocking code and worker threads; the async pool, which needs
+a running loop, is for the async graph. Connections are autocommit, checked
+before being handed out, and recycled after DB_POOL_MAX_LIFETIME_SECONDS.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+import psycopg
+from pgvector.psycopg import register_vector
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+
+from rag_app.config import CONFIG, get_postgres_connection_string
+from rag_app.tracing import register_collector
+
+logger = logging.getLogger(__name__)
+
+# what LangGraph's Postgres savers require of their connections
+CONNECTION_KWARGS: Dict[str, Any] = {"autocommit": True, "prepare_threshold": 0}
+# get_stats() keys that are levels rather than running totals
+_GAUGES = ("pool_min", "pool_max", "pool_size", "pool_available", "requests_waiting")
+
+_POOL: Optional[ConnectionPool] = None
+_POOL_LOCK = Lock()
+_ASYNC_POOL: Optional[AsyncConnectionPool] = None
+_ASYNC_POOL_LOCK = asyncio.Lock()
+
+
+def _pool_settings() -> Dict[str, Any]:
+    return {
+        "kwargs": CONNECTION_KWARGS,
+        "min_size": CONFIG.DB_POOL_MIN_SIZE,
+        "max_size": CONFIG.DB_POOL_MAX_SIZE,
+        "timeout": CONFIG.DB_POOL_TIMEOUT_SECONDS,
+        "max_lifetime": CONFIG.DB_POOL_MAX_LIFETIME_SECONDS,
+        "max_idle": CONFIG.DB_POOL_MAX_IDLE_SECONDS,
+    }
+
+
+def get_pool() -> ConnectionPool:
+    """ The shared sync pool, opened on first use """
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = ConnectionPool(get_postgres_connection_string(), name="sync",
+                                       check=ConnectionPool.check_connection, open=True, **_pool_settings())
+    return _POOL
+
+
+async def get_async_pool() -> AsyncConnectionPool:
+    """ The shared async pool; must first be requested inside the running event loop """
+    global _ASYNC_POOL
+    if _ASYNC_POOL is None:
+        async with _ASYNC_POOL_LOCK:
+            if _ASYNC_POOL is None:
+                pool = AsyncConnectionPool(get_postgres_connection_string(), name="async",
+                                           check=AsyncConnectionPool.check_connection, open=False,
+                                           **_pool_settings())
+                await pool.open()
+                _ASYNC_POOL = pool
+    return _ASYNC_POOL
+
+
+@contextmanager
+def connection() -> Iterator[psycopg.Connection]:
+    """ A pooled (autocommit) connection, returned to the pool on exit """
+    with get_pool().connection() as conn:
+        yield conn
+
+
+@contextmanager
+def transaction() -> Iterator[psycopg.Connection]:
+    """ A pooled connection inside one transaction: committed on success, rolled back on error """
+    with get_pool().connection() as conn, conn.transaction():
+        yield conn
+
+
+def ensure_vector(conn: psycopg.Connection) -> None:
+    """ Register the pgvector adapters on `conn`, once per physical connection """
+    if conn.adapters.types.get("vector") is None:
+        register_vector(conn)
+
+
+@contextmanager
+def vector_connection() -> Iterator[psycopg.Connection]:
+    """ A pooled connection with the pgvector adapters """
+    with get_pool().connection() as conn:
+        ensure_vector(conn)
+        yield conn
+
+
+async def close_pools() -> None:
+    global _POOL, _ASYNC_POOL
+    if _ASYNC_POOL is not None:
+        await _ASYNC_POOL.close()
+        _ASYNC_POOL = None
+    if _POOL is not None:
+        _POOL.close()
+        _POOL = None
+
+
+def pool_stats() -> Dict[str, Dict[str, int]]:
+    """ psycopg_pool statistics of the pools opened so far """
+    return {pool.name: pool.get_stats() for pool in (_POOL, _ASYNC_POOL) if pool is not None}
+
+
+def _render_pool_metrics() -> Iterable[str]:
+    stats = pool_stats()
+    keys = sorted({key for values in stats.values() for key in values})
+    for key in keys:
+        gauge = key in _GAUGES
+        name = f"rag_db_{key}" if gauge else f"rag_db_{key}_total"
+        yield f"# TYPE {name} {'gauge' if gauge else 'counter'}"
+        for pool_name, values in sorted(stats.items()):
+            if key in values:
+                yield f'{name}{{pool="{pool_name}"}} {values[key]}'
+
+
+register_collector(_render_pool_metrics)
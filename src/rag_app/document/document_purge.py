@@ -0,0 +1,199 @@
+"""
+Background removal of deleted documents' chunks.
+
+DELETE /document/{id} only marks the registry row (`document_registry.mark_deleted`),
+which hides the document from listings and retrieval at once. This job then
+deletes its chunks `batch_size` at a time, one short transaction per batch
+with a pause in between, so a large document never holds locks or writes a
+burst of WAL while a request waits. Each batch holds a per-document advisory
+lock, so two purgers never work on one document. The registry row goes only
+once no chunk is left: a short batch may just have skipped chunks another
+transaction has locked, and a row dropped under them would bring them back
+into retrieval should that transaction roll back. It is woken by every delete
+and also sweeps on an interval, which picks up documents left half-purged by
+a restart. The app's lifespan starts it only in the process that runs the
+background jobs (worker 0 with WEB_WORKERS > 1).
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+from functools import lru_cache
+from typing import Callable, ContextManager, List, Optional, Tuple
+
+import psycopg
+
+from rag_app.config import CONFIG
+from rag_app.db_pool import transaction
+from rag_app.document import document_registry
+
+logger = logging.getLogger(__name__)
+
+_PENDING = """
+    SELECT collection, user_id, document_id
+    FROM documents
+    WHERE deleted_at IS NOT NULL
+    ORDER BY deleted_at
+    LIMIT %(limit)s;
+    """
+
+_LOCK_DOCUMENT = """
+    SELECT pg_advisory_xact_lock(hashtext(%(collection)s || '/' || %(user_id)s || '/' || %(document_id)s));
+    """
+
+# only while the row is still marked deleted: a re-upload of the same file revives it
+_DELETE_CHUNKS = """
+    WITH doomed AS (
+        SELECT e.id
+        FROM langchain_pg_embedding e
+            JOIN langchain_pg_collection c ON e.collection_id = c.uuid
+        WHERE c.name = %(collection)s
+          AND e.cmetadata->>'user_id' = %(user_id)s
+          AND e.cmetadata->>'document_id' = %(document_id)s
+          AND EXISTS (SELECT 1 FROM documents d
+                      WHERE d.collection = %(collection)s AND d.user_id = %(user_id)s
+                        AND d.document_id = %(document_id)s AND d.deleted_at IS NOT NULL)
+        LIMIT %(limit)s
+        FOR UPDATE OF e SKIP LOCKED
+    ), deleted AS (
+        DELETE FROM langchain_pg_embedding e USING doomed WHERE e.id = doomed.id
+        RETURNING 1
+    )
+    SELECT count(*) FROM deleted;
+    """
+
+
+def lock_document(conn: psycopg.Connection, *, collection: str, user_id: str, document_id: str) -> None:
+    """Serialize purging a document until `conn`'s transaction ends."""
+    conn.execute(_LOCK_DOCUMENT, {"collection": collection, "user_id": user_id, "document_id": document_id})
+
+
+def delete_chunks(conn: psycopg.Connection, *, collection: str, user_id: str, document_id: str,
+                  limit: Optional[int] = None) -> int:
+    """Delete up to `limit` (all, when None) chunks of a document marked deleted; returns how many."""
+    params = {"collection": collection, "user_id": user_id, "document_id": document_id, "limit": limit}
+    return int(conn.execute(_DELETE_CHUNKS, params).fetchone()[0])
+
+
+@dataclass
+class PurgeReport:
+    documents_purged: int = 0
+    chunks_deleted: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+
+class DocumentPurger:
+    """
+    Works through the documents marked deleted, oldest first.
+    Each batch of at most `batch_size` chunks is one transaction; the purger
+    sleeps `pause_seconds` between batches so it never monopolises the DB.
+    """
+
+    def __init__(self, *, batch_size: int = 500, pause_seconds: float = 0.1, max_batches: int = 10_000,
+                 connect: Callable[[], ContextManager[psycopg.Connection]] = transaction,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.batch_size = max(1, batch_size)
+        self.pause_seconds = pause_seconds
+        self.max_batches = max_batches
+        self._connect = connect
+        self._sleep = sleep
+
+    @classmethod
+    def from_config(cls) -> DocumentPurger:
+        return cls(batch_size=CONFIG.DOCUMENT_PURGE_BATCH_SIZE, pause_seconds=CONFIG.DOCUMENT_PURGE_PAUSE_SECONDS)
+
+    def _pending(self) -> List[Tuple[str, str, str]]:
+        with self._connect() as conn, conn.cursor() as cur:
+            cur.execute(_PENDING, {"limit": 100})
+            return [tuple(row) for row in cur.fetchall()]
+
+    def _purge(self, collection: str, user_id: str, document_id: str, report: PurgeReport,
+               should_stop: Callable[[], bool]) -> None:
+        while report.batches < self.max_batches and not should_stop():
+            if report.batches:
+                self._sleep(self.pause_seconds)
+            report.batches += 1
+            with self._connect() as conn:
+                lock_document(conn, collection=collection, user_id=user_id, document_id=document_id)
+                deleted = delete_chunks(conn, collection=collection, user_id=user_id, document_id=document_id,
+                                        limit=self.batch_size)
+                report.chunks_deleted += deleted
+                if deleted < self.batch_size:
+                    # a no-op while chunks remain that another transaction holds: a later sweep retries
+                    if document_registry.forget_document(conn, collection=collection, user_id=user_id,
+                                                         document_id=document_id):
+                        report.documents_purged += 1
+                    return
+
+    def run_once(self, should_stop: Callable[[], bool] = lambda: False) -> PurgeReport:
+        start = time.perf_counter()
+        report = PurgeReport()
+        try:
+            document_registry.setup()
+            while not should_stop() and report.batches < self.max_batches:
+                pending = self._pending()
+                purged = report.documents_purged
+                for collection, user_id, document_id in pending:
+                    self._purge(collection, user_id, document_id, report, should_stop)
+                if report.documents_purged == purged:
+                    break
+        except Exception as e:
+            logger.error(f"Document purge failed: {type(e).__name__}: {e}")
+            report.errors.append(f"{type(e).__name__}: {e}")
+        report.seconds = time.perf_counter() - start
+        if report.chunks_deleted or report.errors:
+            logger.info("Document purge pass", extra={"purge": asdict(report)})
+        return report
+
+
+class DocumentPurgeJob:
+    """
+    Runs DocumentPurger on a daemon thread after every `wake()` and every
+    `interval_seconds`, once `start()` has been called; the caller decides
+    which process runs it, and until then `wake()` is a no-op.
+    """
+
+    def __init__(self, purger: DocumentPurger, interval_seconds: float):
+        self._purger = purger
+        self._interval = interval_seconds if interval_seconds > 0 else None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.last_report: Optional[PurgeReport] = None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="document-purge", daemon=True)
+            self._thread.start()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self._interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            self.last_report = self._purger.run_once(should_stop=self._stop.is_set)
+
+
+@lru_cache(maxsize=1)
+def get_purge_job() -> DocumentPurgeJob:
+    return DocumentPurgeJob(DocumentPurger.from_config(), CONFIG.DOCUMENT_PURGE_INTERVAL_SECONDS)
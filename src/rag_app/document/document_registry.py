@@ -0,0 +1,213 @@
+"""
+Registry of uploaded documents, one row per document.
+
+Written in the same transaction as the document's chunks, so listing a user's
+documents is an indexed keyset query on (user_id, created_at) instead of a
+JSONB GROUP BY over every chunk they own. Documents ingested before the table
+existed are backfilled from their chunks once, when the table is created;
+their byte size is unknown and left NULL.
+
+Deleting a document only sets `deleted_at`: listings and retrieval skip it
+from then on, and `document_purge` removes its chunks (then the row) in small
+background batches.
+"""
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+import psycopg
+
+from rag_app.db_pool import connection
+
+_SETUP = """
+    CREATE TABLE IF NOT EXISTS documents (
+        collection TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        document_id TEXT NOT NULL,
+        file_name TEXT NOT NULL,
+        page_count INT NOT NULL DEFAULT 0,
+        chunk_count INT NOT NULL DEFAULT 0,
+        byte_size BIGINT,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (collection, user_id, document_id)
+    );
+    ALTER TABLE documents ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ;
+    CREATE INDEX IF NOT EXISTS documents_user_created_idx
+        ON documents (collection, user_id, created_at DESC, document_id DESC);
+    CREATE INDEX IF NOT EXISTS documents_deleted_idx
+        ON documents (deleted_at) WHERE deleted_at IS NOT NULL;
+    """
+
+# one-off backfill from the chunks of documents ingested before the registry existed
+_BACKFILL = """
+    INSERT INTO documents (collection, user_id, document_id, file_name, page_count, chunk_count, created_at, updated_at)
+    SELECT c.name,
+           e.cmetadata->>'user_id',
+           e.cmetadata->>'document_id',
+           MIN(e.cmetadata->>'file_name'),
+           COUNT(DISTINCT COALESCE(e.cmetadata->>'page_number', e.cmetadata->>'page')),
+           COUNT(*),
+           MIN(COALESCE((e.cmetadata->>'ingested_at')::timestamptz, now())),
+           MAX(COALESCE((e.cmetadata->>'ingested_at')::timestamptz, now()))
+    FROM langchain_pg_embedding e
+        JOIN langchain_pg_collection c ON e.collection_id = c.uuid
+    WHERE e.cmetadata ? 'user_id' AND e.cmetadata ? 'document_id'
+      AND NOT EXISTS (SELECT 1 FROM documents LIMIT 1)
+    GROUP BY 1, 2, 3
+    ON CONFLICT DO NOTHING;
+    """
+
+_RECORD = """
+    INSERT INTO documents (collection, user_id, document_id, file_name, page_count, chunk_count, byte_size,
+                           created_at, updated_at)
+    VALUES (%(collection)s, %(user_id)s, %(document_id)s, %(file_name)s, %(page_count)s, %(chunk_count)s,
+            %(byte_size)s, %(created_at)s, %(created_at)s)
+    ON CONFLICT (collection, user_id, document_id) DO UPDATE
+        SET file_name = EXCLUDED.file_name,
+            page_count = EXCLUDED.page_count,
+            chunk_count = EXCLUDED.chunk_count,
+            byte_size = EXCLUDED.byte_size,
+            updated_at = EXCLUDED.updated_at,
+            deleted_at = NULL;
+    """
+
+_STATE = """
+    SELECT deleted_at IS NOT NULL FROM documents
+    WHERE collection = %(collection)s AND user_id = %(user_id)s AND document_id = %(document_id)s;
+    """
+
+_LIST = """
+    SELECT document_id, file_name, page_count, chunk_count, byte_size, created_at, updated_at
+    FROM documents
+    WHERE collection = %(collection)s
+      AND user_id = %(user_id)s
+      AND deleted_at IS NULL
+      AND (%(after_created_at)s::timestamptz IS NULL
+           OR (created_at, document_id) < (%(after_created_at)s::timestamptz, %(after_document_id)s::text))
+    ORDER BY created_at DESC, document_id DESC
+    LIMIT %(limit)s;
+    """
+
+_MARK_DELETED = """
+    UPDATE documents SET deleted_at = now()
+    WHERE collection = %(collection)s AND user_id = %(user_id)s AND document_id = %(document_id)s
+      AND deleted_at IS NULL
+    RETURNING chunk_count;
+    """
+
+_FORGET = """
+    DELETE FROM documents
+    WHERE collection = %(collection)s AND user_id = %(user_id)s AND document_id = %(document_id)s
+      AND deleted_at IS NOT NULL
+      AND NOT EXISTS (SELECT 1
+                      FROM langchain_pg_embedding e
+                          JOIN langchain_pg_collection c ON e.collection_id = c.uuid
+                      WHERE c.name = %(collection)s
+                        AND e.cmetadata->>'user_id' = %(user_id)s
+                        AND e.cmetadata->>'document_id' = %(document_id)s);
+    """
+
+# chunks of documents marked deleted; added to every retrieval query on langchain_pg_embedding `e`
+# joined to langchain_pg_collection `c`
+NOT_DELETED = """
+    NOT EXISTS (SELECT 1 FROM documents d
+                WHERE d.collection = c.name
+                  AND d.user_id = e.cmetadata->>'user_id'
+                  AND d.document_id = e.cmetadata->>'document_id'
+                  AND d.deleted_at IS NOT NULL)
+    """
+
+
+@dataclass(frozen=True)
+class DocumentRecord:
+    document_id: str
+    file_name: str
+    page_count: int
+    chunk_count: int
+    byte_size: Optional[int]
+    created_at: datetime
+    updated_at: datetime
+
+
+_ready = False
+_ready_lock = threading.Lock()
+
+
+def setup(conn: Optional[psycopg.Connection] = None) -> None:
+    """Create the table (and backfill it from existing chunks) once per process."""
+    global _ready
+    if _ready:
+        return
+    with _ready_lock:
+        if _ready:
+            return
+        if conn is None:
+            with connection() as own:
+                _create(own)
+        else:
+            _create(conn)
+        _ready = True
+
+
+def _create(conn: psycopg.Connection) -> None:
+    conn.execute(_SETUP)
+    if conn.execute("SELECT to_regclass('langchain_pg_embedding')").fetchone()[0] is not None:
+        conn.execute(_BACKFILL)
+
+
+def record_document(conn: psycopg.Connection, *, collection: str, user_id: str, document_id: str, file_name: str,
+                    page_count: int, chunk_count: int, byte_size: Optional[int], created_at: datetime) -> None:
+    """Register a document on `conn`, inside the transaction that inserts its chunks."""
+    setup()
+    conn.execute(_RECORD, {
+        "collection": collection, "user_id": user_id, "document_id": document_id, "file_name": file_name,
+        "page_count": page_count, "chunk_count": chunk_count, "byte_size": byte_size, "created_at": created_at,
+    })
+
+
+def mark_deleted(*, collection: str, user_id: str, document_id: str) -> Optional[int]:
+    """Hide a live document from listings and retrieval; its chunk count, or None if there is no such document."""
+    setup()
+    with connection() as conn:
+        params = {"collection": collection, "user_id": user_id, "document_id": document_id}
+        row = conn.execute(_MARK_DELETED, params).fetchone()
+    return row[0] if row else None
+
+
+def forget_document(conn: psycopg.Connection, *, collection: str, user_id: str, document_id: str) -> int:
+    """
+    Drop the row of a deleted document if none of its chunks is left (a
+    re-upload in between revives it); returns 1 if dropped, else 0.
+    """
+    setup()
+    return conn.execute(_FORGET, {"collection": collection, "user_id": user_id, "document_id": document_id}).rowcount
+
+
+def document_state(*, collection: str, user_id: str, document_id: str) -> Optional[str]:
+    """"live", "deleted" (chunks still being purged) or None when the document is unknown."""
+    setup()
+    with connection() as conn:
+        params = {"collection": collection, "user_id": user_id, "document_id": document_id}
+        row = conn.execute(_STATE, params).fetchone()
+    if row is None:
+        return None
+    return "deleted" if row[0] else "live"
+
+
+def list_documents(*, collection: str, user_id: str, limit: int,
+                   after: Optional[tuple] = None) -> List[DocumentRecord]:
+    """Up to `limit` documents, newest first, strictly after the (created_at, document_id) key `after`."""
+    setup()
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(_LIST, {
+            "collection": collection,
+            "user_id": user_id,
+            "after_created_at": after[0] if after else None,
+            "after_document_id": after[1] if after else None,
+            "limit": limit,
+        })
+        return [DocumentRecord(*row) for row in cur.fetchall()]
@@ -1,13 +1,16 @@
 import logging
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
-import psycopg
 from fastapi import HTTPException
 from pydantic import BaseModel, Field
 from starlette import status
 
-from rag_app.config import CONFIG, get_postgres_connection_string
+from rag_app.config import CONFIG
+from rag_app.document.document_purge import get_purge_job
+from rag_app.document.document_registry import DocumentRecord, list_documents, mark_deleted
+from rag_app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, decode_cursor, encode_cursor
+from rag_app.retrieval.user_index import USER_INDEX_CACHE
 
 
 class UserDocument(BaseModel):
@@ -15,72 +18,78 @@ class UserDocument(BaseModel):
     user_id: str = Field(...)
     document_id: str = Field(...)
     created_at: datetime | None = None
+    updated_at: datetime | None = None
+    page_count: int | None = None
+    chunk_count: int | None = None
+    byte_size: int | None = None
+
+
+class DocumentPage(BaseModel):
+    documents: List[UserDocument] = Field(default_factory=list)
+    next_cursor: Optional[str] = None
+
+
+def _to_user_document(user_id: str, record: DocumentRecord) -> UserDocument:
+    return UserDocument(user_id=user_id, file_name=record.file_name, document_id=record.document_id,
+                        created_at=record.created_at, updated_at=record.updated_at, page_count=record.page_count,
+                        chunk_count=record.chunk_count, byte_size=record.byte_size)
+
+
+def list_user_documents_page(user_id: str, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> DocumentPage:
+    """
+    One page of the user's documents, newest first, read from the documents registry.
+    `next_cursor` is set when more documents follow.
+    """
+    try:
+        after = decode_cursor(cursor, 2)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    try:
+        records = list_documents(collection=CONFIG.DOCUMENTS_COLLECTION, user_id=user_id, limit=limit + 1,
+                                 after=tuple(after) if after else None)
+    except Exception as e:
+        logging.error(f"DB error: {type(e).__name__}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"DB error: {type(e).__name__}: {e}",
+        )
+    page = records[:limit]
+    next_cursor = encode_cursor(page[-1].created_at, page[-1].document_id) if len(records) > limit else None
+    return DocumentPage(documents=[_to_user_document(user_id, r) for r in page], next_cursor=next_cursor)
 
 
 def list_user_documents(user_id: str) -> List[UserDocument]:
     """
-    Return one record per uploaded document for this user.
-    Assumes chunks were saved with metadata keys:
-      - user_id
-      - doc_id
-      - file_name
-      - ingested_at
+    Return one record per uploaded document for this user, newest first
+    (every page of `list_user_documents_page`); 404 when there are none.
     """
-    sql = """
-          SELECT e.cmetadata ->>'user_id' AS user_id, e.cmetadata->>'file_name' AS file_name, e.cmetadata->>'document_id' AS document_id, MIN (COALESCE ((e.cmetadata->>'ingested_at')::timestamptz, NOW())) AS created_at
-          FROM langchain_pg_embedding e
-              JOIN langchain_pg_collection c
-          ON e.collection_id = c.uuid
-          WHERE c.name = %s
-            AND e.cmetadata->>'user_id' = %s
-          GROUP BY 1, 2, 3
-          ORDER BY created_at DESC;
-          """
-    with psycopg.connect(get_postgres_connection_string()) as conn, conn.cursor() as cur:
-        try:
-            cur.execute(sql, (CONFIG.DOCUMENTS_COLLECTION, user_id))
-            rows: list[tuple] = cur.fetchall()
-            if len(rows) == 0:
-                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-            return [
-                UserDocument(user_id=row[0], file_name=row[1], document_id=row[2], created_at=row[3])
-                for row in rows
-            ]
-        except HTTPException as e:
-            raise e
-        except Exception as e:
-            logging.error(f"DB error: {type(e).__name__}: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"DB error: {type(e).__name__}: {e}",
-            )
+    documents: List[UserDocument] = []
+    cursor = None
+    while True:
+        page = list_user_documents_page(user_id, limit=MAX_PAGE_SIZE, cursor=cursor)
+        documents.extend(page.documents)
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+    if not documents:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return documents
 
 
 def delete_user_document(user_id: str, document_id: str) -> int:
     """
-    Delete all chunks of a document for a given user.
-    Returns number of rows deleted.
+    Hide a document from listings and retrieval right away and hand its chunks
+    to the background purge. Returns the number of chunks the document had.
     """
-    sql = """
-          DELETE
-          FROM langchain_pg_embedding e USING langchain_pg_collection c
-          WHERE e.collection_id = c.uuid
-            AND c.name = %s
-            AND e.cmetadata->>'user_id' = %s
-            AND e.cmetadata->>'document_id' = %s; \
-          """
     try:
-        with psycopg.connect(get_postgres_connection_string()) as conn, conn.cursor() as cur:
-            cur.execute(sql, (CONFIG.DOCUMENTS_COLLECTION, user_id, document_id))
-            deleted = cur.rowcount
-            conn.commit()
-            if deleted == 0:
-                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-            return deleted
-    except HTTPException as e:
-        raise e
+        chunk_count = mark_deleted(collection=CONFIG.DOCUMENTS_COLLECTION, user_id=user_id, document_id=document_id)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"DB error while deleting document {document_id} for user {user_id}: {e}",
         )
+    if chunk_count is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    USER_INDEX_CACHE.invalidate(user_id)
+    get_purge_job().wake()
+    return chunk_count
@@ -0,0 +1,155 @@
+"""
+Checkpoint growth benchmark.
+
+Replays a long thread through a graph with the chat agent's shape
+(route -> tools -> generate) on a byte-counting checkpointer and reports, per
+turn, the bytes written (checkpoint blobs + pending writes) and the turn
+latency. Two state-update styles are compared:
+
+    full   nodes extend state["messages"] and return the whole list (the old style)
+    delta  nodes return only the messages they produce (State's reducer enriches them)
+
+each under the "async" (checkpoint every step) and "exit" (checkpoint once per
+run) durability modes.
+
+    python -m rag_app.evaluation.checkpoint_benchmark --turns 200 --output checkpoints.json
+
+No LLM, retriever or Postgres is involved: message sizes are fixed so only the
+state handling differs.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import END, StateGraph
+
+from rag_app.agent.agent_state import State
+from rag_app.evaluation.metrics import latency_summary
+
+STRATEGIES = ("full", "delta")
+DURABILITIES = ("async", "exit")
+REPORT_TURNS = (1, 10, 50, 100, 200)
+
+
+class MeasuringSaver(InMemorySaver):
+    """InMemorySaver that records how many serialized bytes each run writes."""
+
+    def __init__(self):
+        super().__init__()
+        self.bytes_written = 0
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        values = checkpoint["channel_values"]
+        self.bytes_written += sum(len(self.serde.dumps_typed(values[k])[1]) for k in new_versions if k in values)
+        self.bytes_written += len(self.serde.dumps_typed({k: v for k, v in checkpoint.items() if k != "channel_values"})[1])
+        return super().put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        self.bytes_written += sum(len(self.serde.dumps_typed(v)[1]) for _, v in writes)
+        return super().put_writes(config, writes, task_id, task_path)
+
+
+def _build_graph(strategy: str, saver: MeasuringSaver, doc_chars: int, answer_chars: int):
+    full = strategy == "full"
+
+    def emit(state: State, message) -> Dict[str, Any]:
+        if full:
+            state["messages"].extend([message])
+            return {"messages": state["messages"]}
+        return {"messages": [message]}
+
+    def route(state: State):
+        question = state["messages"][-1].content
+        call_id = f"call-{len(state['messages'])}"
+        return emit(state, AIMessage("", tool_calls=[{"name": "retrieve_documents", "args": {"query": question},
+                                                      "id": call_id}]))
+
+    def tools(state: State):
+        call = state["messages"][-1].tool_calls[0]
+        return emit(state, ToolMessage("d" * doc_chars, tool_call_id=call["id"], artifact=[{"page_content": "d" * doc_chars}]))
+
+    def generate(state: State):
+        return emit(state, AIMessage("a" * answer_chars))
+
+    builder = StateGraph(State)
+    builder.add_node(route)
+    builder.add_node(tools)
+    builder.add_node(generate)
+    builder.set_entry_point("route")
+    builder.add_edge("route", "tools")
+    builder.add_edge("tools", "generate")
+    builder.add_edge("generate", END)
+    return builder.compile(checkpointer=saver)
+
+
+async def run_thread(strategy: str, durability: str, turns: int, *, doc_chars: int = 4000,
+                     answer_chars: int = 600) -> Dict[str, Any]:
+    saver = MeasuringSaver()
+    graph = _build_graph(strategy, saver, doc_chars, answer_chars)
+    config = {"configurable": {"thread_id": f"{strategy}-{durability}"}}
+    bytes_per_turn: List[int] = []
+    ms_per_turn: List[float] = []
+    for turn in range(1, turns + 1):
+        before = saver.bytes_written
+        start = time.perf_counter()
+        message = HumanMessage(f"question {turn}", additional_kwargs={"interaction_id": f"i{turn}"})
+        await graph.ainvoke({"messages": [message]}, config, durability=durability)
+        ms_per_turn.append((time.perf_counter() - start) * 1000)
+        bytes_per_turn.append(saver.bytes_written - before)
+    return {
+        "total_bytes": sum(bytes_per_turn),
+        "bytes_at_turn": {str(t): bytes_per_turn[t - 1] for t in REPORT_TURNS if t <= turns},
+        "ms_at_turn": {str(t): round(ms_per_turn[t - 1], 3) for t in REPORT_TURNS if t <= turns},
+        "latency_ms": latency_summary(ms_per_turn),
+        "bytes_per_turn": bytes_per_turn,
+        "ms_per_turn": [round(ms, 3) for ms in ms_per_turn],
+    }
+
+
+def run(turns: int, strategies: Sequence[str] = STRATEGIES, durabilities: Sequence[str] = DURABILITIES,
+        *, doc_chars: int = 4000, answer_chars: int = 600) -> Dict[str, Any]:
+    async def all_runs():
+        return {
+            f"{strategy}/{durability}": await run_thread(strategy, durability, turns,
+                                                         doc_chars=doc_chars, answer_chars=answer_chars)
+            for strategy in strategies
+            for durability in durabilities
+        }
+
+    return {"turns": turns, "doc_chars": doc_chars, "answer_chars": answer_chars, "runs": asyncio.run(all_runs())}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Measure checkpoint bytes and latency per turn over a long thread.")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--strategies", nargs="+", default=list(STRATEGIES), choices=STRATEGIES)
+    parser.add_argument("--durabilities", nargs="+", default=list(DURABILITIES), choices=DURABILITIES)
+    parser.add_argument("--doc-chars", type=int, default=4000, help="size of the retrieved context per turn")
+    parser.add_argument("--answer-chars", type=int, default=600)
+    parser.add_argument("--per-turn", action="store_true", help="include the full per-turn series")
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = run(args.turns, args.strategies, args.durabilities, doc_chars=args.doc_chars,
+                 answer_chars=args.answer_chars)
+    if not args.per_turn:
+        for result in report["runs"].values():
+            result.pop("bytes_per_turn")
+            result.pop("ms_per_turn")
+    out = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(out)
+    else:
+        sys.stdout.write(out + "\n")
+
+
+if __name__ == "__main__":
+    main()
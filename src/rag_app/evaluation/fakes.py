@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import re
+from typing import List, Sequence, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def _tokens(text: str) -> List[str]:
+    return [t.lower() for t in _TOKEN.findall(text)]
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic, offline embedder: hashed bag of words, L2-normalised.
+    Texts sharing vocabulary get similar vectors, which is enough to make
+    retrieval metrics meaningful without an Ollama server.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vec = [0.0] * self.dim
+        for token in _tokens(text):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vec[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vec))
+        return [v / norm for v in vec] if norm else vec
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class LexicalReranker:
+    """
+    Tiny CrossEncoder stand-in: scores (query, passage) pairs by the share of
+    query terms present in the passage. Exposes the same `predict` method.
+    """
+
+    def predict(self, pairs: Sequence[Tuple[str, str]]) -> List[float]:
+        scores = []
+        for query, passage in pairs:
+            q = set(_tokens(query))
+            p = set(_tokens(passage))
+            scores.append(10.0 * len(q & p) / len(q) if q else 0.0)
+        return scores
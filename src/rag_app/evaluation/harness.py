@@ -0,0 +1,177 @@
+"""
+Offline retrieval evaluation.
+
+Loads a labeled dataset into its own pgvector collection, runs PdfRetriever in
+every RetrievalMode and prints (or writes) a JSON report with recall@k, MRR and
+nDCG next to p50/p95/p99 latency per stage.
+
+    APP_ENV=.env.local python -m rag_app.evaluation.harness --dataset data.json --output report.json
+
+Dataset format:
+    {
+      "user_id": "eval-user",                       (optional)
+      "documents": [{"document_id": "...", "file_name": "...",
+                     "chunks": [{"id": "...", "page": 1, "section": 0, "text": "..."}]}],
+      "queries": [{"query": "...", "relevant": ["<chunk id>", ...]}]
+    }
+
+Embeddings come from a deterministic hashing embedder and re-ranking from a
+lexical scorer unless --reranker-model points at a local CrossEncoder, so the
+harness needs nothing but Postgres.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_postgres import PGVector
+
+from rag_app.config import CONFIG, get_postgres_connection_string
+from rag_app.evaluation.fakes import HashingEmbeddings, LexicalReranker
+from rag_app.evaluation.metrics import recall_at_k, reciprocal_rank, ndcg_at_k, latency_summary, mean
+from rag_app.ingestion.constants import USER_ID_KEY, DOC_ID_KEY, FILE_NAME_KEY, INGESTED_AT_KEY, \
+    CHUNK_ORDINAL_KEY, SECTION_ID_KEY
+from rag_app.retrieval.pdf_retriever import PdfRetriever, RetrievalMode, RetrievalTrace
+
+EVAL_COLLECTION = "retrieval_eval"
+DEFAULT_USER_ID = "eval-user"
+
+
+@dataclass(frozen=True)
+class LabeledQuery:
+    query: str
+    relevant: frozenset[str]
+
+
+@dataclass
+class EvalDataset:
+    user_id: str
+    documents: List[Document] = field(default_factory=list)
+    queries: List[LabeledQuery] = field(default_factory=list)
+
+    @classmethod
+    def from_json(cls, raw: Dict[str, Any]) -> EvalDataset:
+        user_id = raw.get("user_id", DEFAULT_USER_ID)
+        ts = datetime.now(timezone.utc).isoformat()
+        documents = [
+            Document(
+                id=chunk["id"],
+                page_content=chunk["text"],
+                metadata={
+                    USER_ID_KEY: user_id,
+                    DOC_ID_KEY: doc["document_id"],
+                    FILE_NAME_KEY: doc.get("file_name", doc["document_id"]),
+                    "page_number": chunk.get("page", 1),
+                    INGESTED_AT_KEY: ts,
+                    CHUNK_ORDINAL_KEY: ordinal,
+                    SECTION_ID_KEY: chunk.get("section", 0),
+                },
+            )
+            for doc in raw["documents"]
+            for ordinal, chunk in enumerate(doc["chunks"])
+        ]
+        queries = [LabeledQuery(query=q["query"], relevant=frozenset(q["relevant"])) for q in raw["queries"]]
+        return cls(user_id=user_id, documents=documents, queries=queries)
+
+
+def load_into_postgres(dataset: EvalDataset, embeddings: Embeddings, collection: str) -> None:
+    """(Re)create the evaluation collection and index every chunk with its dataset id."""
+    store = PGVector(
+        embeddings=embeddings,
+        collection_name=collection,
+        connection=get_postgres_connection_string(),
+        pre_delete_collection=True,
+    )
+    store.add_documents(dataset.documents, ids=[d.id for d in dataset.documents])
+
+
+def evaluate_mode(retriever: PdfRetriever, dataset: EvalDataset, mode: RetrievalMode, k: int) -> Dict[str, Any]:
+    top_n = CONFIG.RERANKER_TOP_N_RETRIEVED_DOCS
+    recalls, rrs, ndcgs, totals = [], [], [], []
+    traces: List[RetrievalTrace] = []
+    for labeled in dataset.queries:
+        start = time.perf_counter()
+        documents, trace = retriever.retrieve_with_trace(labeled.query, dataset.user_id, k=k, mode=mode)
+        totals.append((time.perf_counter() - start) * 1000)
+        traces.append(trace)
+        ids = [d.id for d in documents]
+        recalls.append(recall_at_k(ids, labeled.relevant, top_n))
+        rrs.append(reciprocal_rank(ids, labeled.relevant))
+        ndcgs.append(ndcg_at_k(ids, labeled.relevant, top_n))
+    return {
+        "quality": {
+            f"recall@{top_n}": round(mean(recalls), 4),
+            "mrr": round(mean(rrs), 4),
+            f"ndcg@{top_n}": round(mean(ndcgs), 4),
+        },
+        "latency_ms": {
+            "embed": latency_summary(t.embed_ms for t in traces),
+            "search": latency_summary(t.search_ms for t in traces),
+            "mmr": latency_summary(t.mmr_ms for t in traces),
+            "rerank": latency_summary(t.rerank_ms for t in traces),
+            "expand": latency_summary(t.expand_ms for t in traces),
+            "total": latency_summary(totals),
+        },
+        "decisions": {
+            "early_exit_rate": round(mean(1.0 if t.early_exit else 0.0 for t in traces), 4),
+            "mean_pairs_reranked": round(mean(t.reranked for t in traces), 2),
+            "mean_candidates": round(mean(t.candidates for t in traces), 2),
+            "mean_expanded": round(mean(t.expanded for t in traces), 2),
+        },
+    }
+
+
+def run(dataset: EvalDataset, *, k: int, modes: List[RetrievalMode], reranker_model: Optional[str] = None,
+        collection: str = EVAL_COLLECTION, load: bool = True) -> Dict[str, Any]:
+    embeddings = HashingEmbeddings()
+    if load:
+        load_into_postgres(dataset, embeddings, collection)
+    if reranker_model:
+        from sentence_transformers import CrossEncoder
+        reranker = CrossEncoder(reranker_model, local_files_only=True)
+    else:
+        reranker = LexicalReranker()
+    retriever = PdfRetriever(embeddings=embeddings, reranker=reranker, collection=collection, use_user_index=False)
+    return {
+        "k": k,
+        "top_n": CONFIG.RERANKER_TOP_N_RETRIEVED_DOCS,
+        "queries": len(dataset.queries),
+        "chunks": len(dataset.documents),
+        "reranker": reranker_model or "lexical",
+        "modes": {mode.value: evaluate_mode(retriever, dataset, mode, k) for mode in modes},
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Evaluate PdfRetriever quality and per-stage latency.")
+    parser.add_argument("--dataset", required=True, help="labeled query -> relevant chunk JSON file")
+    parser.add_argument("--k", type=int, default=20, help="vector search candidates")
+    parser.add_argument("--modes", nargs="+", default=[m.value for m in RetrievalMode],
+                        choices=[m.value for m in RetrievalMode])
+    parser.add_argument("--reranker-model", default=None, help="path/name of a locally cached CrossEncoder")
+    parser.add_argument("--collection", default=EVAL_COLLECTION)
+    parser.add_argument("--skip-load", action="store_true", help="reuse an already loaded collection")
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    with open(args.dataset, encoding="utf-8") as f:
+        dataset = EvalDataset.from_json(json.load(f))
+    report = run(dataset, k=args.k, modes=[RetrievalMode(m) for m in args.modes],
+                 reranker_model=args.reranker_model, collection=args.collection, load=not args.skip_load)
+    out = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(out)
+    else:
+        sys.stdout.write(out + "\n")
+
+
+if __name__ == "__main__":
+    main()
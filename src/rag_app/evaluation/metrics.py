@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import math
+from typing import Iterable, List, Sequence, Set, Dict
+
+
+def recall_at_k(retrieved: Sequence[str], relevant: Set[str], k: int) -> float:
+    """Share of the relevant chunks found in the first k results."""
+    if not relevant:
+        return 0.0
+    return len(set(retrieved[:k]) & relevant) / len(relevant)
+
+
+def reciprocal_rank(retrieved: Sequence[str], relevant: Set[str]) -> float:
+    """1 / rank of the first relevant chunk, 0 if none was retrieved."""
+    for rank, chunk_id in enumerate(retrieved, start=1):
+        if chunk_id in relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+def ndcg_at_k(retrieved: Sequence[str], relevant: Set[str], k: int) -> float:
+    """Binary-relevance nDCG over the first k results."""
+    dcg = sum(1.0 / math.log2(rank + 1) for rank, chunk_id in enumerate(retrieved[:k], start=1) if chunk_id in relevant)
+    ideal = sum(1.0 / math.log2(rank + 1) for rank in range(1, min(len(relevant), k) + 1))
+    return dcg / ideal if ideal else 0.0
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Linear-interpolated percentile, q in [0, 100]."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q / 100
+    lo, hi = math.floor(pos), math.ceil(pos)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+def latency_summary(values: Iterable[float]) -> Dict[str, float]:
+    values: List[float] = list(values)
+    return {
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+    }
+
+
+def mean(values: Iterable[float]) -> float:
+    values = list(values)
+    return sum(values) / len(values) if values else 0.0
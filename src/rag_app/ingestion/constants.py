@@ -7,3 +7,5 @@ DOC_ID_KEY: Final[str] = "document_id"
 FILE_NAME_KEY: Final[str] = "file_name"
 PAGE_KEY: Final[str] = "page"
 INGESTED_AT_KEY: Final[str] = "ingested_at"
+CHUNK_ORDINAL_KEY: Final[str] = "chunk_ordinal"
+SECTION_ID_KEY: Final[str] = "section_id"
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 import hashlib
+import logging
+import uuid
 from dataclasses import dataclass, field
+from functools import lru_cache
 from datetime import datetime
 from typing import List, Literal, Dict, Any, IO, Final
 
@@ -13,8 +16,18 @@ from langchain_ollama import OllamaEmbeddings
 from langchain_postgres import PGVector
 
 from rag_app.config import CONFIG, get_postgres_connection_string
-from rag_app.ingestion.coalesce import coalesce_elements, CoalesceConfig
-from rag_app.ingestion.constants import USER_ID_KEY, DOC_ID_KEY, FILE_NAME_KEY, PAGE_KEY, INGESTED_AT_KEY
+from rag_app.db_pool import transaction
+from rag_app.document.document_purge import delete_chunks
+from rag_app.document.document_registry import document_state, record_document
+from rag_app.ingestion.coalesce import coalesce_elements, CoalesceConfig, category
+from rag_app.ingestion.constants import USER_ID_KEY, DOC_ID_KEY, FILE_NAME_KEY, PAGE_KEY, INGESTED_AT_KEY, \
+    CHUNK_ORDINAL_KEY, SECTION_ID_KEY
+from rag_app.llm_singleton import get_embeddings
+from rag_app.retrieval.user_index import USER_INDEX_CACHE
+from rag_app.retrieval.vector_search import pg_insert_chunks
+from rag_app.tracing import span
+
+logger = logging.getLogger(__name__)
 
 
 def generate_doc_id_from_bytesio(f: IO[bytes]) -> str:
@@ -42,6 +55,23 @@ def create_parser_additional_metadata(file_name: str, page) -> Dict[str, Any]:
         PAGE_KEY: page,
     }
 
+def tag_sections(docs: List[Document]) -> List[Document]:
+    """Number the sections of a parsed document: a new section starts at every heading element."""
+    section = 0
+    for i, d in enumerate(docs):
+        if i > 0 and (category(d) or "").lower() in {"title", "heading", "header"}:
+            section += 1
+        d.metadata[SECTION_ID_KEY] = section
+    return docs
+
+
+def assign_chunk_ordinals(chunks: List[Document]) -> List[Document]:
+    """Position of every chunk within its document, used to fetch neighbours at retrieval time."""
+    for ordinal, c in enumerate(chunks):
+        c.metadata[CHUNK_ORDINAL_KEY] = ordinal
+    return chunks
+
+
 @dataclass(frozen=True)
 class StorerConfig:
     pg_connection: str = get_postgres_connection_string()
@@ -56,7 +86,7 @@ class StorerConfig:
     separators: List[str] = field(default_factory=lambda: list(CONFIG.SEPARATORS))
 
     # Embeddings
-    embedding_model: OllamaEmbeddings = field(default_factory=lambda: OllamaEmbeddings(model=CONFIG.EMBEDDING_MODEL))
+    embedding_model: OllamaEmbeddings = field(default_factory=get_embeddings)
 
 
 @dataclass(frozen=True)
@@ -71,6 +101,19 @@ def _from_uploadfile_to_io(upload: UploadFile) -> IO[bytes]:
     return upload.file  # SpooledTemporaryFile, behaves as IO[bytes]
 
 
+def _byte_size(f: IO[bytes]) -> int:
+    pos = f.tell()
+    size = f.seek(0, 2)
+    f.seek(pos)
+    return size
+
+
+def count_pages(docs: List[Document]) -> int:
+    pages = {d.metadata.get("page_number", d.metadata.get(PAGE_KEY)) for d in docs}
+    pages.discard(None)
+    return len(pages)
+
+
 class PdfSaver:
 
     def __init__(self):
@@ -80,7 +123,7 @@ class PdfSaver:
             chunk_overlap=self._config.chunk_overlap,
             separators=list(self._config.separators)
         )
-        self._emb = OllamaEmbeddings(model=CONFIG.EMBEDDING_MODEL)
+        self._emb = self._config.embedding_model
         self._collection = CONFIG.DOCUMENTS_COLLECTION
 
     # embeddings
@@ -109,7 +152,7 @@ class PdfSaver:
             avoid_cross_page_merge=True,
             hard_types=("Table", "Code", "Figure", "Caption")
         ))
-        return self._splitter.split_documents(coalesced)
+        return assign_chunk_ordinals(self._splitter.split_documents(tag_sections(coalesced)))
 
     def _get_pg_vector(self) -> PGVector:
         return PGVector(
@@ -123,19 +166,19 @@ class PdfSaver:
         file_as_io = _from_uploadfile_to_io(inp.file)
         document_id = generate_doc_id_from_bytesio(file_as_io)
 
-        documents_already_exists = self._get_pg_vector().similarity_search(
-            "probe",
-            k=1,
-            filter=create_document_filter(inp.user_id, document_id)
-        )
-        if documents_already_exists:
+        with span("ingest_probe"):
+            state = document_state(collection=self._collection, user_id=inp.user_id, document_id=document_id)
+        if state == "live":
             raise Exception("Document ID already exists")
 
-        docs = self._loader_docs(file_as_io, inp.file_name)
-        chunks = self._split(docs)
+        with span("ingest_parse"):
+            docs = self._loader_docs(file_as_io, inp.file_name)
+        with span("ingest_split"):
+            chunks = self._split(docs)
 
         # add tenant metadata
-        ts = datetime.now().isoformat()
+        ingested_at = datetime.now().astimezone()
+        ts = ingested_at.isoformat()
         for c in chunks:
             c.metadata.update({
                 USER_ID_KEY: inp.user_id,
@@ -143,14 +186,27 @@ class PdfSaver:
                 DOC_ID_KEY: document_id,
             })
 
-        PGVector.from_documents(
-            documents=chunks,
-            embedding=self._config.embedding_model,
-            collection_name=CONFIG.DOCUMENTS_COLLECTION,
-            connection=self._config.pg_connection,
-            pre_delete_collection=False,
-        )
+        texts = [c.page_content for c in chunks]
+        with span("ingest_embed"):
+            embeddings = self._emb.embed_documents(texts)
+        self._get_pg_vector()  # creates the PGVector tables and collection if missing
+        with span("ingest_store"), transaction() as conn:
+            # chunks and their registry row commit together: a listed document always has its chunks
+            if state == "deleted":
+                # re-upload of a document still being purged: drop its old chunks before reviving the row
+                delete_chunks(conn, collection=self._collection, user_id=inp.user_id, document_id=document_id)
+            pg_insert_chunks(conn, ids=[c.id or str(uuid.uuid4()) for c in chunks], texts=texts,
+                             embeddings=embeddings, metadatas=[c.metadata for c in chunks],
+                             collection=self._collection)
+            record_document(conn, collection=self._collection, user_id=inp.user_id, document_id=document_id,
+                            file_name=inp.file_name, page_count=count_pages(docs), chunk_count=len(chunks),
+                            byte_size=_byte_size(file_as_io), created_at=ingested_at)
+        USER_INDEX_CACHE.invalidate(inp.user_id)
+        logger.info(f"Ingested {inp.file_name}: {len(chunks)} chunks")
         return {"file_name": inp.file_name, "chunks": len(chunks)}
 
 
-pdf_saver = PdfSaver()
+@lru_cache(maxsize=1)
+def get_pdf_saver() -> PdfSaver:
+    """ Process-wide saver, built on first use """
+    return PdfSaver()
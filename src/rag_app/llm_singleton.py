@@ -1,10 +1,71 @@
-from langchain_ollama import ChatOllama
+from functools import lru_cache
+from threading import Lock
+from typing import Dict, Sequence, Tuple, Union
 
+import httpx
+from langchain_core.runnables import Runnable
+from langchain_core.tools import BaseTool
+from langchain_ollama import ChatOllama, OllamaEmbeddings
+
+from rag_app.backend_pool import client_kwargs, get_chat_pool, get_embedding_pool
 from rag_app.config import CONFIG
 
+_BOUND_LLMS: Dict[Tuple[str, ...], Runnable] = {}
+_BOUND_LLMS_LOCK = Lock()
+
+
+def _keep_alive(value: str) -> Union[int, str]:
+    """ Ollama takes either seconds (int, -1 = forever) or a duration string like "30m" """
+    return int(value) if value.lstrip("-").isdigit() else value
 
-def get_llm():
+
+@lru_cache(maxsize=1)
+def get_llm() -> ChatOllama:
+    """
+    Process-wide chat model. ChatOllama owns its sync/async httpx clients, so
+    sharing one instance shares their keep-alive connection pools across turns.
+    With LLM_HOSTS the clients' transport spreads requests over the replicas.
+    """
+    pool = get_chat_pool()
     return ChatOllama(
         model=CONFIG.CHAT_MODEL,
-        base_url=CONFIG.LLM_HOST
+        base_url=pool.urls[0] if pool else CONFIG.LLM_HOST,
+        keep_alive=_keep_alive(CONFIG.LLM_KEEP_ALIVE),
+        client_kwargs={
+            "limits": _limits(),
+            "timeout": httpx.Timeout(CONFIG.LLM_TIMEOUT_SECONDS, connect=10.0),
+        },
+        **(client_kwargs(pool, _limits()) if pool else {}),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_embeddings() -> OllamaEmbeddings:
+    """ Process-wide embedding model, balanced over EMBEDDING_HOSTS (defaults to LLM_HOSTS) """
+    pool = get_embedding_pool()
+    return OllamaEmbeddings(
+        model=CONFIG.EMBEDDING_MODEL,
+        base_url=pool.urls[0] if pool else None,
+        client_kwargs={"limits": _limits()},
+        **(client_kwargs(pool, _limits()) if pool else {}),
+    )
+
+
+def _limits() -> httpx.Limits:
+    # per backend when pooled: a custom transport brings its own connection pools
+    return httpx.Limits(
+        max_connections=CONFIG.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=CONFIG.LLM_MAX_CONNECTIONS,
     )
+
+
+def get_llm_with_tools(tools: Sequence[BaseTool]) -> Runnable:
+    """ The shared chat model with `tools` bound, built once per tool set """
+    key = tuple(t.name for t in tools)
+    bound = _BOUND_LLMS.get(key)
+    if bound is None:
+        with _BOUND_LLMS_LOCK:
+            bound = _BOUND_LLMS.get(key)
+            if bound is None:
+                bound = _BOUND_LLMS[key] = get_llm().bind_tools(list(tools))
+    return bound
@@ -6,6 +6,7 @@ from contextvars import ContextVar
 from starlette.middleware.base import BaseHTTPMiddleware
 
 from rag_app.config import CONFIG
+from rag_app.tracing import current_trace, start_trace
 
 request_id_ctx: ContextVar[str] = ContextVar("request_id", default="-")
 user_id_ctx: ContextVar[str] = ContextVar("user_id", default="-")
@@ -15,6 +16,9 @@ class ContextFilter(logging.Filter):
     def filter(self, record):
         record.request_id = request_id_ctx.get("-")
         record.user_id = user_id_ctx.get("-")
+        trace = current_trace()
+        if trace is not None and trace.spans_ms and not hasattr(record, "trace"):
+            record.trace = trace.summary()
         return True
 
 
@@ -22,6 +26,7 @@ class RequestContextMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request, call_next):
         rid = request.headers.get("X-Request-ID", str(uuid.uuid4()))
         request_id_ctx.set(rid)
+        start_trace(rid)
         # If you decode JWT elsewhere, set user_id_ctx there
         response = await call_next(request)
         response.headers["X-Request-ID"] = rid
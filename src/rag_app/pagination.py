@@ -0,0 +1,39 @@
+"""
+Opaque cursors for keyset pagination.
+
+A cursor is the sort key of the last row of a page, JSON-encoded and base64'd
+so clients pass it back verbatim; the next page starts strictly after that key.
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Optional
+
+# page size when the client doesn't ask for one, and the largest it may ask for
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(*key: Any) -> str:
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in key]
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[List[Any]]:
+    """The sort key inside `cursor` (None for the first page); InvalidCursor if it isn't one of ours."""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(f"Malformed cursor {cursor!r}")
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor(f"Malformed cursor {cursor!r}")
+    return values
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from typing import Optional
+
+import numpy as np
+
+
+def similarity_gap(similarities: np.ndarray) -> Optional[float]:
+    """Vector-similarity margin between the best and the second-best hit (None with <2 hits)."""
+    if len(similarities) < 2:
+        return None
+    top2 = np.partition(-similarities, 1)[:2]
+    return float(top2[1] - top2[0])
+
+
+def is_confident_without_rerank(gap: Optional[float], gap_threshold: float) -> bool:
+    """
+    The top hit already beats the runner-up clearly enough to trust vector
+    order. `gap` is the `similarity_gap` of the search hits before MMR, which
+    drops near-duplicate runners-up and so would widen it.
+    """
+    return gap is not None and gap >= gap_threshold
+
+
+def is_ambiguous(scores: np.ndarray, top_n: int, margin: float) -> bool:
+    """
+    After a rerank stage: are the kept top_n separated from the rest of the stage?
+    If the weakest kept score is not at least `margin` above the weakest scored
+    candidate, the unscored tail could still displace it, so another stage is needed.
+    """
+    if len(scores) <= top_n:
+        return True
+    ordered = np.sort(scores)[::-1]
+    return float(ordered[top_n - 1] - ordered[-1]) < margin
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from typing import List, Tuple
+
+
+def join_overlapping(texts: List[str], max_overlap: int) -> str:
+    """
+    Join consecutive chunks, dropping the text the splitter repeated between
+    them (up to `max_overlap` chars, i.e. CHUNK_OVERLAP).
+    """
+    if not texts:
+        return ""
+    out = texts[0]
+    for nxt in texts[1:]:
+        overlap = 0
+        for size in range(min(max_overlap, len(out), len(nxt)), 0, -1):
+            if out.endswith(nxt[:size]):
+                overlap = size
+                break
+        out += ("" if overlap else "\n") + nxt[overlap:]
+    return out
+
+
+def pick_window(winner_ordinal: int, chunks: List[Tuple[int, str]], max_chars: int) -> List[Tuple[int, str]]:
+    """
+    Chunks around the winner, nearest first, stopping at the first one that
+    would exceed `max_chars`. The winner itself is always kept. Returned in
+    document order.
+    """
+    by_distance = sorted(chunks, key=lambda c: (abs(c[0] - winner_ordinal), c[0]))
+    picked: List[Tuple[int, str]] = []
+    used = 0
+    for ordinal, text in by_distance:
+        if ordinal != winner_ordinal and used + len(text) > max_chars:
+            break
+        picked.append((ordinal, text))
+        used += len(text)
+    return sorted(picked)
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from typing import List
+
+import numpy as np
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+
+def mmr_select(query_embedding: np.ndarray, embeddings: np.ndarray, k: int, lambda_mult: float = 0.5) -> List[int]:
+    """
+    Maximal marginal relevance over candidate embeddings.
+    Returns the indices of up to `k` candidates, in selection order.
+
+    lambda_mult=1 ranks purely by relevance, lambda_mult=0 purely by diversity.
+    The pairwise similarity matrix is computed once; each selection step is a
+    single vectorised update over all candidates.
+    """
+    n = embeddings.shape[0] if embeddings.ndim == 2 else 0
+    if n == 0 or k <= 0:
+        return []
+    k = min(k, n)
+    cand = _normalize(embeddings.astype(np.float32, copy=False))
+    q = _normalize(np.asarray(query_embedding, dtype=np.float32))
+    relevance = cand @ q
+    pairwise = cand @ cand.T
+
+    first = int(np.argmax(relevance))
+    selected = [first]
+    chosen = np.zeros(n, dtype=bool)
+    chosen[first] = True
+    redundancy = pairwise[first].copy()
+    for _ in range(1, k):
+        score = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        score[chosen] = -np.inf
+        nxt = int(np.argmax(score))
+        selected.append(nxt)
+        chosen[nxt] = True
+        np.maximum(redundancy, pairwise[nxt], out=redundancy)
+    return selected
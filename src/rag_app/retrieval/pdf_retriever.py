@@ -1,16 +1,29 @@
 from __future__ import annotations
-from dataclasses import dataclass
+import logging
+import time
+from dataclasses import dataclass, asdict
+from enum import Enum
+from functools import lru_cache
 from typing import Optional, Dict, Any
 
+import numpy as np
+
 from langchain_core.documents import Document
-from langchain_core.vectorstores import VectorStoreRetriever
+from langchain_core.embeddings import Embeddings
 from langchain_postgres import PGVector
 
-from langchain_ollama import OllamaEmbeddings
 from rag_app.config import CONFIG, get_postgres_connection_string
-from rag_app.ingestion.constants import USER_ID_KEY, DOC_ID_KEY
+from rag_app.ingestion.constants import USER_ID_KEY, DOC_ID_KEY, CHUNK_ORDINAL_KEY, SECTION_ID_KEY
+from rag_app.llm_singleton import get_embeddings
+from rag_app.retrieval.adaptive import similarity_gap, is_confident_without_rerank, is_ambiguous
+from rag_app.retrieval.expansion import join_overlapping, pick_window
+from rag_app.retrieval.mmr import mmr_select
+from rag_app.retrieval.user_index import USER_INDEX_CACHE
+from rag_app.retrieval.vector_search import SearchHits, pg_similarity_search, pg_fetch_context
+from rag_app.tracing import observe
+
+logger = logging.getLogger(__name__)
 
-from sentence_transformers import CrossEncoder
 
 @dataclass(frozen=True)
 class RetrieverInput:
@@ -20,6 +33,30 @@ class RetrieverInput:
     doc_id: Optional[str] = None
 
 
+class RetrievalMode(str, Enum):
+    RERANK = "rerank"  # always cross-encode every candidate
+    ADAPTIVE = "adaptive"  # early exit on clear vector winners, staged re-ranking otherwise
+    EXPAND = "expand"  # re-rank small chunks, then widen the winners to their neighbours / section
+
+
+@dataclass
+class RetrievalTrace:
+    """What the retriever decided for one query."""
+    mode: str
+    candidates: int = 0
+    reranked: int = 0
+    rerank_stages: int = 0
+    early_exit: bool = False
+    similarity_gap: Optional[float] = None
+    expanded: int = 0
+    # stage latencies (ms)
+    embed_ms: float = 0.0
+    search_ms: float = 0.0
+    mmr_ms: float = 0.0
+    rerank_ms: float = 0.0
+    expand_ms: float = 0.0
+
+
 @dataclass(frozen=True)
 class DocumentFound:
     page_number: int
@@ -28,13 +65,29 @@ class DocumentFound:
 
 
 class PdfRetriever:
-    def __init__(self):
+    def __init__(self, embeddings: Optional[Embeddings] = None, reranker: Optional[Any] = None,
+                 collection: Optional[str] = None, use_user_index: Optional[bool] = None):
+        """ All arguments default to CONFIG; they are overridable for offline evaluation. """
         self._pg_connection = get_postgres_connection_string()
-        self._emb = OllamaEmbeddings(model=CONFIG.EMBEDDING_MODEL)
-        self._collection = CONFIG.DOCUMENTS_COLLECTION
+        self._emb = embeddings or get_embeddings()
+        self._collection = collection or CONFIG.DOCUMENTS_COLLECTION
         # --- reranker config ---
         self._rerank_top_k = getattr(CONFIG, "RERANK_TOP_K", 20)   # candidates to re-rank
-        self._reranker =  CrossEncoder(CONFIG.RERANKER_MODEL_NAME)
+        self._reranker = reranker if reranker is not None else get_reranker()
+        # --- in-memory per-user index for hot tenants ---
+        self._use_user_index = CONFIG.USER_INDEX_ENABLED if use_user_index is None else use_user_index
+        # --- diversification before re-ranking ---
+        self._mmr_top_k = CONFIG.MMR_TOP_K
+        self._mmr_lambda = CONFIG.MMR_LAMBDA
+        # --- adaptive mode ---
+        self._mode = RetrievalMode(CONFIG.RETRIEVAL_MODE)
+        self._early_exit_gap = CONFIG.EARLY_EXIT_SIMILARITY_GAP
+        self._rerank_stage_size = CONFIG.RERANK_STAGE_SIZE
+        self._rerank_confident_margin = CONFIG.RERANK_CONFIDENT_MARGIN
+        # --- context expansion ---
+        self._expand_scope = CONFIG.EXPAND_SCOPE
+        self._expand_window = CONFIG.EXPAND_WINDOW
+        self._expand_max_chars = CONFIG.EXPAND_MAX_CHARS
 
     def _pg_vector(self) -> PGVector:
         return PGVector(
@@ -52,12 +105,55 @@ class PdfRetriever:
             f.update(extra)
         return f
 
+    def _search(self, query_embedding: list[float], *, user_id: str, k: int,
+                document_id: Optional[str] = None) -> SearchHits:
+        index = USER_INDEX_CACHE.get(user_id) if self._use_user_index else None
+        if index is not None:
+            return index.search(query_embedding, k=k, document_id=document_id)
+        return pg_similarity_search(query_embedding, user_id=user_id, k=k, document_id=document_id,
+                                    collection=self._collection)
+
+    def _diversify(self, query_embedding: list[float], hits: SearchHits, top_n: int) -> SearchHits:
+        """MMR down to MMR_TOP_K candidates so near-duplicates don't reach the reranker."""
+        keep = max(self._mmr_top_k, top_n)
+        if self._mmr_top_k <= 0 or len(hits) <= keep:
+            return hits
+        return hits.take(mmr_select(query_embedding, hits.embeddings, k=keep, lambda_mult=self._mmr_lambda))
+
+    def _scores(self, query: str, docs: list[Document]) -> np.ndarray:
+        if not docs:
+            return np.zeros(0, dtype=np.float32)
+        return np.asarray(self._reranker.predict([(query, d.page_content) for d in docs]), dtype=np.float32)
+
     def _rerank(self, query: str, docs: list[Document], top_n: int) -> list[Document]:
         pairs = [(query, d.page_content) for d in docs]
         scores = self._reranker.predict(pairs)
         ranked = sorted(zip(docs, scores), key=lambda x: x[1], reverse=True)
         return [d for d, _ in ranked[:top_n]]
 
+    def _adaptive_rerank(self, query: str, hits: SearchHits, top_n: int, trace: RetrievalTrace) -> list[Document]:
+        """
+        Skip the cross-encoder on a clear vector winner (judged by the pre-MMR
+        gap already in `trace`); otherwise score the best stage first.
+        """
+        if is_confident_without_rerank(trace.similarity_gap, self._early_exit_gap):
+            trace.early_exit = True
+            order = np.argsort(-hits.similarities, kind="stable")[:top_n]
+            return [hits.documents[i] for i in order]
+
+        stage_size = max(self._rerank_stage_size, top_n)
+        scored = hits.documents[:stage_size]
+        scores = self._scores(query, scored)
+        trace.rerank_stages = 1
+        rest = hits.documents[stage_size:]
+        if rest and is_ambiguous(scores, top_n, self._rerank_confident_margin):
+            scores = np.concatenate([scores, self._scores(query, rest)])
+            scored = scored + rest
+            trace.rerank_stages = 2
+        trace.reranked = len(scored)
+        order = np.argsort(-scores, kind="stable")[:top_n]
+        return [scored[i] for i in order]
+
     def similarity(self, inp: RetrieverInput):
         vs = self._pg_vector()
         # retrieve a wider candidate set for better re-ranking
@@ -66,14 +162,93 @@ class PdfRetriever:
         candidates = vs.similarity_search(inp.query, k=k_candidates, filter=filt)
         return self._rerank(inp.query, candidates, top_n=inp.k)
 
+    def _expand(self, documents: list[Document], user_id: str, trace: RetrievalTrace) -> list[Document]:
+        """Replace each winner by its neighbourhood (or section), fetched for all winners in one query."""
+        positions = [i for i, d in enumerate(documents) if d.metadata.get(CHUNK_ORDINAL_KEY) is not None]
+        winners = [(documents[i].metadata[DOC_ID_KEY], int(documents[i].metadata[CHUNK_ORDINAL_KEY]),
+                    documents[i].metadata.get(SECTION_ID_KEY)) for i in positions]
+        context = pg_fetch_context(winners, user_id=user_id, scope=self._expand_scope,
+                                   window=self._expand_window, collection=self._collection)
+        expanded: list[Optional[Document]] = list(documents)
+        covered: set[tuple[str, int]] = set()
+        for winner_pos, (document_id, ordinal, _) in enumerate(winners):
+            doc_pos = positions[winner_pos]
+            if (document_id, ordinal) in covered:
+                # already part of a better-ranked winner's context
+                expanded[doc_pos] = None
+                continue
+            chunks = pick_window(ordinal, context.get(winner_pos, []), self._expand_max_chars)
+            if len(chunks) <= 1:
+                continue
+            covered.update((document_id, o) for o, _ in chunks)
+            doc = documents[doc_pos]
+            expanded[doc_pos] = Document(
+                id=doc.id,
+                page_content=join_overlapping([t for _, t in chunks], CONFIG.CHUNK_OVERLAP),
+                metadata={**doc.metadata, "expanded_ordinals": [o for o, _ in chunks]},
+            )
+            trace.expanded += 1
+        return [d for d in expanded if d is not None]
+
+    def retrieve_with_trace(self, query: str, user_id: str, k: int = 20, document_id: Optional[str] = None,
+                            mode: Optional[RetrievalMode] = None) -> tuple[list[Document], RetrievalTrace]:
+        """Top RERANKER_TOP_N_RETRIEVED_DOCS chunks for a query, plus the per-query decision record."""
+        mode = mode or self._mode
+        top_n = CONFIG.RERANKER_TOP_N_RETRIEVED_DOCS
+        if mode != RetrievalMode.ADAPTIVE:
+            assert k > top_n
+        elif k < top_n:
+            raise ValueError(f"k={k} must be at least RERANKER_TOP_N_RETRIEVED_DOCS={top_n}")
+        trace = RetrievalTrace(mode=mode.value)
+
+        t0 = time.perf_counter()
+        query_embedding = self._emb.embed_query(query)
+        t1 = time.perf_counter()
+        hits = self._search(query_embedding, user_id=user_id, k=k, document_id=document_id)
+        t2 = time.perf_counter()
+        trace.candidates = len(hits)
+        # before MMR: the early-exit decision and the trace use this one value
+        trace.similarity_gap = similarity_gap(hits.similarities)
+        hits = self._diversify(query_embedding, hits, top_n=top_n)
+        t3 = time.perf_counter()
+
+        if mode == RetrievalMode.ADAPTIVE:
+            documents = self._adaptive_rerank(query, hits, top_n, trace)
+        else:
+            documents = self._rerank(query, hits.documents, top_n=top_n)
+            trace.reranked = len(hits)
+            trace.rerank_stages = 1
+        t4 = time.perf_counter()
+        if mode == RetrievalMode.EXPAND:
+            documents = self._expand(documents, user_id, trace)
+        t5 = time.perf_counter()
+        trace.embed_ms = (t1 - t0) * 1000
+        trace.search_ms = (t2 - t1) * 1000
+        trace.mmr_ms = (t3 - t2) * 1000
+        trace.rerank_ms = (t4 - t3) * 1000
+        trace.expand_ms = (t5 - t4) * 1000
+        observe("embedding", t1 - t0)
+        observe("vector_search", t2 - t1)
+        observe("mmr", t3 - t2)
+        observe("rerank", t4 - t3)
+        if mode == RetrievalMode.EXPAND:
+            observe("expand", t5 - t4)
+        logger.info("Retrieval decision", extra={"retrieval": asdict(trace)})
+        return documents, trace
+
     def retriever(self, query: str, user_id: str, k: int = 20, document_id: Optional[str] = None) -> list[DocumentFound]:
-        assert k > CONFIG.RERANKER_TOP_N_RETRIEVED_DOCS
-        pg_vector = self._pg_vector()
-        filt = self._build_filter_query(user_id=user_id, document_id=document_id)
-        retriever: VectorStoreRetriever = pg_vector.as_retriever(search_kwargs={"k": k, "filter": filt})
-        docs = retriever.invoke(query)
-        documents: list[Document] = self._rerank(query, docs, top_n=CONFIG.RERANKER_TOP_N_RETRIEVED_DOCS)
+        documents, _ = self.retrieve_with_trace(query, user_id, k=k, document_id=document_id)
         parsed_documents: list[DocumentFound] = [DocumentFound(doc.metadata["page_number"], doc.page_content, doc.metadata["file_name"]) for doc in documents]
         return parsed_documents
 
-pdf_retriever = PdfRetriever()
\ No newline at end of file
+@lru_cache(maxsize=1)
+def get_reranker() -> Any:
+    """ The CrossEncoder, loaded once; with WEB_WORKERS > 1 the master loads it before forking the workers """
+    from sentence_transformers import CrossEncoder  # imports torch: only when the model is loaded
+    return CrossEncoder(CONFIG.RERANKER_MODEL_NAME)
+
+
+@lru_cache(maxsize=1)
+def get_pdf_retriever() -> PdfRetriever:
+    """ Process-wide retriever, built on first use so importing this module doesn't load the CrossEncoder """
+    return PdfRetriever()
\ No newline at end of file
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, Callable, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from rag_app.config import CONFIG
+from rag_app.db_pool import vector_connection
+from rag_app.document import document_registry
+from rag_app.document.document_registry import NOT_DELETED
+from rag_app.ingestion.constants import DOC_ID_KEY
+from rag_app.retrieval.vector_search import SearchHits
+from rag_app.shared_generations import SharedGenerations
+
+logger = logging.getLogger(__name__)
+
+# after a failed load, the user goes to Postgres for this long before the next attempt
+_FAILED_LOAD_RETRY_SECONDS = 60.0
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+@dataclass(frozen=True)
+class UserVectorIndex:
+    """
+    In-memory copy of every chunk a user owns:
+      - matrix: (n_chunks, dim) float32, C-contiguous, rows L2-normalised
+      - ids / contents / metadatas: row-aligned chunk data
+    Dot products against a normalised query are cosine similarities, the
+    same ranking PGVector uses by default.
+    """
+    user_id: str
+    matrix: np.ndarray
+    ids: List[str]
+    contents: List[str]
+    metadatas: List[Dict[str, Any]]
+    document_ids: np.ndarray
+    size_bytes: int
+
+    @classmethod
+    def build(cls, user_id: str, ids: List[str], embeddings: List[np.ndarray], contents: List[str],
+              metadatas: List[Dict[str, Any]]) -> UserVectorIndex:
+        if embeddings:
+            matrix = _normalize_rows(np.vstack(embeddings).astype(np.float32, copy=False))
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        size = matrix.nbytes + sum(len(c) for c in contents) + 256 * len(ids)
+        return cls(
+            user_id=user_id,
+            matrix=matrix,
+            ids=list(ids),
+            contents=list(contents),
+            metadatas=list(metadatas),
+            document_ids=np.array([m.get(DOC_ID_KEY) for m in metadatas], dtype=object),
+            size_bytes=size,
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query_embedding: List[float], k: int, document_id: Optional[str] = None) -> SearchHits:
+        """Top-k chunks by cosine similarity, best first."""
+        if len(self) == 0 or k <= 0:
+            return SearchHits.empty()
+        q = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm:
+            q = q / norm
+        sims = self.matrix @ q
+        if document_id:
+            sims = np.where(self.document_ids == document_id, sims, -np.inf)
+        k = min(k, len(self))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top], kind="stable")]
+        top = top[np.isfinite(sims[top])]
+        return SearchHits(
+            documents=[Document(id=self.ids[i], page_content=self.contents[i], metadata=self.metadatas[i]) for i in top],
+            similarities=sims[top],
+            embeddings=self.matrix[top],
+        )
+
+
+def load_user_index(user_id: str) -> UserVectorIndex:
+    """Read every chunk of a user's live documents from langchain_pg_embedding into a UserVectorIndex."""
+    sql = f"""
+          SELECT e.id, e.embedding, e.document, e.cmetadata
+          FROM langchain_pg_embedding e
+              JOIN langchain_pg_collection c
+          ON e.collection_id = c.uuid
+          WHERE c.name = %s
+            AND e.cmetadata->>'user_id' = %s
+            AND {NOT_DELETED};
+          """
+    document_registry.setup()
+    with vector_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, (CONFIG.DOCUMENTS_COLLECTION, user_id))
+            rows = cur.fetchall()
+    return UserVectorIndex.build(
+        user_id=user_id,
+        ids=[row[0] for row in rows],
+        embeddings=[row[1] for row in rows],
+        contents=[row[2] for row in rows],
+        metadatas=[row[3] for row in rows],
+    )
+
+
+class UserIndexCache:
+    """
+    LRU of per-user indexes bounded by a memory budget.
+    A user is only hydrated after `hot_threshold` lookups, so cold tenants
+    keep going straight to Postgres. A user whose index exceeds the budget
+    is not loaded again until their chunks change, nor one whose load failed
+    for `_FAILED_LOAD_RETRY_SECONDS`. `invalidate` must be called whenever a
+    user's chunks change (ingestion / deletion); it reaches the other worker
+    processes through the shared generations.
+    """
+
+    def __init__(self, budget_bytes: int, hot_threshold: int = 1,
+                 loader: Callable[[str], UserVectorIndex] = load_user_index, max_tracked_users: int = 10_000,
+                 generations: Optional[SharedGenerations] = None, clock: Callable[[], float] = time.monotonic):
+        self._budget_bytes = budget_bytes
+        self._hot_threshold = max(1, hot_threshold)
+        self._loader = loader
+        self._max_tracked_users = max_tracked_users
+        self._entries: OrderedDict[str, UserVectorIndex] = OrderedDict()
+        self._lookups: OrderedDict[str, int] = OrderedDict()
+        self._generations = generations or SharedGenerations()
+        # user -> generation its cached index was loaded at
+        self._loaded_at: Dict[str, int] = {}
+        # user -> (generation, retry at) of a load that was oversized or failed
+        self._unservable: OrderedDict[str, Tuple[int, float]] = OrderedDict()
+        self._clock = clock
+        self._used_bytes = 0
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+    @property
+    def used_bytes(self) -> int:
+        return self._used_bytes
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._entries
+
+    def get(self, user_id: str) -> Optional[UserVectorIndex]:
+        """Cached index for a hot user, loading it if needed; None means "use Postgres"."""
+        with self._lock:
+            index = self._entries.get(user_id)
+            if index is not None:
+                if self._loaded_at[user_id] == self._generations.get(user_id):
+                    self._entries.move_to_end(user_id)
+                    return index
+                self._drop(user_id)  # invalidated by another worker
+            generation = self._generations.get(user_id)
+            unservable = self._unservable.get(user_id)
+            if unservable is not None:
+                if unservable[0] == generation and self._clock() < unservable[1]:
+                    return None
+                del self._unservable[user_id]
+            seen = self._lookups.pop(user_id, 0) + 1
+            self._lookups[user_id] = seen
+            while len(self._lookups) > self._max_tracked_users:
+                self._lookups.popitem(last=False)
+            if seen < self._hot_threshold:
+                return None
+            load_lock = self._load_locks.setdefault(user_id, threading.Lock())
+
+        with load_lock:
+            try:
+                with self._lock:
+                    index = self._entries.get(user_id)
+                    if index is not None and self._loaded_at[user_id] == generation:
+                        return index
+                    if self._unservable.get(user_id, (None,))[0] == generation:
+                        return None  # a concurrent load just gave up
+                try:
+                    index = self._loader(user_id)
+                except Exception as e:
+                    logger.error(f"Could not load in-memory index for user {user_id}: {type(e).__name__}: {e}")
+                    with self._lock:
+                        self._mark_unservable(user_id, generation, self._clock() + _FAILED_LOAD_RETRY_SECONDS)
+                    return None
+                with self._lock:
+                    if self._generations.get(user_id) != generation:
+                        # chunks changed while loading: serve nothing stale
+                        return None
+                    if index.size_bytes > self._budget_bytes:
+                        logger.info(f"Index for user {user_id} ({index.size_bytes} bytes) exceeds the memory budget")
+                        self._mark_unservable(user_id, generation, math.inf)
+                        return None
+                    self._lookups.pop(user_id, None)
+                    self._drop(user_id)
+                    self._put(user_id, index, generation)
+                return index
+            finally:
+                with self._lock:
+                    self._load_locks.pop(user_id, None)
+
+    def _mark_unservable(self, user_id: str, generation: int, retry_at: float) -> None:
+        self._lookups.pop(user_id, None)
+        self._unservable[user_id] = (generation, retry_at)
+        self._unservable.move_to_end(user_id)
+        while len(self._unservable) > self._max_tracked_users:
+            self._unservable.popitem(last=False)
+
+    def _put(self, user_id: str, index: UserVectorIndex, generation: int) -> None:
+        self._entries[user_id] = index
+        self._loaded_at[user_id] = generation
+        self._used_bytes += index.size_bytes
+        while self._used_bytes > self._budget_bytes and self._entries:
+            evicted_user, evicted = self._entries.popitem(last=False)
+            self._loaded_at.pop(evicted_user, None)
+            self._used_bytes -= evicted.size_bytes
+
+    def _drop(self, user_id: str) -> None:
+        index = self._entries.pop(user_id, None)
+        self._loaded_at.pop(user_id, None)
+        if index is not None:
+            self._used_bytes -= index.size_bytes
+
+    def generation(self, user_id: str) -> int:
+        """Bumped on every invalidate, by any worker: a cheap version of the user's document set."""
+        return self._generations.get(user_id)
+
+    def invalidate(self, user_id: str) -> None:
+        self._generations.bump(user_id)
+        with self._lock:
+            self._drop(user_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            for user_id in list(self._entries):
+                self._generations.bump(user_id)
+            self._entries.clear()
+            self._loaded_at.clear()
+            self._unservable.clear()
+            self._used_bytes = 0
+
+
+USER_INDEX_CACHE = UserIndexCache(
+    budget_bytes=CONFIG.USER_INDEX_MEMORY_BUDGET_MB * 1024 * 1024,
+    hot_threshold=CONFIG.USER_INDEX_HOT_THRESHOLD,
+)
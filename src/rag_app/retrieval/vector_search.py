@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Optional, List, Dict, Sequence, Tuple
+
+import numpy as np
+import psycopg
+from langchain_core.documents import Document
+from psycopg.types.json import Jsonb
+
+from rag_app.config import CONFIG
+from rag_app.db_pool import connection, ensure_vector, vector_connection
+from rag_app.document import document_registry
+from rag_app.document.document_registry import NOT_DELETED
+
+
+@dataclass(frozen=True)
+class SearchHits:
+    """
+    Result of a vector search, best first:
+      - documents: the chunks
+      - similarities: (n,) cosine similarity to the query
+      - embeddings: (n, dim) chunk embeddings, row-aligned with documents
+    """
+    documents: List[Document]
+    similarities: np.ndarray
+    embeddings: np.ndarray
+
+    @classmethod
+    def empty(cls) -> SearchHits:
+        return cls(documents=[], similarities=np.zeros(0, dtype=np.float32),
+                   embeddings=np.zeros((0, 0), dtype=np.float32))
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def take(self, indices: List[int]) -> SearchHits:
+        """Subset of the hits, in the order of `indices`."""
+        if not indices:
+            return SearchHits.empty()
+        idx = np.asarray(indices, dtype=np.intp)
+        return SearchHits(
+            documents=[self.documents[i] for i in indices],
+            similarities=self.similarities[idx],
+            embeddings=self.embeddings[idx],
+        )
+
+
+def pg_similarity_search(query_embedding: List[float], *, user_id: str, k: int,
+                         document_id: Optional[str] = None, collection: Optional[str] = None) -> SearchHits:
+    """
+    Cosine top-k over a user's chunks in langchain_pg_embedding.
+    Unlike PGVector.similarity_search it also returns the chunk embeddings,
+    which the diversification stage needs.
+    """
+    sql = f"""
+          SELECT e.id, e.document, e.cmetadata, e.embedding, 1 - (e.embedding <=> %(query)s) AS similarity
+          FROM langchain_pg_embedding e
+              JOIN langchain_pg_collection c
+          ON e.collection_id = c.uuid
+          WHERE c.name = %(collection)s
+            AND e.cmetadata->>'user_id' = %(user_id)s
+            AND (%(document_id)s::text IS NULL OR e.cmetadata->>'document_id' = %(document_id)s)
+            AND {NOT_DELETED}
+          ORDER BY e.embedding <=> %(query)s
+          LIMIT %(k)s;
+          """
+    params = {
+        "query": np.asarray(query_embedding, dtype=np.float32),
+        "collection": collection or CONFIG.DOCUMENTS_COLLECTION,
+        "user_id": user_id,
+        "document_id": document_id,
+        "k": k,
+    }
+    document_registry.setup()
+    with vector_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+    if not rows:
+        return SearchHits.empty()
+    return SearchHits(
+        documents=[Document(id=row[0], page_content=row[1], metadata=row[2]) for row in rows],
+        similarities=np.array([row[4] for row in rows], dtype=np.float32),
+        embeddings=np.vstack([row[3] for row in rows]).astype(np.float32, copy=False),
+    )
+
+
+def pg_fetch_context(winners: List[Tuple[str, int, Optional[int]]], *, user_id: str, scope: str, window: int,
+                     collection: Optional[str] = None) -> Dict[int, List[Tuple[int, str]]]:
+    """
+    One round trip for the context of every winner.
+    winners: (document_id, chunk_ordinal, section_id) per winner.
+    scope="neighbors": chunks within `window` ordinals of the winner;
+    scope="section": every chunk of the winner's section.
+    Returns {winner position: [(chunk_ordinal, text), ...]} in document order.
+    """
+    if not winners:
+        return {}
+    sql = f"""
+          SELECT w.pos, (e.cmetadata->>'chunk_ordinal')::int AS ordinal, e.document
+          FROM unnest(%(document_ids)s::text[], %(ordinals)s::int[], %(sections)s::int[])
+              WITH ORDINALITY AS w(document_id, chunk_ordinal, section_id, pos)
+              JOIN langchain_pg_embedding e
+          ON e.cmetadata->>'document_id' = w.document_id
+              JOIN langchain_pg_collection c
+          ON e.collection_id = c.uuid
+          WHERE c.name = %(collection)s
+            AND e.cmetadata->>'user_id' = %(user_id)s
+            AND e.cmetadata ? 'chunk_ordinal'
+            AND CASE
+                  WHEN %(scope)s = 'section'
+                      THEN (e.cmetadata->>'section_id')::int = w.section_id
+                  ELSE (e.cmetadata->>'chunk_ordinal')::int BETWEEN w.chunk_ordinal - %(window)s AND w.chunk_ordinal + %(window)s
+                END
+            AND {NOT_DELETED}
+          ORDER BY w.pos, ordinal;
+          """
+    params = {
+        "document_ids": [w[0] for w in winners],
+        "ordinals": [w[1] for w in winners],
+        "sections": [w[2] for w in winners],
+        "collection": collection or CONFIG.DOCUMENTS_COLLECTION,
+        "user_id": user_id,
+        "scope": scope,
+        "window": window,
+    }
+    context: Dict[int, List[Tuple[int, str]]] = {}
+    document_registry.setup()
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(sql, params)
+        for pos, ordinal, text in cur.fetchall():
+            context.setdefault(pos - 1, []).append((ordinal, text))
+    return context
+
+
+def pg_insert_chunks(conn: psycopg.Connection, *, ids: Sequence[str], texts: Sequence[str],
+                     embeddings: Sequence[Sequence[float]], metadatas: Sequence[Dict[str, Any]],
+                     collection: Optional[str] = None) -> int:
+    """
+    Insert chunks into the PGVector tables on `conn`, so the caller can write
+    them in the same transaction as related rows. The collection must exist.
+    """
+    ensure_vector(conn)
+    name = collection or CONFIG.DOCUMENTS_COLLECTION
+    row = conn.execute("SELECT uuid FROM langchain_pg_collection WHERE name = %s", (name,)).fetchone()
+    if row is None:
+        raise ValueError(f"Collection {name!r} not found")
+    with conn.cursor() as cur:
+        cur.executemany(
+            """
+            INSERT INTO langchain_pg_embedding (id, collection_id, embedding, document, cmetadata)
+            VALUES (%s, %s, %s, %s, %s)
+            """,
+            [(chunk_id, row[0], np.asarray(embedding, dtype=np.float32), text, Jsonb(metadata))
+             for chunk_id, text, embedding, metadata in zip(ids, texts, embeddings, metadatas)],
+        )
+    return len(ids)
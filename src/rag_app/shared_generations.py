@@ -0,0 +1,37 @@
+"""
+Cache invalidation counters shared by every worker process.
+
+The in-process caches (transcript pages, per-user vector indexes) are
+invalidated by the request that changes the underlying rows, but with
+WEB_WORKERS > 1 the next read of those rows may be served by another worker.
+So each cache versions its entries with a `SharedGenerations`: a fixed array
+of counters in shared memory, created when the cache's module is imported,
+i.e. in the master before it forks, so all workers see the same counters.
+`bump(key)` on a write makes every worker's entries for `key` stale. Keys are
+hashed onto `slots` counters: a key sharing a slot with a written one only
+costs a spurious cache miss.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import zlib
+
+
+class SharedGenerations:
+    def __init__(self, slots: int = 65536):
+        self._slots = max(1, slots)
+        self._counters = multiprocessing.RawArray("Q", self._slots)
+        self._lock = multiprocessing.Lock()
+
+    def _slot(self, key: str) -> int:
+        # not hash(): string hashes are salted per interpreter
+        return zlib.crc32(key.encode()) % self._slots
+
+    def get(self, key: str) -> int:
+        return self._counters[self._slot(key)]
+
+    def bump(self, key: str) -> int:
+        slot = self._slot(key)
+        with self._lock:
+            self._counters[slot] += 1
+            return self._counters[slot]
@@ -0,0 +1,183 @@
+"""
+Start-up warm-up and readiness.
+
+Importing the app creates nothing heavy: the connection pools, table
+migrations, compiled graph and CrossEncoder are all built on first use. The
+FastAPI lifespan runs `warm_up` as a background task so they are built before
+the first request instead: each step is timed, failed steps are retried every
+READINESS_RETRY_SECONDS, and GET /health/ready answers 503 until all of them
+have succeeded (GET /health/live answers as soon as the server is up).
+
+    rag-import-profile           # slowest imports of the app module, via python -X importtime
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from rag_app import IMPORT_STARTED
+from rag_app.config import CONFIG
+from rag_app.tracing import observe, register_collector
+
+logger = logging.getLogger(__name__)
+
+Step = Tuple[str, Callable[[], Awaitable[Any]]]
+
+
+@dataclass
+class StepReport:
+    ok: bool = False
+    seconds: float = 0.0
+    attempts: int = 0
+    error: Optional[str] = None
+
+
+class Readiness:
+    """Outcome of every warm-up step and the moment the process became ready."""
+
+    def __init__(self, started: float = IMPORT_STARTED):
+        self._started = started
+        self._steps: Dict[str, StepReport] = {}
+        self._ready_after: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready_after is not None
+
+    def record(self, step: str, ok: bool, seconds: float, error: Optional[str] = None) -> None:
+        with self._lock:
+            report = self._steps.setdefault(step, StepReport())
+            report.ok, report.seconds, report.error = ok, seconds, error
+            report.attempts += 1
+
+    def mark_ready(self) -> None:
+        with self._lock:
+            if self._ready_after is None:
+                self._ready_after = time.monotonic() - self._started
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ready": self._ready_after is not None,
+                "startup_seconds": round(self._ready_after, 3) if self._ready_after is not None else None,
+                "steps": {name: asdict(step) for name, step in self._steps.items()},
+            }
+
+    def render_metrics(self) -> Iterable[str]:
+        report = self.report()
+        yield "# TYPE rag_ready gauge"
+        yield f"rag_ready {int(report['ready'])}"
+        if report["startup_seconds"] is not None:
+            yield "# TYPE rag_startup_seconds gauge"
+            yield f"rag_startup_seconds {report['startup_seconds']}"
+        if report["steps"]:
+            yield "# TYPE rag_startup_step_seconds gauge"
+            for name, step in sorted(report["steps"].items()):
+                yield f'rag_startup_step_seconds{{step="{name}"}} {step["seconds"]!r}'
+
+
+READINESS = Readiness()
+register_collector(READINESS.render_metrics)
+
+
+async def warm_up(steps: Sequence[Step], readiness: Readiness = READINESS, retry_seconds: Optional[float] = None,
+                  sleep: Callable[[float], Awaitable[None]] = asyncio.sleep) -> None:
+    """Run every step until each has succeeded once, then mark the process ready."""
+    retry_seconds = CONFIG.READINESS_RETRY_SECONDS if retry_seconds is None else retry_seconds
+    pending = list(steps)
+    while True:
+        failed = []
+        for name, step in pending:
+            start = time.perf_counter()
+            try:
+                await step()
+            except Exception as e:
+                readiness.record(name, False, time.perf_counter() - start, f"{type(e).__name__}: {e}")
+                logger.warning(f"Start-up step {name} failed, retrying in {retry_seconds}s: {type(e).__name__}: {e}")
+                failed.append((name, step))
+            else:
+                seconds = time.perf_counter() - start
+                readiness.record(name, True, seconds)
+                observe(f"startup_{name}", seconds)
+        if not failed:
+            break
+        pending = failed
+        await sleep(retry_seconds)
+    readiness.mark_ready()
+    logger.info("Ready", extra={"startup": readiness.report()})
+
+
+def default_steps() -> List[Step]:
+    """Everything the first chat or document request would otherwise build."""
+    from rag_app.agent.graph import get_graph
+    from rag_app.db_pool import get_async_pool, get_pool
+    from rag_app.document import document_registry
+    from rag_app.ingestion.pdf_store import get_pdf_saver
+    from rag_app.retrieval.pdf_retriever import get_pdf_retriever
+    from rag_app import transcript
+    from rag_app.thread_registry import get_thread_registry
+
+    async def db_pools():
+        await asyncio.to_thread(get_pool().wait, CONFIG.DB_POOL_TIMEOUT_SECONDS)
+        await (await get_async_pool()).wait(CONFIG.DB_POOL_TIMEOUT_SECONDS)
+
+    def schema():
+        get_thread_registry().setup()
+        document_registry.setup()
+        transcript.setup()
+
+    return [
+        ("db_pools", db_pools),
+        ("schema", lambda: asyncio.to_thread(schema)),
+        ("graph", get_graph),
+        ("reranker", lambda: asyncio.to_thread(get_pdf_retriever)),
+        ("pdf_saver", lambda: asyncio.to_thread(get_pdf_saver)),
+    ]
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """(module, self µs, cumulative µs) of every line of `python -X importtime` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        rows.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Import `--module` in a fresh interpreter and print its slowest imports."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--module", default="rag_app.web_api.endpoints")
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {args.module}"],
+                            capture_output=True, text=True, env=os.environ.copy())
+    wall = time.perf_counter() - start
+    rows = parse_importtime(result.stderr)
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if line.strip() and not line.startswith("import time:")]
+        sys.stderr.write(f"import failed: {errors[-1] if errors else result.returncode}\n")
+    sys.stdout.write(f"import {args.module}: {wall:.2f}s wall, {len(rows)} modules\n")
+    sys.stdout.write(f"{'cumulative ms':>14} {'self ms':>9}  module\n")
+    for module, own, cumulative in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+        sys.stdout.write(f"{cumulative / 1000:14.1f} {own / 1000:9.1f}  {module}\n")
+    if result.returncode != 0:
+        sys.exit(result.returncode)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Registry of chat threads per user.
+
+Replaces the STORE.put that ran on every chat turn. `touch` only records the
+thread in memory; a background flusher writes a new thread right away and
+folds `updated_at` bumps of known threads into one batched upsert every
+`flush_seconds`. Listing a user's threads is an indexed query on
+(user_id, updated_at), paginated by (updated_at, thread_id) keyset.
+
+Deleting a thread (`checkpoint_retention.delete_thread`) only sets its
+`deleted_at`: the upsert never updates a row carrying it, so a bump still
+pending in another worker, or in a batch this process is flushing, can't
+bring the thread back into listings. Retention drops the tombstones later.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Callable, ContextManager, Dict, List, Optional, Tuple
+
+import psycopg
+
+from rag_app.config import CONFIG
+from rag_app.db_pool import connection
+
+logger = logging.getLogger(__name__)
+
+_SETUP = """
+    CREATE TABLE IF NOT EXISTS chat_threads (
+        thread_id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        deleted_at TIMESTAMPTZ
+    );
+    ALTER TABLE chat_threads ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ;
+    CREATE INDEX IF NOT EXISTS chat_threads_user_updated_idx ON chat_threads (user_id, updated_at DESC);
+    """
+
+# one-off backfill of the threads recorded in the LangGraph store as ("chat_history.<user_id>", thread_id)
+_BACKFILL = """
+    INSERT INTO chat_threads (thread_id, user_id, created_at, updated_at)
+    SELECT s.key, substr(s.prefix, length('chat_history.') + 1), s.created_at, s.updated_at
+    FROM store s
+    WHERE s.prefix LIKE 'chat_history.%'
+      AND NOT EXISTS (SELECT 1 FROM chat_threads LIMIT 1)
+    ON CONFLICT (thread_id) DO NOTHING;
+    """
+
+_UPSERT = """
+    INSERT INTO chat_threads (thread_id, user_id, created_at, updated_at)
+    SELECT t.thread_id, t.user_id, t.ts, t.ts
+    FROM unnest(%(thread_ids)s::text[], %(user_ids)s::text[], %(timestamps)s::timestamptz[]) AS t(thread_id, user_id, ts)
+    ON CONFLICT (thread_id) DO UPDATE
+        SET updated_at = GREATEST(chat_threads.updated_at, EXCLUDED.updated_at)
+        WHERE chat_threads.deleted_at IS NULL
+    RETURNING thread_id, user_id;
+    """
+
+_LIST = """
+    SELECT thread_id, created_at, updated_at
+    FROM chat_threads
+    WHERE user_id = %(user_id)s
+      AND deleted_at IS NULL
+      AND (%(after_updated_at)s::timestamptz IS NULL
+           OR (updated_at, thread_id) < (%(after_updated_at)s::timestamptz, %(after_thread_id)s::text))
+    ORDER BY updated_at DESC, thread_id DESC
+    LIMIT %(limit)s;
+    """
+
+_OWNER = "SELECT user_id FROM chat_threads WHERE thread_id = %(thread_id)s AND deleted_at IS NULL;"
+
+
+@dataclass(frozen=True)
+class ThreadEntry:
+    thread_id: str
+    user_id: str
+    created_at: datetime
+    updated_at: datetime
+
+
+class ThreadRegistry:
+    """
+    In-memory front of the chat_threads table.
+    Threads already known to exist (bounded LRU) are only bumped in the next
+    batch; unknown ones wake the flusher immediately so they show up in the
+    thread list without waiting for the batch interval.
+    """
+
+    def __init__(self, flush_seconds: float = 5.0, max_known: int = 100_000,
+                 connect: Callable[[], ContextManager[psycopg.Connection]] = connection):
+        self._flush_seconds = flush_seconds
+        self._max_known = max_known
+        self._connect = connect
+        self._pending: Dict[str, ThreadEntry] = {}
+        # thread -> owner, for threads already stored
+        self._known: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._ready = False
+
+    def setup(self) -> None:
+        if self._ready:
+            return
+        with self._connect() as conn:
+            conn.execute(_SETUP)
+            if conn.execute("SELECT to_regclass('store')").fetchone()[0] is not None:
+                conn.execute(_BACKFILL)
+        self._ready = True
+
+    def touch(self, user_id: str, thread_id: str) -> None:
+        """
+        Record activity on a thread; never touches the database on the caller's
+        thread. A thread keeps the user it was first recorded for: activity of
+        another user on it is ignored.
+        """
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            current = self._pending.get(thread_id)
+            owner = current.user_id if current else self._known.get(thread_id)
+            if owner is not None and owner != user_id:
+                logger.warning(f"Ignoring activity of user {user_id} on thread {thread_id} of another user")
+                return
+            created_at = current.created_at if current else now
+            self._pending[thread_id] = ThreadEntry(thread_id, user_id, created_at, now)
+            is_new = thread_id not in self._known
+        if is_new:
+            self._wake.set()
+        self._ensure_started()
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="thread-registry", daemon=True)
+                    self._thread.start()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self._flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Write every pending thread in one upsert; returns how many were written."""
+        with self._lock:
+            batch, self._pending = list(self._pending.values()), {}
+        if not batch:
+            return 0
+        try:
+            self.setup()
+            with self._connect() as conn:
+                stored = conn.execute(_UPSERT, {
+                    "thread_ids": [e.thread_id for e in batch],
+                    "user_ids": [e.user_id for e in batch],
+                    "timestamps": [e.updated_at for e in batch],
+                }).fetchall()
+        except Exception as e:
+            logger.error(f"Could not flush {len(batch)} chat threads: {type(e).__name__}: {e}")
+            with self._lock:
+                for entry in batch:
+                    self._pending.setdefault(entry.thread_id, entry)
+            return 0
+        with self._lock:
+            # owners as stored: the upsert never changes user_id (and skips tombstoned threads)
+            for thread_id, owner in stored:
+                self._known[thread_id] = owner
+                self._known.move_to_end(thread_id)
+            while len(self._known) > self._max_known:
+                self._known.popitem(last=False)
+        return len(batch)
+
+    def list_threads(self, user_id: str, limit: int = 1000,
+                     after: Optional[Tuple[datetime, str]] = None) -> List[ThreadEntry]:
+        """
+        A user's threads, most recently active first, including activity not
+        flushed yet; only those strictly after the (updated_at, thread_id) key `after`.
+        """
+        self.setup()
+        with self._lock:
+            pending = [e for e in self._pending.values() if e.user_id == user_id]
+        with self._connect() as conn, conn.cursor() as cur:
+            # over-fetch by the pending threads, whose stored rows may be dropped below
+            cur.execute(_LIST, {"user_id": user_id, "limit": limit + len(pending),
+                                "after_updated_at": after[0] if after else None,
+                                "after_thread_id": after[1] if after else None})
+            rows = {r[0]: ThreadEntry(r[0], user_id, r[1], r[2]) for r in cur.fetchall()}
+        for entry in pending:
+            # a pending bump moves the thread to its new position, possibly on an earlier page
+            stored = rows.pop(entry.thread_id, None)
+            if after is None or (entry.updated_at, entry.thread_id) < after:
+                rows[entry.thread_id] = ThreadEntry(entry.thread_id, user_id,
+                                                    stored.created_at if stored else entry.created_at,
+                                                    entry.updated_at)
+        return sorted(rows.values(), key=lambda e: (e.updated_at, e.thread_id), reverse=True)[:limit]
+
+    def owner(self, thread_id: str) -> Optional[str]:
+        """The user a thread belongs to, or None for an unknown thread; the stored row wins over pending activity."""
+        self.setup()
+        with self._connect() as conn:
+            row = conn.execute(_OWNER, {"thread_id": thread_id}).fetchone()
+        if row is not None:
+            return row[0]
+        with self._lock:
+            entry = self._pending.get(thread_id)
+        return entry.user_id if entry is not None else None
+
+    def forget(self, thread_id: str) -> None:
+        """Drop a deleted thread from memory; bumps pending elsewhere are kept out by its tombstone."""
+        with self._lock:
+            self._pending.pop(thread_id, None)
+            self._known.pop(thread_id, None)
+
+    def close(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+        self.flush()
+
+
+@lru_cache(maxsize=1)
+def get_thread_registry() -> ThreadRegistry:
+    return ThreadRegistry(flush_seconds=CONFIG.THREAD_REGISTRY_FLUSH_SECONDS)
@@ -0,0 +1,263 @@
+"""
+Per-stage latency tracing for the chat and ingestion pipelines.
+
+`span("rerank")` (or `observe` for timings measured elsewhere) records a stage
+twice: into a process-wide histogram served in Prometheus text format on
+/metrics, and into the current request's `Trace`, which `logging_setup`
+attaches to every JSON log line of that request. Prompt sizes go to their own
+token histogram.
+
+With WEB_WORKERS > 1 every worker keeps its own histograms and collectors, and
+a scrape lands on any one of them. So each worker also publishes its metrics
+to a file of the directory the master created (`share_metrics`), every
+`_PUBLISH_SECONDS`, and /metrics serves the series of all the workers, each
+labelled with its `worker` index. A recycled worker restarts its series from
+zero, which Prometheus counts as a counter reset.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# seconds; LLM stages reach the tail buckets, SQL and embeddings the head ones
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a single label, rendered in the Prometheus text format."""
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: Sequence[float]):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[str, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float) -> None:
+        with self._lock:
+            counts, total = self._series.setdefault(label_value, ([0] * len(self.buckets), [0.0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            total[0] += value
+
+    def count(self, label_value: str) -> int:
+        with self._lock:
+            series = self._series.get(label_value)
+            return series[0][-1] if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_value in sorted(self._series):
+                counts, total = self._series[label_value]
+                label = f'{self.label}="{_escape(label_value)}"'
+                for bound, n in zip(self.buckets, counts):
+                    le = "+Inf" if math.isinf(bound) else repr(float(bound))
+                    lines.append(f'{self.name}_bucket{{{label},le="{le}"}} {n}')
+                lines.append(f"{self.name}_sum{{{label}}} {total[0]!r}")
+                lines.append(f"{self.name}_count{{{label}}} {counts[-1]}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+STAGE_SECONDS = Histogram("rag_stage_duration_seconds", "Time spent per pipeline stage.", "stage", STAGE_BUCKETS)
+PROMPT_TOKENS = Histogram("rag_prompt_tokens", "Prompt size in tokens per LLM call kind.", "prompt", TOKEN_BUCKETS)
+HISTOGRAMS = (STAGE_SECONDS, PROMPT_TOKENS)
+# other modules' metrics (e.g. connection pool gauges), rendered after the histograms
+_COLLECTORS: List[Callable[[], Iterable[str]]] = []
+
+
+@dataclass
+class Trace:
+    """Stage timings of one request; a stage hit several times (e.g. checkpoint writes) is summed."""
+    request_id: str
+    spans_ms: Dict[str, float] = field(default_factory=dict)
+    prompt_tokens: Dict[str, int] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add_span(self, stage: str, ms: float) -> None:
+        with self._lock:
+            self.spans_ms[stage] = self.spans_ms.get(stage, 0.0) + ms
+
+    def add_tokens(self, kind: str, tokens: int) -> None:
+        with self._lock:
+            self.prompt_tokens[kind] = self.prompt_tokens.get(kind, 0) + tokens
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = {"request_id": self.request_id,
+                                   "spans_ms": {k: round(v, 1) for k, v in self.spans_ms.items()}}
+            if self.prompt_tokens:
+                out["prompt_tokens"] = dict(self.prompt_tokens)
+            return out
+
+
+# a request's Trace; worker threads and graph tasks inherit it through the copied context
+trace_ctx: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+def start_trace(request_id: str) -> Trace:
+    trace = Trace(request_id)
+    trace_ctx.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return trace_ctx.get()
+
+
+def observe(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(stage, seconds)
+    trace = trace_ctx.get()
+    if trace is not None:
+        trace.add_span(stage, seconds * 1000)
+
+
+def observe_tokens(kind: str, tokens: int) -> None:
+    PROMPT_TOKENS.observe(kind, tokens)
+    trace = trace_ctx.get()
+    if trace is not None:
+        trace.add_tokens(kind, tokens)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time the block as `stage`, errors included."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+class TimedCheckpointSaver:
+    """Mixin timing a checkpointer's async writes as the `checkpoint_write` stage."""
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        with span("checkpoint_write"):
+            return await super().aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        with span("checkpoint_write"):
+            return await super().aput_writes(config, writes, task_id, task_path)
+
+
+def register_collector(collector: Callable[[], Iterable[str]]) -> None:
+    """Add a callable returning exposition lines to every /metrics scrape."""
+    _COLLECTORS.append(collector)
+
+
+# how often a worker publishes its metrics for the other workers' scrapes
+_PUBLISH_SECONDS = 1.0
+# (directory, worker index) once `share_metrics` was called in this worker
+_shared: Optional[Tuple[str, int]] = None
+
+
+def _render_local() -> List[str]:
+    lines: List[str] = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    for collector in _COLLECTORS:
+        lines.extend(collector())
+    return lines
+
+
+def _metrics_path(directory: str, worker: int) -> str:
+    return os.path.join(directory, f"worker-{worker}.prom")
+
+
+def _publish() -> List[str]:
+    """Write this worker's metrics to its file (atomically) and return them."""
+    lines = _render_local()
+    directory, worker = _shared
+    path = _metrics_path(directory, worker)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write("\n".join(lines))
+    os.replace(tmp, path)
+    return lines
+
+
+def share_metrics(directory: str, worker: int, interval: float = _PUBLISH_SECONDS) -> None:
+    """In a forked worker: publish its metrics to `directory` and serve every worker's on /metrics."""
+    global _shared
+    _shared = (directory, worker)
+
+    def loop() -> None:
+        while True:
+            try:
+                _publish()
+            except OSError as e:
+                logger.warning(f"Could not publish the metrics of worker {worker}: {e}")
+            time.sleep(interval)
+
+    threading.Thread(target=loop, name="metrics-publisher", daemon=True).start()
+
+
+def _with_label(sample: str, label: str) -> str:
+    brace, space = sample.find("{"), sample.find(" ")
+    if 0 <= brace < space:
+        return f"{sample[:brace + 1]}{label},{sample[brace + 1:]}"
+    return f"{sample[:space]}{{{label}}}{sample[space:]}"
+
+
+def merge_worker_metrics(per_worker: Dict[int, List[str]]) -> List[str]:
+    """One exposition of several workers' lines: each family once, each sample labelled with its worker."""
+    headers: Dict[str, List[str]] = {}
+    samples: Dict[str, List[str]] = {}
+    for worker in sorted(per_worker):
+        family = None
+        for line in per_worker[worker]:
+            if line.startswith("#"):
+                parts = line.split(" ", 3)
+                if len(parts) >= 3 and parts[1] in ("HELP", "TYPE"):
+                    family = parts[2]
+                    header = headers.setdefault(family, [])
+                    if line not in header:
+                        header.append(line)
+                    samples.setdefault(family, [])
+            elif line:
+                if family is None:  # no header: the sample is its own family
+                    family = line.split("{", 1)[0].split(" ", 1)[0]
+                    headers.setdefault(family, [])
+                    samples.setdefault(family, [])
+                samples[family].append(_with_label(line, f'worker="{worker}"'))
+    lines: List[str] = []
+    for family, header in headers.items():
+        lines.extend(header)
+        lines.extend(samples[family])
+    return lines
+
+
+def render_metrics() -> str:
+    if _shared is None:
+        return "\n".join(_render_local()) + "\n"
+    directory, worker = _shared
+    per_worker = {worker: _publish()}
+    for name in os.listdir(directory):
+        if not (name.startswith("worker-") and name.endswith(".prom")):
+            continue
+        other = int(name[len("worker-"):-len(".prom")])
+        if other == worker:
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                per_worker[other] = f.read().splitlines()
+        except FileNotFoundError:
+            continue
+    return "\n".join(merge_worker_metrics(per_worker)) + "\n"
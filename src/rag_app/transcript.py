@@ -0,0 +1,282 @@
+"""
+Materialized chat transcripts for the thread views.
+
+Rendering a conversation only needs its human and AI text, but `graph.aget_state`
+loads and unpickles the latest checkpoint for it. Instead, the async
+checkpointer (`TranscriptRecorder`) appends every new human/AI message to the
+`chat_transcript` table as checkpoints are written, and thread views read
+pages of that table, keyed by `seq`, the message's index in the append-only
+`messages` channel. Pages go through an in-process LRU that is invalidated,
+in every worker process, on every new message and when the thread is deleted.
+
+Threads with no transcript rows yet (created before the table existed) are
+read from the messages blob of their latest checkpoint; their next turn
+backfills the table.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage
+
+from rag_app.agent.agent_state import INTERACTION_ID, TIMESTAMP
+from rag_app.config import CONFIG
+from rag_app.db_pool import connection, get_async_pool
+from rag_app.shared_generations import SharedGenerations
+from rag_app.tracing import span
+
+logger = logging.getLogger(__name__)
+
+_SETUP = """
+    CREATE TABLE IF NOT EXISTS chat_transcript (
+        thread_id TEXT NOT NULL,
+        seq INT NOT NULL,
+        type TEXT NOT NULL,
+        content TEXT NOT NULL,
+        interaction_id TEXT,
+        created_at TIMESTAMPTZ,
+        PRIMARY KEY (thread_id, seq)
+    );
+    """
+
+_NEXT_SEQ = "SELECT coalesce(max(seq) + 1, 0) FROM chat_transcript WHERE thread_id = %(thread_id)s;"
+
+_APPEND = """
+    INSERT INTO chat_transcript (thread_id, seq, type, content, interaction_id, created_at)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON CONFLICT (thread_id, seq) DO NOTHING;
+    """
+
+_PAGE = """
+    SELECT seq, type, content, interaction_id, created_at
+    FROM chat_transcript
+    WHERE thread_id = %(thread_id)s
+      AND seq > %(after_seq)s
+    ORDER BY seq
+    LIMIT %(limit)s;
+    """
+
+_HAS_ROWS = "SELECT EXISTS (SELECT 1 FROM chat_transcript WHERE thread_id = %(thread_id)s);"
+
+_LATEST_MESSAGES = """
+    SELECT b.type, b.blob
+    FROM checkpoints c
+        JOIN checkpoint_blobs b
+    ON b.thread_id = c.thread_id
+        AND b.checkpoint_ns = c.checkpoint_ns
+        AND b.channel = 'messages'
+        AND b.version = c.checkpoint->'channel_versions'->>'messages'
+    WHERE c.thread_id = %(thread_id)s
+      AND c.checkpoint_ns = ''
+    ORDER BY c.checkpoint_id DESC
+    LIMIT 1;
+    """
+
+
+@dataclass(frozen=True)
+class TranscriptEntry:
+    seq: int
+    type: str
+    content: str
+    interaction_id: Optional[str]
+    timestamp: Optional[datetime]
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime) or value is None:
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_entries(messages: List[BaseMessage], start: int = 0) -> List[TranscriptEntry]:
+    """
+    The human and AI text of `messages[start:]`; tool results and
+    tool-call-only AI messages are left out.
+    """
+    entries = []
+    for seq in range(start, len(messages)):
+        message = messages[seq]
+        if message.type == "tool" or not isinstance(message.content, str) or not message.content:
+            continue
+        kwargs = message.additional_kwargs or {}
+        entries.append(TranscriptEntry(seq=seq, type=message.type, content=message.content,
+                                       interaction_id=kwargs.get(INTERACTION_ID),
+                                       timestamp=_parse_timestamp(kwargs.get(TIMESTAMP))))
+    return entries
+
+
+PageKey = Tuple[Optional[int], Optional[int]]
+
+
+class TranscriptCache:
+    """
+    LRU of transcript pages per thread, bounded by the number of threads.
+    `invalidate` makes every page of a thread stale, in all worker processes;
+    a page read while the thread was being written (`generation` taken
+    before the read) is not stored.
+    """
+
+    def __init__(self, max_threads: int, generations: Optional[SharedGenerations] = None):
+        self._max_threads = max_threads
+        self._generations = generations or SharedGenerations()
+        # thread -> (generation its pages were read at, pages)
+        self._threads: OrderedDict[str, Tuple[int, Dict[PageKey, List[TranscriptEntry]]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, thread_id: str, key: PageKey) -> Optional[List[TranscriptEntry]]:
+        with self._lock:
+            cached = self._threads.get(thread_id)
+            if cached is None:
+                return None
+            generation, pages = cached
+            if generation != self._generations.get(thread_id):
+                del self._threads[thread_id]
+                return None
+            if key not in pages:
+                return None
+            self._threads.move_to_end(thread_id)
+            return pages[key]
+
+    def generation(self, thread_id: str) -> int:
+        return self._generations.get(thread_id)
+
+    def put(self, thread_id: str, key: PageKey, entries: List[TranscriptEntry], generation: int) -> None:
+        if self._max_threads <= 0:
+            return
+        with self._lock:
+            if self._generations.get(thread_id) != generation:
+                return
+            cached = self._threads.get(thread_id)
+            if cached is None or cached[0] != generation:
+                cached = self._threads[thread_id] = (generation, {})
+            cached[1][key] = entries
+            self._threads.move_to_end(thread_id)
+            while len(self._threads) > self._max_threads:
+                self._threads.popitem(last=False)
+
+    def invalidate(self, thread_id: str) -> None:
+        self._generations.bump(thread_id)
+        with self._lock:
+            self._threads.pop(thread_id, None)
+
+    def __contains__(self, thread_id: str) -> bool:
+        return thread_id in self._threads
+
+
+TRANSCRIPT_CACHE = TranscriptCache(max_threads=CONFIG.TRANSCRIPT_CACHE_THREADS)
+
+# threads -> number of messages already recorded, so a turn only appends its own messages
+_recorded: OrderedDict[str, int] = OrderedDict()
+_recorded_lock = threading.Lock()
+_MAX_RECORDED = 100_000
+
+_ready = False
+_ready_lock = threading.Lock()
+
+
+def setup() -> None:
+    """Create the table once per process."""
+    global _ready
+    if _ready:
+        return
+    with _ready_lock:
+        if not _ready:
+            with connection() as conn:
+                conn.execute(_SETUP)
+            _ready = True
+
+
+async def record_messages(thread_id: str, messages: List[BaseMessage]) -> int:
+    """Append the messages of `thread_id` not recorded yet; returns how many rows were written."""
+    if not _ready:
+        await asyncio.to_thread(setup)
+    with _recorded_lock:
+        start = _recorded.get(thread_id)
+    pool = await get_async_pool()
+    async with pool.connection() as conn:
+        if start is None or start > len(messages):
+            cur = await conn.execute(_NEXT_SEQ, {"thread_id": thread_id})
+            start = (await cur.fetchone())[0]
+        entries = to_entries(messages, start)
+        if entries:
+            async with conn.cursor() as cur:
+                await cur.executemany(_APPEND, [(thread_id, e.seq, e.type, e.content, e.interaction_id, e.timestamp)
+                                                for e in entries])
+    with _recorded_lock:
+        _recorded[thread_id] = len(messages)
+        _recorded.move_to_end(thread_id)
+        while len(_recorded) > _MAX_RECORDED:
+            _recorded.popitem(last=False)
+    TRANSCRIPT_CACHE.invalidate(thread_id)
+    return len(entries)
+
+
+def forget_thread(thread_id: str) -> None:
+    """Called when a thread is deleted (its rows go with the checkpoints)."""
+    with _recorded_lock:
+        _recorded.pop(thread_id, None)
+    TRANSCRIPT_CACHE.invalidate(thread_id)
+
+
+class TranscriptRecorder:
+    """Checkpointer mixin recording the new human/AI messages of every root checkpoint it writes."""
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        result = await super().aput(config, checkpoint, metadata, new_versions)
+        configurable = config.get("configurable", {})
+        if "messages" in new_versions and not configurable.get("checkpoint_ns"):
+            thread_id = configurable["thread_id"]
+            try:
+                with span("transcript_write"):
+                    await record_messages(thread_id, checkpoint["channel_values"].get("messages") or [])
+            except Exception as e:
+                # the next checkpoint of the thread catches up from the last recorded seq
+                logger.error(f"Could not record transcript of thread {thread_id}: {type(e).__name__}: {e}")
+                forget_thread(thread_id)
+        return result
+
+
+async def _read_from_checkpoint(conn, thread_id: str, serde: Any) -> List[TranscriptEntry]:
+    cur = await conn.execute(_LATEST_MESSAGES, {"thread_id": thread_id})
+    row = await cur.fetchone()
+    if row is None or row[0] == "empty":
+        return []
+    return to_entries(serde.loads_typed((row[0], bytes(row[1]))))
+
+
+async def read_transcript(thread_id: str, serde: Any, *, limit: Optional[int],
+                          after_seq: Optional[int] = None) -> List[TranscriptEntry]:
+    """
+    Up to `limit` (all, when None) entries, oldest first, after message
+    `after_seq`; `serde` is the checkpointer's, for threads not in the table yet.
+    """
+    key = (after_seq, limit)
+    cached = TRANSCRIPT_CACHE.get(thread_id, key)
+    if cached is not None:
+        return cached
+    generation = TRANSCRIPT_CACHE.generation(thread_id)
+    if not _ready:
+        await asyncio.to_thread(setup)
+    pool = await get_async_pool()
+    async with pool.connection() as conn:
+        params = {"thread_id": thread_id, "after_seq": -1 if after_seq is None else after_seq, "limit": limit}
+        cur = await conn.execute(_PAGE, params)
+        entries = [TranscriptEntry(*row) for row in await cur.fetchall()]
+        if not entries:
+            cur = await conn.execute(_HAS_ROWS, {"thread_id": thread_id})
+            if not (await cur.fetchone())[0]:
+                legacy = await _read_from_checkpoint(conn, thread_id, serde)
+                if after_seq is not None:
+                    legacy = [e for e in legacy if e.seq > after_seq]
+                entries = legacy if limit is None else legacy[:limit]
+    TRANSCRIPT_CACHE.put(thread_id, key, entries, generation)
+    return entries
@@ -7,6 +7,7 @@ from fastapi import HTTPException, APIRouter
 from pydantic import BaseModel
 
 logger = logging.getLogger(__name__)
+from rag_app.backend_pool import get_chat_pool, get_embedding_pool
 from rag_app.config import CONFIG
 
 admin_router = APIRouter(prefix="/admin")
@@ -61,3 +62,13 @@ async def create_user_admin(req: CreateUser):
 
     # GoTrue returns the user/session payload; return or shape as you like
     return {"status": "created", "gotrue": resp.json()}
+
+
+@admin_router.get("/backends")
+async def backend_stats():
+    """Admin: health, in-flight requests and latency of every chat/embedding backend."""
+    chat, embedding = get_chat_pool(), get_embedding_pool()
+    return {
+        "chat": chat.stats() if chat else [],
+        "embedding": embedding.stats() if embedding else [],
+    }
@@ -1,22 +1,26 @@
+import asyncio
 import logging
 import uuid
 from datetime import datetime
 from typing import Optional, List
 from uuid import uuid4
 
-from fastapi import Header
+from fastapi import Header, HTTPException, Query, Request
 from fastapi.responses import StreamingResponse
-from langgraph.store.base import SearchItem
-from langgraph.types import StateSnapshot
 from pydantic import BaseModel, Field
 
 logger = logging.getLogger(__name__)
-from rag_app.agent.graph import launch_graph, GRAPH
-from rag_app.agent.graph_configuration import GraphRunConfig, THREAD_ID
+from rag_app.admission import CHAT_ADMISSION, hold
+from rag_app.agent.graph import launch_graph, launch_shared_graph, get_graph
+from rag_app.agent.graph_configuration import GraphRunConfig
 
 from fastapi import Depends, APIRouter
 
-from rag_app.db_memory import STORE, CHECKPOINTER
+from rag_app.checkpoint_retention import ThreadNotOwned, delete_thread as delete_thread_checkpoints
+from rag_app.config import CONFIG
+from rag_app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, decode_cursor, encode_cursor
+from rag_app.thread_registry import get_thread_registry
+from rag_app.transcript import read_transcript
 
 logger = logging.getLogger(__name__)
 from rag_app.web_api.jwt_resolver import JWTBearer
@@ -33,13 +37,35 @@ class ChatHistory(BaseModel):
 
 @chat_router.get("/get_user_conversation_history")
 async def get_user_conversation_history(user_id: str = Depends(JWTBearer())) -> List[ChatHistory]:
-    chats: list[SearchItem] = STORE.search(("chat_history", user_id))
-    if not chats:
-        return []
+    threads = await asyncio.to_thread(get_thread_registry().list_threads, user_id)
     return [
-        ChatHistory(thread_id=chat.value["config"][THREAD_ID], created_at=chat.created_at, updated_at=chat.updated_at)
-        for chat
-        in chats]
+        ChatHistory(thread_id=thread.thread_id, created_at=thread.created_at, updated_at=thread.updated_at)
+        for thread
+        in threads]
+
+
+class ChatHistoryPage(BaseModel):
+    threads: List[ChatHistory] = Field(default_factory=list)
+    next_cursor: Optional[str] = None
+
+
+@chat_router.get("/history")
+async def get_conversation_history_page(
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        user_id: str = Depends(JWTBearer())) -> ChatHistoryPage:
+    """ threads most recently active first; pass `next_cursor` back as `cursor` for the next page """
+    try:
+        after = decode_cursor(cursor, 2)
+        after = (datetime.fromisoformat(after[0]), str(after[1])) if after else None
+    except (InvalidCursor, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    threads = await asyncio.to_thread(get_thread_registry().list_threads, user_id, limit + 1, after)
+    page = threads[:limit]
+    next_cursor = encode_cursor(page[-1].updated_at, page[-1].thread_id) if len(threads) > limit else None
+    return ChatHistoryPage(
+        threads=[ChatHistory(thread_id=t.thread_id, created_at=t.created_at, updated_at=t.updated_at) for t in page],
+        next_cursor=next_cursor)
 
 
 class ChatHistoryThread(BaseModel):
@@ -53,21 +79,41 @@ class ChatHistoryThread(BaseModel):
 async def get_user_conversation_thread(
         user_id: str = Depends(JWTBearer()),
         x_thread_id: Optional[str] = Header(..., alias="X-Thread-Id"), ) -> List[ChatHistoryThread]:
-    """ returns thread chat history for a certain user and thread """
-    cfg = GraphRunConfig.from_headers(thread_id=x_thread_id, user_id=user_id)
-    state: StateSnapshot = GRAPH.get_state(cfg.to_runnable())
-    if state is None or not state.values:
-        return []
-    msgs = state.values.get("messages", [])
-    thread_history: List[ChatHistoryThread] = []
-    for msg in msgs:
-        if msg.type == "tool":
-            continue
-        else:
-            thread_history.append(ChatHistoryThread(type=getattr(msg, "type", ""), content=getattr(msg, "content", ""),
-                                                    interaction_id=msg.additional_kwargs.get("interaction_id"),
-                                                    timestamp=msg.additional_kwargs.get("timestamp")))
-    return thread_history
+    """ a user's whole thread history, from the transcript table; 404 for another user's thread """
+    if await asyncio.to_thread(get_thread_registry().owner, x_thread_id) != user_id:
+        raise HTTPException(status_code=404, detail="Thread not found")
+    graph = await get_graph()
+    entries = await read_transcript(x_thread_id, graph.checkpointer.serde, limit=None)
+    return [ChatHistoryThread(type=e.type, content=e.content, interaction_id=e.interaction_id, timestamp=e.timestamp)
+            for e in entries]
+
+
+class ChatTranscriptPage(BaseModel):
+    messages: List[ChatHistoryThread] = Field(default_factory=list)
+    next_cursor: Optional[str] = None
+
+
+@chat_router.get("/transcript")
+async def get_conversation_transcript_page(
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        user_id: str = Depends(JWTBearer()),
+        x_thread_id: str = Header(..., alias="X-Thread-Id")) -> ChatTranscriptPage:
+    """ a thread's messages oldest first, from the transcript table; 404 for another user's thread """
+    try:
+        after = decode_cursor(cursor, 1)
+        after_seq = int(after[0]) if after else None
+    except (InvalidCursor, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if await asyncio.to_thread(get_thread_registry().owner, x_thread_id) != user_id:
+        raise HTTPException(status_code=404, detail="Thread not found")
+    graph = await get_graph()
+    entries = await read_transcript(x_thread_id, graph.checkpointer.serde, limit=limit + 1, after_seq=after_seq)
+    page = entries[:limit]
+    return ChatTranscriptPage(
+        messages=[ChatHistoryThread(type=e.type, content=e.content, interaction_id=e.interaction_id,
+                                    timestamp=e.timestamp) for e in page],
+        next_cursor=encode_cursor(page[-1].seq) if len(entries) > limit else None)
 
 
 class InputData(BaseModel):
@@ -76,27 +122,45 @@ class InputData(BaseModel):
 
 @chat_router.delete("/{thread_id}")
 def delete_thread(thread_id: str, user_id: str = Depends(JWTBearer())):
+    """ deletes one of the user's threads with its checkpoints and transcript; 404 for another user's thread """
+    if get_thread_registry().owner(thread_id) != user_id:
+        raise HTTPException(status_code=404, detail="Thread not found")
     try:
-        CHECKPOINTER.delete_thread(thread_id=thread_id)
-        STORE.delete(namespace=("chat_history", user_id), key=thread_id)
+        report = delete_thread_checkpoints(thread_id, user_id=user_id)
+    except ThreadNotOwned:
+        raise HTTPException(status_code=404, detail="Thread not found")
     except Exception as e:
-        logger.error(e)
-
+        logger.error(f"Could not delete thread {thread_id}: {type(e).__name__}: {e}")
+        raise HTTPException(status_code=500, detail=f"Could not delete thread {thread_id}")
+    logger.info(f"Deleted thread {thread_id}: {report.rows_deleted} rows, {report.bytes_reclaimed} bytes")
     return {"status": "deleted", "thread_id": thread_id}
 
 
 @chat_router.post("/invoke")
 async def invoke(
         data: InputData,
+        request: Request,
         x_thread_id: Optional[str] = Header(None, alias="X-Thread-Id"),
         user_id: str = Depends(JWTBearer()),
 ):
     thread_id = x_thread_id or str(uuid4())  # generate per request if absent
-    cfg = GraphRunConfig.from_headers(thread_id=thread_id, user_id=user_id, interaction_id=uuid.uuid4().__str__())
-    stream = launch_graph(input_message=data.content, config=cfg)
+    if x_thread_id is not None:
+        owner = await asyncio.to_thread(get_thread_registry().owner, x_thread_id)
+        if owner is not None and owner != user_id:  # another user's thread: not found, never continued
+            raise HTTPException(status_code=404, detail="Thread not found")
+    claims = getattr(request.state, "claims", None) or {}
+    router_mode = (claims.get("user_metadata") or {}).get("router_mode")  # per-user routing preference
+    cfg = GraphRunConfig.from_headers(thread_id=thread_id, user_id=user_id, interaction_id=uuid.uuid4().__str__(),
+                                      router_mode=router_mode)
+    ticket = await CHAT_ADMISSION.acquire(user_id)  # 429 / 503 before any work when overloaded
+    if x_thread_id is None and CONFIG.CHAT_COALESCING:
+        # a fresh thread has no history, so an identical question in flight has the same answer
+        stream = launch_shared_graph(input_message=data.content, config=cfg)
+    else:
+        stream = launch_graph(input_message=data.content, config=cfg, is_disconnected=request.is_disconnected)
 
     return StreamingResponse(
-        stream,
+        hold(ticket, stream),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -1,15 +1,19 @@
+import asyncio
 import logging
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi import UploadFile, File
 from pydantic import BaseModel, Field
 
+from rag_app.admission import UPLOAD_ADMISSION
 from rag_app.config import CONFIG
-from rag_app.document.user_document_handler import list_user_documents, UserDocument, delete_user_document
+from rag_app.document.user_document_handler import list_user_documents, UserDocument, delete_user_document, \
+    DocumentPage, list_user_documents_page
 
 logger = logging.getLogger(__name__)
-from rag_app.ingestion.pdf_store import PdfSaverData, pdf_saver
+from rag_app.ingestion.pdf_store import PdfSaverData, get_pdf_saver
+from rag_app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from rag_app.web_api.jwt_resolver import JWTBearer
 
 document_router = APIRouter(prefix="/document")
@@ -33,14 +37,16 @@ async def upload_document(
     if head != b"%PDF-":
         raise HTTPException(status_code=400, detail="File is not a valid PDF")
 
-    try:
-        inp = PdfSaverData(
-            user_id=user_id,
-            file=file,
-            file_name=file.filename)
-        result = pdf_saver.upsert(inp)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ingestion failed: {type(e).__name__}. " + str(e))
+    with await UPLOAD_ADMISSION.acquire(user_id):
+        try:
+            inp = PdfSaverData(
+                user_id=user_id,
+                file=file,
+                file_name=file.filename)
+            # parsing and embedding block for seconds: off the event loop
+            result = await asyncio.to_thread(get_pdf_saver().upsert, inp)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Ingestion failed: {type(e).__name__}. " + str(e))
 
     return {"filename": file.filename, "status": "uploaded", "ingested": result}
 
@@ -49,10 +55,17 @@ async def upload_document(
 def list_my_documents(user_id: str = Depends(JWTBearer())) -> List[UserDocument]:
     return list_user_documents(user_id=user_id)
 
+@document_router.get("/list")
+def list_my_documents_page(
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        user_id: str = Depends(JWTBearer()),
+) -> DocumentPage:
+    """ Documents newest first; pass `next_cursor` back as `cursor` for the next page """
+    return list_user_documents_page(user_id=user_id, limit=limit, cursor=cursor)
+
 @document_router.delete("/{document_id}")
 def delete_document(document_id: str, user_id: str = Depends(JWTBearer())) -> DocumentDeleted:
-    deleted = delete_user_document(user_id=user_id, document_id=document_id)
-    #more than 0 chunks have been deleted
-    if deleted > 0:
-        return DocumentDeleted(document_id=document_id, user_id=user_id, status="deleted")
-    raise HTTPException(status_code=404, detail="Document not found")
+    # hidden at once (404 if unknown); its chunks are removed in the background
+    delete_user_document(user_id=user_id, document_id=document_id)
+    return DocumentDeleted(document_id=document_id, user_id=user_id, status="deleted")
@@ -1,7 +1,10 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager, suppress
 
 import uvicorn
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from rag_app.web_api.admin import admin_router
@@ -9,10 +12,47 @@ from rag_app.web_api.chat_history_web import chat_router
 from rag_app.web_api.documents import document_router
 
 logger = logging.getLogger(__name__)
+from rag_app.agent.graph import cancel_summaries
+from rag_app.backend_pool import close_pools
+from rag_app.checkpoint_retention import CheckpointRetention, RetentionJob
 from rag_app.config import CONFIG
+from rag_app.db_pool import close_pools as close_db_pools
+from rag_app.document.document_purge import get_purge_job
 from rag_app.logging_setup import setup_logging, RequestContextMiddleware, UVICORN_LOG
+from rag_app.startup import READINESS, default_steps, warm_up
+from rag_app.thread_registry import get_thread_registry
+from rag_app.tracing import render_metrics
+from rag_app.web_api.workers import runs_background_jobs, serve_workers
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    retention = RetentionJob(CheckpointRetention.from_config(), CONFIG.CHECKPOINT_RETENTION_INTERVAL_SECONDS)
+    if runs_background_jobs():  # with WEB_WORKERS > 1, only worker 0 sweeps
+        retention.start()
+        get_purge_job().start()
+        get_purge_job().wake()  # finishes purges a previous process left behind
+    if CONFIG.STARTUP_WARMUP:
+        warmup = asyncio.create_task(warm_up(default_steps()))
+    else:
+        warmup = None
+        READINESS.mark_ready()
+    try:
+        yield
+    finally:
+        if warmup is not None:
+            warmup.cancel()
+            with suppress(asyncio.CancelledError):
+                await warmup
+        await cancel_summaries()
+        retention.stop()
+        get_purge_job().stop()
+        get_thread_registry().close()
+        close_pools()
+        await close_db_pools()
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(RequestContextMiddleware)
 app.add_middleware(
     CORSMiddleware,
@@ -26,6 +66,28 @@ app.include_router(document_router, prefix="/api", tags=["document"])
 app.include_router(admin_router, prefix="/api", tags=["admin"])
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics() -> PlainTextResponse:
+    """ Stage latency and prompt size histograms in the Prometheus text format """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/health/live", include_in_schema=False)
+def live() -> dict:
+    return {"status": "ok"}
+
+
+@app.get("/health/ready", include_in_schema=False)
+def ready() -> JSONResponse:
+    """ 503 until the start-up warm-up has built every heavy resource """
+    report = READINESS.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
 def main():
+    CONFIG.pretty_print()
     setup_logging()
-    uvicorn.run(app, host="0.0.0.0", port=8000, log_config=UVICORN_LOG)
+    if CONFIG.WEB_WORKERS > 1:
+        serve_workers(app, host="0.0.0.0", port=8000, workers=CONFIG.WEB_WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000, log_config=UVICORN_LOG)
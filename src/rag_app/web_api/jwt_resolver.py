@@ -1,4 +1,12 @@
+import asyncio
+import hashlib
 import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
 
 import jwt
 from fastapi import HTTPException, Request
@@ -10,29 +18,98 @@ from rag_app.config import CONFIG
 logger = logging.getLogger(__name__)
 
 
+class ClaimsCache:
+    """
+    Claims of already verified tokens, keyed by the SHA-256 of the token and
+    bounded LRU, so the UI polling with one token only pays for its signature
+    once. An entry expires at the token's `exp`, after which the token is
+    decoded again (and rejected as expired); tokens without `exp` are not cached.
+    """
+
+    def __init__(self, max_entries: int, clock: Callable[[], float] = time.time):
+        self._max_entries = max_entries
+        self._clock = clock
+        self._entries: OrderedDict[bytes, Tuple[Mapping[str, Any], float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Mapping[str, Any]]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            claims, expires_at = entry
+            if self._clock() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return claims
+
+    def put(self, token: str, claims: Dict[str, Any]) -> Mapping[str, Any]:
+        """Cache `claims` of the verified `token`; returns them read-only, as `get` would."""
+        frozen = MappingProxyType(claims)
+        expires_at = claims.get("exp")
+        if self._max_entries <= 0 or not isinstance(expires_at, (int, float)):
+            return frozen
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (frozen, float(expires_at))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return frozen
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+CLAIMS_CACHE = ClaimsCache(max_entries=CONFIG.JWT_CLAIMS_CACHE_SIZE)
+
+
+@lru_cache(maxsize=1)
+def get_jwks_client() -> jwt.PyJWKClient:
+    """ Client of JWT_JWKS_URL; it keeps the key set for JWT_JWKS_CACHE_SECONDS and refetches on an unknown `kid` """
+    return jwt.PyJWKClient(CONFIG.JWT_JWKS_URL, cache_keys=True, lifespan=CONFIG.JWT_JWKS_CACHE_SECONDS, timeout=10)
+
+
+def _decode(token: str) -> Dict[str, Any]:
+    # algorithms stays pinned to JWT_ALG in JWKS mode too: the key set never picks the algorithm
+    key = get_jwks_client().get_signing_key_from_jwt(token).key if CONFIG.JWT_JWKS_URL else CONFIG.JWT_SECRET
+    return jwt.decode(token, key, algorithms=[CONFIG.JWT_ALG], audience="authenticated")
+
+
 class JWTBearer(HTTPBearer):
     async def __call__(self, request: Request) -> str:
         creds: HTTPAuthorizationCredentials = await super().__call__(request)
         if not creds or not creds.scheme.lower() == "bearer":
             logger.exception("No bearer token in request headers: %s", dict(request.headers))
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing bearer token")
-        try:
-            claims = jwt.decode(
-                creds.credentials,
-                CONFIG.JWT_SECRET,
-                algorithms=[CONFIG.JWT_ALG],
-                audience="authenticated",  # or whatever you saw above
-            )
-            logger.debug("Decoded claims: %s", claims)
-        except jwt.ExpiredSignatureError as e:
-            logger.exception("Token expired")
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired")
-        except jwt.InvalidTokenError as e:
-            logger.exception("Invalid Token error")
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Invalid token: {e}")
-        except Exception as e:
-            logger.exception("Exception decoding token")
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Invalid token: {e}")
+        claims = CLAIMS_CACHE.get(creds.credentials)
+        if claims is None:
+            try:
+                if CONFIG.JWT_JWKS_URL:
+                    # may fetch the key set: off the event loop
+                    decoded = await asyncio.to_thread(_decode, creds.credentials)
+                else:
+                    decoded = _decode(creds.credentials)
+            except jwt.ExpiredSignatureError as e:
+                logger.exception("Token expired")
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired")
+            except jwt.InvalidTokenError as e:
+                logger.exception("Invalid Token error")
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Invalid token: {e}")
+            except Exception as e:
+                logger.exception("Exception decoding token")
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Invalid token: {e}")
+            claims = CLAIMS_CACHE.put(creds.credentials, decoded)
         # attach claims to request for downstream handlers
         request.state.claims = claims
         return _get_user_id(request)
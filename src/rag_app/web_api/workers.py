@@ -0,0 +1,224 @@
+"""
+Pre-fork multi-worker serving, used by `main()` when WEB_WORKERS > 1.
+
+uvicorn's own `workers` option spawns fresh interpreters, each importing the
+app and loading its own copy of the CrossEncoder. Here the master imports the
+app, loads the read-only models (`preload`), binds the listening socket and
+forks WEB_WORKERS children that all serve it with `uvicorn.Server`. The model
+weights stay in memory pages shared copy-on-write with the master, and
+`gc.freeze()` keeps the collector from writing to (and so copying) the
+objects created before the fork. Everything holding sockets or threads - the
+DB pools, the httpx clients, the background jobs - is built lazily, so inside
+each worker after the fork. The checkpoint retention and document purge
+sweeps only run in worker 0. Every worker publishes its metrics to a
+directory the master creates, so /metrics on any worker serves all of them
+(see `tracing.share_metrics`).
+
+Workers are recycled after WORKER_MAX_REQUESTS requests, plus a random
+jitter so they don't all restart together: uvicorn stops accepting, finishes
+the requests in flight, runs the lifespan shutdown and exits, and the master
+forks a replacement with the same index. SIGHUP recycles every worker, one
+at a time; SIGTERM / SIGINT stop all of them, killing whatever still runs
+after WORKER_GRACEFUL_TIMEOUT_SECONDS.
+"""
+from __future__ import annotations
+
+import gc
+import logging
+import os
+import random
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+from collections import deque
+from contextlib import suppress
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import uvicorn
+
+from rag_app.config import CONFIG
+from rag_app.logging_setup import UVICORN_LOG
+from rag_app.tracing import share_metrics
+
+logger = logging.getLogger(__name__)
+
+# a worker exiting this soon after its fork is respawned only after a pause
+_MIN_UPTIME_SECONDS = 1.0
+# what a stopping worker gets, after the graceful timeout, for the lifespan shutdown
+_LIFESPAN_SHUTDOWN_SECONDS = 5.0
+
+_worker_index: Optional[int] = None
+
+
+def worker_index() -> Optional[int]:
+    """ Index of this worker process; None when the app runs as a single process """
+    return _worker_index
+
+
+def runs_background_jobs() -> bool:
+    """ Whether this process runs the periodic DB sweeps: the single process, or worker 0 """
+    return _worker_index in (None, 0)
+
+
+def preload() -> None:
+    """ Load the read-only models in the master so the workers share them """
+    from rag_app.agent.prompt_builder import get_tokenizer
+    from rag_app.retrieval.pdf_retriever import get_reranker
+
+    start = time.perf_counter()
+    get_reranker()
+    get_tokenizer()
+    logger.info(f"Preloaded models in {time.perf_counter() - start:.2f}s")
+
+
+def bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _limit_torch_threads(workers: int) -> None:
+    """ Split the cores between the workers instead of every worker's torch using all of them """
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+
+
+class WorkerSupervisor:
+    """
+    Forks `workers` children running `target(index)` and keeps that many
+    alive: a child that exits, for any reason, is replaced by a child with
+    the same index unless the supervisor is stopping.
+    """
+
+    def __init__(self, target: Callable[[int], None], workers: int, graceful_timeout: float = 30.0):
+        self._target = target
+        self.workers = max(1, workers)
+        self._graceful_timeout = graceful_timeout
+        self.children: Dict[int, Tuple[int, float]] = {}  # pid -> (index, forked at)
+        self._respawn_at: Dict[int, float] = {}  # index -> when its replacement is due
+        self._recycle: Deque[int] = deque()
+        self._recycling: Optional[int] = None
+        self.stopping = False
+
+    def spawn(self, index: int) -> int:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._target(index)
+            except BaseException:
+                logger.exception(f"Worker {index} failed")
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = (index, time.monotonic())
+        logger.info(f"Started worker {index} (pid {pid})")
+        return pid
+
+    def start(self) -> None:
+        for index in range(self.workers):
+            self.spawn(index)
+
+    def _reap(self) -> List[Tuple[int, int, float]]:
+        exited = []
+        for pid in list(self.children):
+            try:
+                done, status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                done, status = pid, 0
+            if done:
+                index, forked_at = self.children.pop(pid)
+                exited.append((index, os.waitstatus_to_exitcode(status), time.monotonic() - forked_at))
+        return exited
+
+    def tick(self) -> None:
+        """ Reap exited workers, fork their replacements and advance a rolling recycle """
+        now = time.monotonic()
+        for index, code, uptime in self._reap():
+            logger.info(f"Worker {index} exited with code {code} after {uptime:.1f}s")
+            if not self.stopping:
+                crashed = code != 0 and uptime < _MIN_UPTIME_SECONDS
+                self._respawn_at[index] = now + _MIN_UPTIME_SECONDS if crashed else now
+        for index, due in list(self._respawn_at.items()):
+            if due <= now and not self.stopping:
+                del self._respawn_at[index]
+                self.spawn(index)
+        if self._recycling not in self.children and self._recycle:
+            self._recycling = self._recycle.popleft()
+            if self._recycling in self.children:
+                os.kill(self._recycling, signal.SIGTERM)
+
+    def recycle(self) -> None:
+        """ Replace every current worker, one at a time """
+        self._recycle.extend(pid for pid in self.children if pid not in self._recycle)
+
+    def shutdown(self) -> None:
+        self.stopping = True
+        for pid in self.children:
+            with suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self._graceful_timeout + _LIFESPAN_SHUTDOWN_SECONDS
+        while self.children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.05)
+        for pid, (index, _) in list(self.children.items()):
+            logger.warning(f"Worker {index} (pid {pid}) did not stop in {self._graceful_timeout}s, killing it")
+            with suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGKILL)
+        while self.children:
+            self._reap()
+            time.sleep(0.05)
+
+    def run(self, poll_seconds: float = 0.5) -> None:
+        def stop(signum, frame):
+            self.stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGHUP, lambda signum, frame: self.recycle())
+        self.start()
+        while not self.stopping:
+            self.tick()
+            time.sleep(poll_seconds)
+        self.shutdown()
+
+
+def serve_workers(app, host: str, port: int, workers: int) -> None:
+    """ Preload, bind, fork `workers` uvicorn servers on the shared socket and supervise them """
+    preload()
+    sock = bind(host, port)
+    metrics_dir = tempfile.mkdtemp(prefix="rag-metrics-")
+
+    def serve(index: int) -> None:
+        global _worker_index
+        _worker_index = index
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(signum, signal.SIG_DFL)  # uvicorn installs its own for TERM / INT
+        random.seed()
+        _limit_torch_threads(workers)
+        share_metrics(metrics_dir, index)
+        limit = CONFIG.WORKER_MAX_REQUESTS
+        if limit > 0:
+            limit += random.randint(0, max(0, CONFIG.WORKER_MAX_REQUESTS_JITTER))
+        config = uvicorn.Config(app, host=host, port=port, log_config=UVICORN_LOG,
+                                limit_max_requests=limit or None,
+                                timeout_graceful_shutdown=CONFIG.WORKER_GRACEFUL_TIMEOUT_SECONDS)
+        uvicorn.Server(config).run(sockets=[sock])
+
+    # objects alive now are shared with every worker: keep the collector off their pages
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Serving on {host}:{port} with {workers} workers (pid {os.getpid()})")
+    supervisor = WorkerSupervisor(serve, workers, CONFIG.WORKER_GRACEFUL_TIMEOUT_SECONDS)
+    try:
+        supervisor.run()
+    finally:
+        sock.close()
+        shutil.rmtree(metrics_dir, ignore_errors=True)
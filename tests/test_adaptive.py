@@ -0,0 +1,36 @@
+"""Tests for retrieval/adaptive.py — early-exit and staged re-ranking decisions."""
+import numpy as np
+
+from rag_app.retrieval.adaptive import similarity_gap, is_confident_without_rerank, is_ambiguous
+
+
+class TestSimilarityGap:
+    def test_gap_between_best_two(self):
+        assert abs(similarity_gap(np.array([0.5, 0.9, 0.6])) - 0.3) < 1e-6
+
+    def test_single_hit_has_no_gap(self):
+        assert similarity_gap(np.array([0.9])) is None
+
+
+class TestConfidentWithoutRerank:
+    def test_clear_winner(self):
+        assert is_confident_without_rerank(similarity_gap(np.array([0.95, 0.6, 0.55])), gap_threshold=0.2)
+
+    def test_close_race(self):
+        assert not is_confident_without_rerank(similarity_gap(np.array([0.81, 0.8, 0.79])), gap_threshold=0.2)
+
+    def test_single_hit_never_skips(self):
+        assert not is_confident_without_rerank(similarity_gap(np.array([0.99])), gap_threshold=0.1)
+
+
+class TestIsAmbiguous:
+    def test_separated_stage_is_confident(self):
+        scores = np.array([8.0, 7.5, 7.0, -4.0, -5.0])
+        assert not is_ambiguous(scores, top_n=3, margin=3.0)
+
+    def test_flat_stage_is_ambiguous(self):
+        scores = np.array([1.0, 0.9, 0.8, 0.7, 0.6])
+        assert is_ambiguous(scores, top_n=3, margin=3.0)
+
+    def test_stage_not_larger_than_top_n_is_ambiguous(self):
+        assert is_ambiguous(np.array([9.0, 8.0, 7.0]), top_n=3, margin=0.0)
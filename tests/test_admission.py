@@ -0,0 +1,165 @@
+"""Tests for admission.py — per-user / global limits, the wait queue and the chat endpoint's 429."""
+import asyncio
+import gc
+import time
+from types import SimpleNamespace
+
+import jwt
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from rag_app import admission
+from rag_app.admission import AdmissionController, Rejected, hold
+from rag_app.config import CONFIG
+from rag_app.web_api import chat_history_web
+
+
+def _controller(**kwargs):
+    settings = {"max_active": 2, "max_per_user": 0, "max_queue": 2, "queue_timeout": 1.0, "retry_after": 2.5}
+    return AdmissionController("test", **{**settings, **kwargs})
+
+
+class TestAdmissionController:
+    async def test_per_user_limit_is_429(self):
+        controller = _controller(max_per_user=1)
+        ticket = await controller.acquire("u1")
+        with pytest.raises(Rejected) as rejected:
+            await controller.acquire("u1")
+        assert rejected.value.status_code == 429
+        assert rejected.value.headers == {"Retry-After": "3"}
+        assert (await controller.acquire("u2")) is not None  # other users are unaffected
+        ticket.release()
+        assert (await controller.acquire("u1")) is not None
+        assert controller.rejected["user_limit"] == 1
+
+    async def test_queued_requests_get_freed_slots_in_order(self):
+        controller = _controller(max_active=1)
+        first = await controller.acquire("a")
+        order = []
+
+        async def waiter(user):
+            ticket = await controller.acquire(user)
+            order.append(user)
+            return ticket
+
+        tasks = [asyncio.create_task(waiter(user)) for user in ("b", "c")]
+        await asyncio.sleep(0)
+        assert controller.queued == 2
+        first.release()
+        second = await tasks[0]
+        assert order == ["b"] and controller.active == 1
+        second.release()
+        (await tasks[1]).release()
+        assert order == ["b", "c"]
+        assert controller.active == 0 and controller.queued == 0 and controller._per_user == {}
+
+    async def test_full_queue_is_503(self):
+        controller = _controller(max_active=1, max_queue=0)
+        ticket = await controller.acquire("a")
+        with pytest.raises(Rejected) as rejected:
+            await controller.acquire("b")
+        assert rejected.value.status_code == 503
+        assert controller.rejected["queue_full"] == 1
+        ticket.release()
+
+    async def test_queue_deadline_is_503(self):
+        controller = _controller(max_active=1, queue_timeout=0.05)
+        ticket = await controller.acquire("a")
+        with pytest.raises(Rejected) as rejected:
+            await controller.acquire("b")
+        assert rejected.value.status_code == 503
+        assert controller.queued == 0 and "b" not in controller._per_user
+        ticket.release()
+        assert controller.active == 0
+
+    async def test_cancelled_waiter_leaves_the_queue(self):
+        controller = _controller(max_active=1)
+        ticket = await controller.acquire("a")
+        task = asyncio.create_task(controller.acquire("b"))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert controller.queued == 0
+        ticket.release()
+        assert controller.active == 0
+
+    async def test_dropped_ticket_returns_its_slot(self):
+        controller = _controller(max_active=1)
+        await controller.acquire("a")  # never released explicitly
+        gc.collect()
+        assert controller.active == 0
+
+    async def test_release_is_idempotent(self):
+        controller = _controller()
+        ticket = await controller.acquire("a")
+        ticket.release()
+        ticket.release()
+        assert controller.active == 0
+
+
+class TestHold:
+    async def test_slot_held_until_the_stream_ends(self):
+        controller = _controller()
+        ticket = await controller.acquire("a")
+
+        async def stream():
+            yield "x"
+            assert controller.active == 1
+            yield "y"
+
+        assert [chunk async for chunk in hold(ticket, stream())] == ["x", "y"]
+        assert controller.active == 0
+
+    async def test_closing_releases_and_closes_the_inner_stream(self):
+        controller = _controller()
+        ticket = await controller.acquire("a")
+        closed = []
+
+        async def stream():
+            try:
+                yield "x"
+                yield "y"
+            finally:
+                closed.append(True)
+
+        held = hold(ticket, stream())
+        assert await held.__anext__() == "x"
+        await held.aclose()
+        assert closed == [True] and controller.active == 0
+
+
+class TestMetrics:
+    def test_render(self):
+        lines = list(admission._render_admission_metrics())
+        assert "# TYPE rag_admission_queued gauge" in lines
+        assert f'rag_admission_limit{{endpoint="chat"}} {CONFIG.CHAT_MAX_CONCURRENCY}' in lines
+        assert 'rag_admission_rejected_total{endpoint="upload",reason="queue_full"} 0' in lines
+
+
+class TestChatEndpoint:
+    async def test_user_over_limit_gets_429_with_retry_after(self, monkeypatch):
+        controller = _controller(max_per_user=1)
+        monkeypatch.setattr(chat_history_web, "CHAT_ADMISSION", controller)
+
+        async def launch_graph(input_message, config, is_disconnected=None):
+            yield f"data: {input_message}\n\n"
+
+        monkeypatch.setattr(chat_history_web, "launch_graph", launch_graph)
+        monkeypatch.setattr(chat_history_web, "get_thread_registry", lambda: SimpleNamespace(owner=lambda t: None))
+        app = FastAPI()
+        app.include_router(chat_history_web.chat_router, prefix="/api")
+        now = int(time.time())
+        token = jwt.encode({"sub": "user-1", "aud": "authenticated", "exp": now + 3600}, CONFIG.JWT_SECRET,
+                           algorithm=CONFIG.JWT_ALG)
+        headers = {"Authorization": f"Bearer {token}", "X-Thread-Id": "t1"}
+
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            busy = await controller.acquire("user-1")
+            resp = await ac.post("/api/chat/invoke", json={"content": "hi"}, headers=headers)
+            assert resp.status_code == 429 and resp.headers["Retry-After"] == "3"
+            busy.release()
+            resp = await ac.post("/api/chat/invoke", json={"content": "hi"}, headers=headers)
+            assert resp.status_code == 200 and resp.text == "data: hi\n\n"
+        assert controller.active == 0
@@ -0,0 +1,47 @@
+"""Tests for agent/agent_state.py — the enriching messages reducer."""
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage
+
+from rag_app.agent.agent_state import add_enriched_messages, INTERACTION_ID, TIMESTAMP
+from rag_app.evaluation.checkpoint_benchmark import run_thread
+
+
+class TestAddEnrichedMessages:
+    def test_new_messages_inherit_turn_interaction_id(self):
+        history = [HumanMessage("q", id="h1", additional_kwargs={INTERACTION_ID: "i1", TIMESTAMP: "t0"})]
+        merged = add_enriched_messages(history, [AIMessage("a", id="a1")])
+        assert merged[-1].additional_kwargs[INTERACTION_ID] == "i1"
+        assert TIMESTAMP in merged[-1].additional_kwargs
+
+    def test_existing_metadata_kept(self):
+        human = HumanMessage("q", additional_kwargs={INTERACTION_ID: "i2", TIMESTAMP: "t0"})
+        merged = add_enriched_messages([], [human])
+        assert merged[0].additional_kwargs == {INTERACTION_ID: "i2", TIMESTAMP: "t0"}
+
+    def test_interaction_id_from_latest_human(self):
+        history = [HumanMessage("old", id="h1", additional_kwargs={INTERACTION_ID: "i1"}),
+                   AIMessage("a", id="a1"),
+                   HumanMessage("new", id="h2", additional_kwargs={INTERACTION_ID: "i2"})]
+        merged = add_enriched_messages(history, AIMessage("b", id="a2"))
+        assert merged[-1].additional_kwargs[INTERACTION_ID] == "i2"
+
+    def test_history_not_mutated(self):
+        history = [HumanMessage("q", id="h1")]
+        add_enriched_messages(history, [AIMessage("a", id="a1")])
+        assert len(history) == 1
+
+    def test_remove_message(self):
+        merged = add_enriched_messages([HumanMessage("q", id="h1")], [RemoveMessage(id="h1")])
+        assert merged == []
+
+
+class TestCheckpointBenchmark:
+    async def test_delta_writes_less_than_full(self):
+        full = await run_thread("full", "async", turns=5, doc_chars=500)
+        delta = await run_thread("delta", "async", turns=5, doc_chars=500)
+        assert delta["total_bytes"] < full["total_bytes"]
+
+    async def test_exit_durability_writes_once_per_turn(self):
+        per_step = await run_thread("delta", "async", turns=5, doc_chars=500)
+        at_exit = await run_thread("delta", "exit", turns=5, doc_chars=500)
+        assert at_exit["total_bytes"] < per_step["total_bytes"]
+        assert len(at_exit["bytes_per_turn"]) == 5
@@ -0,0 +1,209 @@
+"""Tests for backend_pool.py — routing, ejection and health checks against local stub servers."""
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+from langchain_ollama import OllamaEmbeddings
+
+from rag_app.backend_pool import AsyncPoolTransport, BackendPool, PoolTransport, client_kwargs
+
+
+class StubServer:
+    """Ollama-like server: /api/version health, /api/embed and a configurable status for everything."""
+
+    def __init__(self, status=200):
+        self.status = status
+        self.paths = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, body):
+                stub.paths.append(self.path)
+                payload = json.dumps(body).encode()
+                self.send_response(stub.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._reply({"version": "stub"})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                self._reply({"model": "test-embed", "embeddings": [[0.1, 0.2, 0.3]]})
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _dead_url():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}"
+
+
+@pytest.fixture
+def servers():
+    started = [StubServer(), StubServer()]
+    yield started
+    for server in started:
+        server.close()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def _pool(urls, **kwargs):
+    kwargs.setdefault("health_interval", 0)
+    return BackendPool(urls, **kwargs)
+
+
+class TestRouting:
+    def test_least_outstanding(self):
+        pool = _pool(["http://a", "http://b"])
+        first = pool.acquire()
+        second = pool.acquire()
+        assert {first.url, second.url} == {"http://a", "http://b"}
+        pool.release(first, 0.01, True)
+        assert pool.acquire() is first
+
+    def test_idle_backends_take_turns(self):
+        pool = _pool(["http://a", "http://b", "http://c"])
+        picked = []
+        for _ in range(6):
+            backend = pool.acquire()
+            picked.append(backend.url)
+            pool.release(backend, 0.01, True)
+        assert picked.count("http://a") == picked.count("http://b") == picked.count("http://c") == 2
+
+    def test_exclude_whole_pool(self):
+        pool = _pool(["http://a"])
+        assert pool.acquire(exclude=pool.backends) is None
+
+    def test_latency_average(self):
+        pool = _pool(["http://a"])
+        backend = pool.acquire()
+        pool.release(backend, 0.1, True)
+        assert pool.stats()[0]["latency_ms"] == 100.0
+        pool.release(pool.acquire(), 0.2, True)
+        assert 100.0 < pool.stats()[0]["latency_ms"] < 200.0
+
+
+class TestEjection:
+    def test_ejected_after_consecutive_failures(self):
+        clock = FakeClock()
+        pool = _pool(["http://a", "http://b"], eject_after=2, eject_seconds=30, clock=clock)
+        a = pool.backends[0]
+        for _ in range(2):
+            pool.release(pool.acquire(exclude=[pool.backends[1]]), 0.01, False, "HTTP 500")
+        assert pool.stats()[0]["healthy"] is False
+        assert all(pool.acquire() is not a for _ in range(3))
+        clock.now += 31
+        assert pool.stats()[0]["healthy"] is True
+
+    def test_success_resets_failures(self):
+        pool = _pool(["http://a"], eject_after=2)
+        pool.release(pool.acquire(), 0.01, False)
+        pool.release(pool.acquire(), 0.01, True)
+        pool.release(pool.acquire(), 0.01, False)
+        assert pool.stats()[0]["healthy"] is True
+        assert pool.stats()[0]["failures"] == 2
+
+    def test_all_ejected_still_serves(self):
+        pool = _pool(["http://a"], eject_after=1)
+        pool.release(pool.acquire(), 0.01, False)
+        assert pool.acquire() is pool.backends[0]
+
+
+class TestHealthChecks:
+    def test_check_readmits(self, servers):
+        pool = _pool([servers[0].url], eject_after=1)
+        pool.release(pool.acquire(), 0.01, False)
+        assert pool.check_all() == {servers[0].url: True}
+        assert pool.stats()[0]["healthy"] is True
+        assert servers[0].paths == ["/api/version"]
+
+    def test_check_ejects_dead_backend(self, servers):
+        dead = _dead_url()
+        pool = _pool([servers[0].url, dead], eject_after=1)
+        assert pool.check_all() == {servers[0].url: True, dead: False}
+        assert [s["healthy"] for s in pool.stats()] == [True, False]
+
+    def test_background_checks(self, servers):
+        servers[0].status = 503
+        pool = BackendPool([servers[0].url], eject_after=1, health_interval=0.05)
+        pool.acquire()
+        try:
+            for _ in range(100):
+                if not pool.stats()[0]["healthy"]:
+                    break
+                threading.Event().wait(0.02)
+            assert pool.stats()[0]["last_error"] == "health check returned 503"
+        finally:
+            pool.close()
+
+
+class TestTransports:
+    def test_spreads_requests(self, servers):
+        pool = _pool([s.url for s in servers])
+        with httpx.Client(base_url="http://ignored:1", transport=PoolTransport(pool)) as client:
+            for _ in range(4):
+                assert client.get("/api/tags").status_code == 200
+        assert [len(s.paths) for s in servers] == [2, 2]
+        assert all(s["outstanding"] == 0 and s["latency_ms"] is not None for s in pool.stats())
+
+    def test_connect_error_retried_on_next_backend(self, servers):
+        dead = _dead_url()
+        pool = _pool([dead, servers[0].url], eject_after=1)
+        with httpx.Client(transport=PoolTransport(pool)) as client:
+            assert client.get(f"{dead}/api/tags").status_code == 200
+        stats = {s["url"]: s for s in pool.stats()}
+        assert stats[dead]["healthy"] is False
+        assert stats[servers[0].url]["requests"] == 1
+
+    def test_server_error_counts_as_failure(self, servers):
+        servers[0].status = 500
+        pool = _pool([servers[0].url], eject_after=5)
+        with httpx.Client(transport=PoolTransport(pool)) as client:
+            assert client.get(f"{servers[0].url}/api/tags").status_code == 500
+        assert pool.stats()[0]["failures"] == 1
+        assert pool.stats()[0]["last_error"] == "HTTP 500"
+
+    async def test_async_transport(self, servers):
+        pool = _pool([s.url for s in servers])
+        async with httpx.AsyncClient(base_url="http://ignored:1", transport=AsyncPoolTransport(pool)) as client:
+            for _ in range(4):
+                assert (await client.post("/api/embed", json={})).status_code == 200
+        assert [len(s.paths) for s in servers] == [2, 2]
+        assert all(s["outstanding"] == 0 for s in pool.stats())
+
+    def test_backend_path_prefix(self, servers):
+        pool = _pool([servers[0].url + "/ollama"])
+        with httpx.Client(transport=PoolTransport(pool)) as client:
+            client.get("http://ignored:1/api/tags")
+        assert servers[0].paths == ["/ollama/api/tags"]
+
+    def test_embeddings_through_pool(self, servers):
+        pool = _pool([s.url for s in servers])
+        embeddings = OllamaEmbeddings(model="test-embed", base_url=pool.urls[0], **client_kwargs(pool))
+        assert embeddings.embed_documents(["a"]) == [[0.1, 0.2, 0.3]]
+        assert embeddings.embed_query("c") == [0.1, 0.2, 0.3]
+        assert sum(s["requests"] for s in pool.stats()) == 2
+        assert all(len(s.paths) == 1 for s in servers)
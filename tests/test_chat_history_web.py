@@ -0,0 +1,90 @@
+"""Tests for web_api/chat_history_web.py — thread ownership on the chat endpoints (registry and DB faked)."""
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import jwt
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from rag_app.checkpoint_retention import RetentionReport
+from rag_app.config import CONFIG
+from rag_app.transcript import TranscriptEntry
+from rag_app.web_api import chat_history_web
+
+
+class FakeRegistry:
+    def __init__(self, owners):
+        self.owners = owners
+
+    def owner(self, thread_id):
+        return self.owners.get(thread_id)
+
+
+def _headers(user_id: str, thread_id: str) -> dict:
+    token = jwt.encode({"sub": user_id, "aud": "authenticated", "exp": int(time.time()) + 3600}, CONFIG.JWT_SECRET,
+                       algorithm=CONFIG.JWT_ALG)
+    return {"Authorization": f"Bearer {token}", "X-Thread-Id": thread_id}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(chat_history_web, "get_thread_registry", lambda: FakeRegistry({"t1": "owner"}))
+
+    async def get_graph():
+        return SimpleNamespace(checkpointer=SimpleNamespace(serde=None))
+
+    async def read_transcript(thread_id, serde, limit=None, after_seq=None):
+        return [TranscriptEntry(seq=1, type="human", content="secret", interaction_id="i1",
+                                timestamp=datetime(2024, 1, 1, tzinfo=timezone.utc))]
+
+    monkeypatch.setattr(chat_history_web, "get_graph", get_graph)
+    monkeypatch.setattr(chat_history_web, "read_transcript", read_transcript)
+    app = FastAPI()
+    app.include_router(chat_history_web.chat_router, prefix="/api")
+    return AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
+
+
+class TestThreadOwnership:
+    @pytest.mark.parametrize("path", ["/api/chat/get_user_conversation_thread", "/api/chat/transcript"])
+    async def test_another_users_thread_is_not_found(self, client, path):
+        async with client as ac:
+            resp = await ac.get(path, headers=_headers("intruder", "t1"))
+            assert resp.status_code == 404
+            resp = await ac.get(path, headers=_headers("owner", "t1"))
+            assert resp.status_code == 200 and "secret" in resp.text
+
+
+class TestDeleteThread:
+    async def test_another_users_thread_is_not_found(self, client, monkeypatch):
+        deleted = []
+        monkeypatch.setattr(chat_history_web, "delete_thread_checkpoints",
+                            lambda thread_id, user_id: deleted.append(thread_id) or RetentionReport())
+        async with client as ac:
+            resp = await ac.delete("/api/chat/t1", headers=_headers("intruder", "t1"))
+            assert resp.status_code == 404 and deleted == []
+            resp = await ac.delete("/api/chat/t1", headers=_headers("owner", "t1"))
+            assert resp.status_code == 200 and deleted == ["t1"]
+
+    async def test_failed_delete_is_500(self, client, monkeypatch):
+        def broken(thread_id, user_id):
+            raise ConnectionError("db down")
+
+        monkeypatch.setattr(chat_history_web, "delete_thread_checkpoints", broken)
+        async with client as ac:
+            resp = await ac.delete("/api/chat/t1", headers=_headers("owner", "t1"))
+        assert resp.status_code == 500
+
+
+class TestInvoke:
+    async def test_another_users_thread_is_not_continued(self, client, monkeypatch):
+        async def launch_graph(input_message, config, is_disconnected=None):
+            yield f"data: {config.user_id}\n\n"
+
+        monkeypatch.setattr(chat_history_web, "launch_graph", launch_graph)
+        async with client as ac:
+            resp = await ac.post("/api/chat/invoke", json={"content": "hi"}, headers=_headers("intruder", "t1"))
+            assert resp.status_code == 404
+            resp = await ac.post("/api/chat/invoke", json={"content": "hi"}, headers=_headers("owner", "t1"))
+            assert resp.status_code == 200 and resp.text == "data: owner\n\n"
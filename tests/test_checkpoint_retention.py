@@ -0,0 +1,158 @@
+"""Tests for checkpoint_retention.py — batching, throttling and reporting (DB faked)."""
+import pytest
+
+from rag_app import checkpoint_retention, transcript
+from rag_app.checkpoint_retention import (CheckpointRetention, RetentionReport, RetentionJob, ThreadNotOwned,
+                                         delete_thread)
+
+
+class FakeRegistry:
+    def __init__(self):
+        self.forgotten = []
+
+    def setup(self):
+        pass
+
+    def forget(self, thread_id):
+        self.forgotten.append(thread_id)
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    fake = FakeRegistry()
+    monkeypatch.setattr(checkpoint_retention, "get_thread_registry", lambda: fake)
+    monkeypatch.setattr(transcript, "setup", lambda: None)
+    return fake
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self._db = db
+        self._last = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        self._db.executed.append((sql, params))
+        self._last = sql
+
+    def fetchall(self):
+        key = "idle" if "timestamptz" in self._last else "over_limit"
+        batches = self._db.selects[key]
+        return [(t,) for t in (batches.pop(0) if batches else [])]
+
+    def fetchone(self):
+        if "SELECT user_id FROM chat_threads" in self._last:
+            return (self._db.owner,) if self._db.owner else None
+        return 2, 100
+
+
+class FakeDB:
+    def __init__(self, idle=None, over_limit=None, owner="u1"):
+        self.owner = owner
+        self.selects = {"idle": idle or [], "over_limit": over_limit or []}
+        self.executed = []
+        self.connections = 0
+
+    def connect(self):
+        db = self
+        db.connections += 1
+
+        class Conn:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def cursor(self):
+                return FakeCursor(db)
+
+        return Conn()
+
+
+class TestCheckpointRetention:
+    def test_compaction_in_batches_with_pauses(self):
+        db = FakeDB(over_limit=[["t1", "t2"], ["t3"]])
+        pauses = []
+        retention = CheckpointRetention(keep_last=3, ttl_days=0, batch_size=2, pause_seconds=0.25,
+                                        connect=db.connect, sleep=pauses.append)
+        report = retention.run_once()
+        assert report.threads_compacted == 3
+        assert report.checkpoints_deleted == 4 and report.writes_deleted == 4 and report.blobs_deleted == 4
+        assert report.bytes_reclaimed == 600
+        assert pauses == [0.25]
+        assert db.connections == 2
+
+    def test_ttl_expires_whole_threads(self, registry):
+        db = FakeDB(idle=[["old"]])
+        report = CheckpointRetention(keep_last=3, ttl_days=30, connect=db.connect, sleep=lambda s: None).run_once()
+        assert report.threads_expired == 1
+        assert report.history_entries_deleted == 4  # registry + legacy store
+        assert registry.forgotten == ["old"]
+        assert any(params.get("ttl_days") == 30 for _, params in db.executed)
+
+    def test_ttl_pass_drops_old_thread_tombstones(self):
+        db = FakeDB()
+        CheckpointRetention(keep_last=3, ttl_days=30, connect=db.connect, sleep=lambda s: None).run_once()
+        assert any("DELETE FROM chat_threads" in sql and params == {"days": checkpoint_retention._THREAD_TOMBSTONE_DAYS}
+                   for sql, params in db.executed)
+
+    def test_ttl_disabled(self):
+        db = FakeDB(idle=[["old"]])
+        report = CheckpointRetention(keep_last=3, ttl_days=0, connect=db.connect).run_once()
+        assert report.threads_expired == 0
+
+    def test_stop_between_batches(self):
+        db = FakeDB(over_limit=[["t1"], ["t2"]])
+        retention = CheckpointRetention(keep_last=1, ttl_days=0, batch_size=1, connect=db.connect, sleep=lambda s: None)
+        assert retention.run_once(should_stop=lambda: True).threads_compacted == 0
+
+    def test_errors_are_reported(self):
+        def broken():
+            raise ConnectionError("db down")
+        report = CheckpointRetention(keep_last=1, ttl_days=7, connect=broken).run_once()
+        assert len(report.errors) == 2
+
+
+class TestDeleteThread:
+    def test_scoped_to_user_history(self):
+        db = FakeDB()
+        report = delete_thread("t1", user_id="u1", connect=db.connect)
+        assert report.rows_deleted == 12
+        assert report.transcript_entries_deleted == 2
+        assert any(params.get("history_prefix") == "chat_history.u1" and params.get("user_id") == "u1"
+                   for _, params in db.executed)
+
+    @pytest.mark.parametrize("owner", ["someone-else", None])
+    def test_thread_not_owned_deletes_nothing(self, owner, registry):
+        db = FakeDB(owner=owner)
+        with pytest.raises(ThreadNotOwned):
+            delete_thread("t1", user_id="u1", connect=db.connect)
+        assert len(db.executed) == 1  # only the owner lookup
+        assert registry.forgotten == []
+
+    def test_registry_row_is_tombstoned_not_deleted(self):
+        db = FakeDB()
+        delete_thread("t1", user_id="u1", connect=db.connect)
+        registry_sql = [sql for sql, _ in db.executed if "chat_threads" in sql and "SELECT user_id" not in sql]
+        assert len(registry_sql) == 1 and "SET deleted_at = now()" in registry_sql[0]
+
+
+class TestRetentionReport:
+    def test_merge(self):
+        total = RetentionReport(checkpoints_deleted=1, bytes_reclaimed=10)
+        total.merge(RetentionReport(checkpoints_deleted=2, bytes_reclaimed=5, errors=["x"]))
+        assert (total.checkpoints_deleted, total.bytes_reclaimed, total.errors) == (3, 15, ["x"])
+
+
+class TestRetentionJob:
+    def test_disabled_interval_never_starts(self):
+        job = RetentionJob(CheckpointRetention(keep_last=1, ttl_days=0, connect=FakeDB().connect), 0)
+        job.start()
+        assert job._thread is None
+        job.stop()
@@ -28,6 +28,37 @@ class TestIntEnv:
             _int_env("TEST_INT_BAD")
 
 
+    def test_missing_uses_default(self, monkeypatch):
+        from rag_app.config import _int_env
+        monkeypatch.delenv("TEST_INT_MISSING", raising=False)
+        assert _int_env("TEST_INT_MISSING", 7) == 7
+
+
+class TestBoolEnv:
+    def test_true_values(self, monkeypatch):
+        from rag_app.config import _bool_env
+        for v in ("1", "true", "Yes", "ON"):
+            monkeypatch.setenv("TEST_BOOL", v)
+            assert _bool_env("TEST_BOOL", False) is True
+
+    def test_false_values(self, monkeypatch):
+        from rag_app.config import _bool_env
+        for v in ("0", "false", "No", "off"):
+            monkeypatch.setenv("TEST_BOOL", v)
+            assert _bool_env("TEST_BOOL", True) is False
+
+    def test_missing_uses_default(self, monkeypatch):
+        from rag_app.config import _bool_env
+        monkeypatch.delenv("TEST_BOOL_MISSING", raising=False)
+        assert _bool_env("TEST_BOOL_MISSING", True) is True
+
+    def test_invalid_raises(self, monkeypatch):
+        from rag_app.config import _bool_env
+        monkeypatch.setenv("TEST_BOOL_BAD", "maybe")
+        with pytest.raises(ValueError, match="must be a boolean"):
+            _bool_env("TEST_BOOL_BAD", False)
+
+
 class TestJsonListEnv:
     def test_valid_list(self, monkeypatch):
         from rag_app.config import _json_list_env
@@ -73,6 +104,10 @@ class TestAppConfig:
         assert "DB_HOST" in d
         assert "CHUNK_SIZE" in d
 
+    def test_checkpoints_survive_a_cut_short_turn_by_default(self):
+        from rag_app.config import CONFIG
+        assert CONFIG.CHECKPOINT_DURABILITY == "async"
+
     def test_postgres_connection_string(self):
         from rag_app.config import get_postgres_connection_string, CONFIG
         conn = get_postgres_connection_string()
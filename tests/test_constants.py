@@ -6,6 +6,8 @@ from rag_app.ingestion.constants import (
     FILE_NAME_KEY,
     PAGE_KEY,
     INGESTED_AT_KEY,
+    CHUNK_ORDINAL_KEY,
+    SECTION_ID_KEY,
 )
 
 
@@ -16,8 +18,10 @@ def test_constant_values():
     assert FILE_NAME_KEY == "file_name"
     assert PAGE_KEY == "page"
     assert INGESTED_AT_KEY == "ingested_at"
+    assert CHUNK_ORDINAL_KEY == "chunk_ordinal"
+    assert SECTION_ID_KEY == "section_id"
 
 
 def test_constants_are_strings():
-    for c in [USER_ID_KEY, INTERACTION_ID_KEY, DOC_ID_KEY, FILE_NAME_KEY, PAGE_KEY, INGESTED_AT_KEY]:
+    for c in [USER_ID_KEY, INTERACTION_ID_KEY, DOC_ID_KEY, FILE_NAME_KEY, PAGE_KEY, INGESTED_AT_KEY, CHUNK_ORDINAL_KEY, SECTION_ID_KEY]:
         assert isinstance(c, str)
@@ -0,0 +1,49 @@
+"""Tests for db_pool.py — pool sizing from CONFIG and pool metrics (no database needed)."""
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+
+from rag_app import db_pool
+from rag_app.config import CONFIG
+from rag_app.tracing import render_metrics
+
+
+class TestSettings:
+    def test_sized_from_config(self):
+        settings = db_pool._pool_settings()
+        assert settings["min_size"] == CONFIG.DB_POOL_MIN_SIZE == 2
+        assert settings["max_size"] == CONFIG.DB_POOL_MAX_SIZE == 10
+        assert settings["max_lifetime"] == CONFIG.DB_POOL_MAX_LIFETIME_SECONDS
+        assert settings["kwargs"] == {"autocommit": True, "prepare_threshold": 0}
+
+
+class TestMetrics:
+    def setup_method(self):
+        self._saved = db_pool._POOL, db_pool._ASYNC_POOL
+
+    def teardown_method(self):
+        db_pool._POOL, db_pool._ASYNC_POOL = self._saved
+
+    def test_no_pool_no_lines(self):
+        db_pool._POOL = db_pool._ASYNC_POOL = None
+        assert db_pool.pool_stats() == {}
+        assert list(db_pool._render_pool_metrics()) == []
+
+    async def test_gauges_per_pool(self):
+        db_pool._POOL = ConnectionPool("", name="sync", min_size=1, max_size=4, open=False)
+        db_pool._ASYNC_POOL = AsyncConnectionPool("", name="async", min_size=1, max_size=8, open=False)
+        text = render_metrics()
+        assert "# TYPE rag_db_pool_max gauge" in text
+        assert 'rag_db_pool_max{pool="sync"} 4' in text
+        assert 'rag_db_pool_max{pool="async"} 8' in text
+
+    def test_counters_are_totals(self):
+        class FakePool:
+            name = "sync"
+
+            def get_stats(self):
+                return {"pool_size": 3, "requests_num": 12}
+
+        db_pool._POOL, db_pool._ASYNC_POOL = FakePool(), None
+        lines = list(db_pool._render_pool_metrics())
+        assert "# TYPE rag_db_requests_num_total counter" in lines
+        assert 'rag_db_requests_num_total{pool="sync"} 12' in lines
+        assert 'rag_db_pool_size{pool="sync"} 3' in lines
@@ -0,0 +1,166 @@
+"""Tests for document/document_purge.py — batched chunk removal and the purge job (DB faked)."""
+import threading
+
+import pytest
+
+from rag_app.document import document_purge, document_registry
+from rag_app.document.document_purge import DocumentPurgeJob, DocumentPurger, PurgeReport
+
+
+@pytest.fixture(autouse=True)
+def registry_ready(monkeypatch):
+    monkeypatch.setattr(document_registry, "setup", lambda conn=None: None)
+
+
+class FakeDB:
+    """Documents marked deleted with their remaining chunk counts, and those locked by other transactions."""
+
+    def __init__(self, chunks, locked=None):
+        self.chunks = dict(chunks)
+        self.locked = dict(locked or {})
+        self.forgotten = []
+        self.advisory_locks = []
+        self.transactions = 0
+
+    def connect(self):
+        db = self
+        db.transactions += 1
+
+        class Result:
+            def __init__(self, row):
+                self.row = row
+                self.rowcount = 1
+
+            def fetchone(self):
+                return self.row
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params):
+                self.rows = [("c", "u1", doc) for doc in db.chunks][:params["limit"]]
+
+            def fetchall(self):
+                return self.rows
+
+        class Conn:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def cursor(self):
+                return Cursor()
+
+            def execute(self, sql, params):
+                doc = params["document_id"]
+                if "pg_advisory_xact_lock" in sql:
+                    db.advisory_locks.append(doc)
+                    return Result(None)
+                if "DELETE FROM documents" in sql:
+                    result = Result(None)
+                    if db.locked.get(doc):
+                        result.rowcount = 0  # NOT EXISTS sees the chunks the delete skipped
+                        return result
+                    db.chunks.pop(doc, None)
+                    db.forgotten.append(doc)
+                    return result
+                left = db.chunks.get(doc, 0)
+                n = left if params["limit"] is None else min(left, params["limit"])
+                db.chunks[doc] = left - n
+                return Result((n,))
+
+        return Conn()
+
+
+class TestDocumentPurger:
+    def test_deletes_in_batches_then_forgets(self):
+        db = FakeDB({"big": 1200, "small": 3})
+        pauses = []
+        purger = DocumentPurger(batch_size=500, pause_seconds=0.2, connect=db.connect, sleep=pauses.append)
+        report = purger.run_once()
+        assert report.chunks_deleted == 1203
+        assert report.documents_purged == 2
+        assert report.batches == 4  # 500 + 500 + 200 for "big", 3 for "small"
+        assert db.forgotten == ["big", "small"]
+        assert pauses == [0.2, 0.2, 0.2]
+        assert db.chunks == {}
+
+    def test_exact_multiple_needs_an_empty_batch(self):
+        db = FakeDB({"doc": 10})
+        report = DocumentPurger(batch_size=5, connect=db.connect, sleep=lambda s: None).run_once()
+        assert report.batches == 3
+        assert db.forgotten == ["doc"]
+
+    def test_each_batch_takes_the_document_lock(self):
+        db = FakeDB({"doc": 7})
+        report = DocumentPurger(batch_size=5, connect=db.connect, sleep=lambda s: None).run_once()
+        assert db.advisory_locks == ["doc"] * report.batches == ["doc", "doc"]
+
+    def test_keeps_the_row_while_locked_chunks_remain(self):
+        db = FakeDB({"doc": 3, "other": 2}, locked={"doc": 4})
+        report = DocumentPurger(batch_size=5, connect=db.connect, sleep=lambda s: None).run_once()
+        assert db.forgotten == ["other"]
+        assert report.documents_purged == 1
+        assert "doc" in db.chunks  # still marked deleted: the next sweep retries
+
+        db.locked.clear()  # the other transaction rolled back
+        DocumentPurger(batch_size=5, connect=db.connect, sleep=lambda s: None).run_once()
+        assert db.forgotten == ["other", "doc"]
+
+    def test_stops_between_batches(self):
+        db = FakeDB({"doc": 100})
+        calls = iter([False, False, False, True])
+        report = DocumentPurger(batch_size=10, connect=db.connect, sleep=lambda s: None).run_once(
+            should_stop=lambda: next(calls, True))
+        assert 0 < report.chunks_deleted < 100
+        assert db.forgotten == []
+
+    def test_batch_budget(self):
+        db = FakeDB({"doc": 100})
+        report = DocumentPurger(batch_size=10, max_batches=3, connect=db.connect, sleep=lambda s: None).run_once()
+        assert report.chunks_deleted == 30
+        assert report.documents_purged == 0
+
+    def test_errors_are_reported(self):
+        def broken():
+            raise RuntimeError("db down")
+
+        report = DocumentPurger(connect=broken).run_once()
+        assert report.errors == ["RuntimeError: db down"]
+
+
+class TestDocumentPurgeJob:
+    def test_wake_runs_a_pass(self):
+        ran = threading.Event()
+
+        class Purger:
+            def run_once(self, should_stop):
+                ran.set()
+                return PurgeReport(documents_purged=1)
+
+        job = DocumentPurgeJob(Purger(), interval_seconds=0)
+        try:
+            job.start()
+            job.wake()
+            assert ran.wait(2.0)
+        finally:
+            job.stop()
+        assert job.last_report.documents_purged == 1
+
+    def test_wake_does_not_start_the_job(self):
+        class Purger:
+            def run_once(self, should_stop):
+                raise AssertionError("purged in a process that never started the job")
+
+        job = DocumentPurgeJob(Purger(), interval_seconds=0)
+        job.wake()
+        assert job._thread is None
+
+    def test_get_purge_job_is_shared(self):
+        assert document_purge.get_purge_job() is document_purge.get_purge_job()
@@ -0,0 +1,51 @@
+"""Tests for evaluation/metrics.py and evaluation/fakes.py — no DB needed."""
+import math
+
+import pytest
+
+from rag_app.evaluation.fakes import HashingEmbeddings, LexicalReranker
+from rag_app.evaluation.metrics import recall_at_k, reciprocal_rank, ndcg_at_k, percentile, latency_summary
+
+
+class TestMetrics:
+    def test_recall_at_k(self):
+        assert recall_at_k(["a", "b", "c"], {"a", "c", "z"}, k=2) == pytest.approx(1 / 3)
+
+    def test_recall_without_relevant(self):
+        assert recall_at_k(["a"], set(), k=1) == 0.0
+
+    def test_reciprocal_rank(self):
+        assert reciprocal_rank(["x", "y", "a"], {"a"}) == pytest.approx(1 / 3)
+        assert reciprocal_rank(["x"], {"a"}) == 0.0
+
+    def test_ndcg_perfect_and_partial(self):
+        assert ndcg_at_k(["a", "b", "x"], {"a", "b"}, k=3) == pytest.approx(1.0)
+        expected = (1 / math.log2(3)) / (1 + 1 / math.log2(3))
+        assert ndcg_at_k(["x", "a"], {"a", "b"}, k=2) == pytest.approx(expected)
+
+    def test_percentile_interpolates(self):
+        assert percentile([1, 2, 3, 4], 50) == pytest.approx(2.5)
+        assert percentile([5], 99) == 5
+        assert percentile([], 50) == 0.0
+
+    def test_latency_summary_keys(self):
+        assert set(latency_summary([1.0, 2.0, 3.0])) == {"p50", "p95", "p99"}
+
+
+class TestFakes:
+    def test_embeddings_deterministic_and_normalised(self):
+        emb = HashingEmbeddings(dim=64)
+        v1, v2 = emb.embed_query("Vacation days"), HashingEmbeddings(dim=64).embed_query("vacation days")
+        assert v1 == v2
+        assert math.isclose(sum(x * x for x in v1), 1.0, rel_tol=1e-6)
+
+    def test_shared_words_are_closer(self):
+        emb = HashingEmbeddings()
+        q = emb.embed_query("vacation days per year")
+        near, far = emb.embed_documents(["paid vacation days each year", "invoice total amount due"])
+        dot = lambda a, b: sum(x * y for x, y in zip(a, b))
+        assert dot(q, near) > dot(q, far)
+
+    def test_lexical_reranker(self):
+        scores = LexicalReranker().predict([("vacation days", "ten vacation days"), ("vacation days", "invoice")])
+        assert scores[0] > scores[1]
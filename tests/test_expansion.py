@@ -0,0 +1,29 @@
+"""Tests for retrieval/expansion.py — neighbour window selection and overlap-aware joins."""
+from rag_app.retrieval.expansion import join_overlapping, pick_window
+
+
+class TestJoinOverlapping:
+    def test_repeated_overlap_removed(self):
+        assert join_overlapping(["the quick brown", "brown fox jumps"], max_overlap=10) == "the quick brown fox jumps"
+
+    def test_no_overlap_joined_with_newline(self):
+        assert join_overlapping(["alpha", "beta"], max_overlap=10) == "alpha\nbeta"
+
+    def test_overlap_longer_than_limit_kept(self):
+        assert join_overlapping(["abcdef", "cdefgh"], max_overlap=2) == "abcdef\ncdefgh"
+
+    def test_empty(self):
+        assert join_overlapping([], max_overlap=5) == ""
+
+
+class TestPickWindow:
+    def test_nearest_first_in_document_order(self):
+        chunks = [(3, "aaa"), (4, "bbb"), (5, "ccc"), (6, "ddd")]
+        assert pick_window(5, chunks, max_chars=9) == [(4, "bbb"), (5, "ccc"), (6, "ddd")]
+
+    def test_winner_always_kept(self):
+        assert pick_window(1, [(0, "x" * 10), (1, "y" * 50)], max_chars=5) == [(1, "y" * 50)]
+
+    def test_stops_at_budget_without_holes(self):
+        chunks = [(0, "a"), (1, "b" * 20), (2, "c")]
+        assert pick_window(2, chunks, max_chars=10) == [(2, "c")]
@@ -0,0 +1,97 @@
+"""Tests for agent/graph.py — the rolling summary, updated off the response path (graph and LLM faked)."""
+import asyncio
+from types import SimpleNamespace
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from rag_app.agent import graph
+from rag_app.agent.graph_configuration import GraphRunConfig
+from rag_app.config import CONFIG
+
+
+def _thread(turns: int):
+    messages = []
+    for i in range(turns):
+        messages += [HumanMessage(f"question {i}"), AIMessage(f"answer {i}")]
+    return messages
+
+
+class FakeGraph:
+    def __init__(self, values):
+        self.values = values
+        self.updates = []
+
+    async def aget_state(self, config):
+        return SimpleNamespace(values=self.values)
+
+    async def aupdate_state(self, config, values, as_node=None):
+        self.updates.append((values, as_node))
+
+
+class FakeLLM:
+    def __init__(self, gate=None):
+        self.calls = 0
+        self.gate = gate
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        return AIMessage("summary so far")
+
+
+def _fakes(monkeypatch, values, gate=None):
+    fake_graph, llm = FakeGraph(values), FakeLLM(gate)
+
+    async def get_graph():
+        return fake_graph
+
+    monkeypatch.setattr(graph, "get_graph", get_graph)
+    monkeypatch.setattr(graph, "get_llm", lambda: llm)
+    return fake_graph, llm
+
+
+CONFIG_T1 = GraphRunConfig(thread_id="t1", user_id="u1", interaction_id="i1")
+
+
+class TestSummarize:
+    async def test_folds_evicted_turns(self, monkeypatch):
+        fake_graph, llm = _fakes(monkeypatch, {"messages": _thread(CONFIG.PROMPT_HISTORY_TURNS + 2)})
+        await graph.summarize(CONFIG_T1)
+        assert llm.calls == 1
+        assert fake_graph.updates == [({"summary": "summary so far", "summarized": 4}, "generate")]
+
+    async def test_nothing_evicted_makes_no_call(self, monkeypatch):
+        fake_graph, llm = _fakes(monkeypatch, {"messages": _thread(CONFIG.PROMPT_HISTORY_TURNS)})
+        await graph.summarize(CONFIG_T1)
+        assert llm.calls == 0 and fake_graph.updates == []
+
+
+class TestScheduleSummary:
+    async def test_one_background_update_per_thread(self, monkeypatch):
+        gate = asyncio.Event()
+        fake_graph, llm = _fakes(monkeypatch, {"messages": _thread(CONFIG.PROMPT_HISTORY_TURNS + 1)}, gate)
+        graph.schedule_summary(CONFIG_T1)
+        graph.schedule_summary(CONFIG_T1)  # already running: not scheduled again
+        task = graph._SUMMARIES["t1"]
+        await asyncio.sleep(0)
+        assert llm.calls == 1 and fake_graph.updates == []
+        gate.set()
+        await task
+        assert len(fake_graph.updates) == 1 and "t1" not in graph._SUMMARIES
+
+    async def test_failure_is_logged_not_raised(self, monkeypatch):
+        async def get_graph():
+            raise ConnectionError("db down")
+
+        monkeypatch.setattr(graph, "get_graph", get_graph)
+        graph.schedule_summary(CONFIG_T1)
+        await asyncio.gather(graph._SUMMARIES["t1"])
+        assert "t1" not in graph._SUMMARIES
+
+    async def test_cancel_at_shutdown(self, monkeypatch):
+        _fakes(monkeypatch, {"messages": _thread(CONFIG.PROMPT_HISTORY_TURNS + 1)}, asyncio.Event())
+        graph.schedule_summary(CONFIG_T1)
+        await asyncio.sleep(0)
+        await graph.cancel_summaries()
+        assert graph._SUMMARIES == {}
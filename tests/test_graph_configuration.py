@@ -36,3 +36,11 @@ class TestGraphRunConfig:
     def test_empty_user_id_rejected(self):
         with pytest.raises(Exception):
             GraphRunConfig(thread_id="t1", user_id="")
+
+    def test_router_mode_roundtrip(self):
+        original = GraphRunConfig(thread_id="t1", user_id="u1", router_mode="always")
+        assert GraphRunConfig.from_runnable(original.to_runnable()).router_mode == "always"
+
+    def test_from_runnable_without_router_mode(self):
+        runnable = {"configurable": {THREAD_ID: "t1", USER_ID_KEY: "u1", INTERACTION_ID_KEY: None}}
+        assert GraphRunConfig.from_runnable(runnable).router_mode is None
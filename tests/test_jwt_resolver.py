@@ -1,4 +1,5 @@
 """Tests for web_api/jwt_resolver.py."""
+import base64
 import time
 
 import jwt
@@ -7,7 +8,8 @@ from fastapi import FastAPI, Depends
 from httpx import AsyncClient, ASGITransport
 
 from rag_app.config import CONFIG
-from rag_app.web_api.jwt_resolver import JWTBearer
+from rag_app.web_api import jwt_resolver
+from rag_app.web_api.jwt_resolver import CLAIMS_CACHE, ClaimsCache, JWTBearer
 
 app = FastAPI()
 
@@ -17,6 +19,13 @@ async def protected(user_id: str = Depends(JWTBearer())):
     return {"user_id": user_id}
 
 
+@pytest.fixture(autouse=True)
+def empty_claims_cache():
+    CLAIMS_CACHE.clear()
+    yield
+    CLAIMS_CACHE.clear()
+
+
 def _make_token(sub: str = "user-123", exp_offset: int = 3600, **overrides) -> str:
     now = int(time.time())
     payload = {"sub": sub, "aud": "authenticated", "iat": now, "exp": now + exp_offset, **overrides}
@@ -64,3 +73,92 @@ async def test_no_sub_in_token():
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
         resp = await ac.get("/protected", headers={"Authorization": f"Bearer {token}"})
     assert resp.status_code == 401
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    calls = []
+    decode = jwt_resolver._decode
+
+    def counting(token):
+        calls.append(token)
+        return decode(token)
+
+    monkeypatch.setattr(jwt_resolver, "_decode", counting)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_repeat_requests_skip_verification(decodes):
+    token = _make_token()
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        for _ in range(3):
+            resp = await ac.get("/protected", headers={"Authorization": f"Bearer {token}"})
+            assert resp.json()["user_id"] == "user-123"
+    assert decodes == [token]
+
+
+@pytest.mark.asyncio
+async def test_rejected_tokens_are_not_cached(decodes):
+    token = jwt.encode({"sub": "u", "aud": "authenticated", "exp": int(time.time()) + 3600},
+                       "wrong-secret-key-that-is-long-enough", algorithm="HS256")
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        for _ in range(2):
+            assert (await ac.get("/protected", headers={"Authorization": f"Bearer {token}"})).status_code == 401
+    assert len(decodes) == 2 and len(CLAIMS_CACHE) == 0
+
+
+def test_entry_expires_at_exp():
+    now = [1000.0]
+    cache = ClaimsCache(max_entries=10, clock=lambda: now[0])
+    cache.put("t", {"sub": "u", "exp": 1060})
+    assert cache.get("t")["sub"] == "u"
+    now[0] = 1060.0
+    assert cache.get("t") is None and len(cache) == 0
+
+
+def test_tokens_without_exp_and_lru_bound():
+    cache = ClaimsCache(max_entries=2)
+    assert cache.put("no-exp", {"sub": "u"})["sub"] == "u"
+    assert cache.get("no-exp") is None
+    exp = time.time() + 60
+    for token in ("a", "b", "c"):
+        cache.put(token, {"sub": token, "exp": exp})
+    assert cache.get("a") is None and cache.get("c")["sub"] == "c"
+
+
+def test_cached_claims_are_read_only():
+    claims = ClaimsCache(max_entries=1).put("t", {"sub": "u", "exp": time.time() + 60})
+    with pytest.raises(TypeError):
+        claims["sub"] = "someone-else"
+
+
+@pytest.mark.asyncio
+async def test_jwks_mode(monkeypatch):
+    secret = b"a-symmetric-key-served-as-a-jwk-for-tests"
+    jwks = {"keys": [{"kty": "oct", "kid": "k1", "alg": "HS256",
+                      "k": base64.urlsafe_b64encode(secret).rstrip(b"=").decode()}]}
+    fetches = []
+
+    def fetch_data(self):
+        fetches.append(self.uri)
+        return jwks
+
+    monkeypatch.setattr(CONFIG, "JWT_JWKS_URL", "https://auth.example/.well-known/jwks.json")
+    monkeypatch.setattr(CONFIG, "JWT_ALG", "HS256")
+    monkeypatch.setattr(jwt.PyJWKClient, "fetch_data", fetch_data)
+    jwt_resolver.get_jwks_client.cache_clear()
+    try:
+        now = int(time.time())
+        token = jwt.encode({"sub": "jwks-user", "aud": "authenticated", "exp": now + 3600}, secret,
+                           algorithm="HS256", headers={"kid": "k1"})
+        # signed with JWT_SECRET, which JWKS mode no longer trusts
+        forged = jwt.encode({"sub": "user-123", "aud": "authenticated", "exp": now + 3600}, CONFIG.JWT_SECRET,
+                            algorithm="HS256", headers={"kid": "k1"})
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            resp = await ac.get("/protected", headers={"Authorization": f"Bearer {token}"})
+            assert resp.json()["user_id"] == "jwks-user"
+            assert (await ac.get("/protected", headers={"Authorization": f"Bearer {forged}"})).status_code == 401
+        assert fetches == ["https://auth.example/.well-known/jwks.json"]
+    finally:
+        jwt_resolver.get_jwks_client.cache_clear()
@@ -0,0 +1,34 @@
+"""Tests for llm_singleton.py — one shared client, tools bound once."""
+from langchain_core.tools import tool
+
+from rag_app.llm_singleton import get_embeddings, get_llm, get_llm_with_tools, _keep_alive
+
+
+@tool
+def echo(text: str) -> str:
+    """Echo the text back."""
+    return text
+
+
+class TestSharedLlm:
+    def test_same_instance(self):
+        assert get_llm() is get_llm()
+
+    def test_keep_alive_configured(self):
+        assert get_llm().keep_alive == "30m"
+
+    def test_tools_bound_once(self):
+        assert get_llm_with_tools([echo]) is get_llm_with_tools([echo])
+
+    def test_embeddings_shared(self):
+        assert get_embeddings() is get_embeddings()
+        assert get_embeddings().base_url == "http://localhost:11434"
+
+
+class TestKeepAlive:
+    def test_duration_string(self):
+        assert _keep_alive("10m") == "10m"
+
+    def test_seconds(self):
+        assert _keep_alive("300") == 300
+        assert _keep_alive("-1") == -1
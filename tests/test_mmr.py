@@ -0,0 +1,27 @@
+"""Tests for retrieval/mmr.py — vectorised maximal marginal relevance."""
+import numpy as np
+
+from rag_app.retrieval.mmr import mmr_select
+
+
+class TestMmrSelect:
+    def test_first_pick_is_most_relevant(self):
+        emb = np.array([[0.0, 1.0], [1.0, 0.0], [0.7, 0.7]], dtype=np.float32)
+        assert mmr_select(np.array([1.0, 0.0]), emb, k=1) == [1]
+
+    def test_near_duplicate_skipped(self):
+        # 0 and 1 are duplicates, 2 is less relevant but different
+        emb = np.array([[1.0, 0.0], [0.999, 0.01], [0.6, 0.8]], dtype=np.float32)
+        assert mmr_select(np.array([1.0, 0.0]), emb, k=2, lambda_mult=0.3) == [0, 2]
+
+    def test_lambda_one_is_pure_relevance(self):
+        emb = np.array([[1.0, 0.0], [0.999, 0.01], [0.6, 0.8]], dtype=np.float32)
+        assert mmr_select(np.array([1.0, 0.0]), emb, k=2, lambda_mult=1.0) == [0, 1]
+
+    def test_k_capped_and_unique(self):
+        emb = np.random.default_rng(1).normal(size=(5, 4)).astype(np.float32)
+        picked = mmr_select(np.ones(4), emb, k=10)
+        assert sorted(picked) == [0, 1, 2, 3, 4]
+
+    def test_empty(self):
+        assert mmr_select(np.ones(3), np.zeros((0, 3), dtype=np.float32), k=4) == []
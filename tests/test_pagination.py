@@ -0,0 +1,26 @@
+"""Tests for pagination.py — opaque keyset cursors."""
+from datetime import datetime, timezone
+
+import pytest
+
+from rag_app.pagination import InvalidCursor, decode_cursor, encode_cursor
+
+
+class TestCursor:
+    def test_round_trip(self):
+        created = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+        cursor = encode_cursor(created, "doc-1")
+        assert decode_cursor(cursor, 2) == [created.isoformat(), "doc-1"]
+
+    def test_url_safe_without_padding(self):
+        cursor = encode_cursor("a" * 7, 3)
+        assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+
+    def test_first_page(self):
+        assert decode_cursor(None, 2) is None
+        assert decode_cursor("", 2) is None
+
+    @pytest.mark.parametrize("cursor", ["!!!", "bm90LWpzb24", encode_cursor("only-one")])
+    def test_invalid(self, cursor):
+        with pytest.raises(InvalidCursor):
+            decode_cursor(cursor, 2)
@@ -1,5 +1,10 @@
 """Tests for retrieval/pdf_retriever.py — pure helper methods."""
-from rag_app.retrieval.pdf_retriever import DocumentFound
+import numpy as np
+from langchain_core.documents import Document
+
+from rag_app.config import CONFIG
+from rag_app.retrieval.pdf_retriever import DocumentFound, PdfRetriever, RetrievalMode
+from rag_app.retrieval.vector_search import SearchHits
 
 
 class TestDocumentFound:
@@ -33,3 +38,37 @@ class TestBuildFilterQuery:
         user_id, doc_id = "u1", "d1"
         f = {USER_ID_KEY: user_id, DOC_ID_KEY: doc_id}
         assert f == {"user_id": "u1", "document_id": "d1"}
+
+
+class TestAdaptiveEarlyExit:
+    def _retriever(self, monkeypatch, hits, query_embedding):
+        class Embeddings:
+            def embed_query(self, query):
+                return query_embedding
+
+        class Reranker:
+            calls = 0
+
+            def predict(self, pairs):
+                Reranker.calls += 1
+                return [0.0] * len(pairs)
+
+        retriever = PdfRetriever(embeddings=Embeddings(), reranker=Reranker(), use_user_index=False)
+        monkeypatch.setattr(retriever, "_search", lambda *args, **kwargs: hits)
+        return retriever, Reranker
+
+    def test_gap_is_measured_before_mmr(self, monkeypatch):
+        threshold = CONFIG.EARLY_EXIT_SIMILARITY_GAP
+        n = max(CONFIG.MMR_TOP_K, CONFIG.RERANKER_TOP_N_RETRIEVED_DOCS) + 4
+        # the runner-up duplicates the best hit, so MMR drops it and the gap left after MMR is wide
+        embeddings = np.eye(n, dtype=np.float32)
+        embeddings[1] = embeddings[0]
+        similarities = [0.9, 0.9 - threshold / 2] + [0.9 - 2 * threshold - 0.001 * i for i in range(n - 2)]
+        hits = SearchHits(documents=[Document(id=f"c{i}", page_content=f"chunk {i}") for i in range(n)],
+                          similarities=np.asarray(similarities, dtype=np.float32), embeddings=embeddings)
+        retriever, reranker = self._retriever(monkeypatch, hits, np.ones(n).tolist())
+        kept = retriever._diversify(np.ones(n).tolist(), hits, top_n=CONFIG.RERANKER_TOP_N_RETRIEVED_DOCS)
+        assert "c1" not in [doc.id for doc in kept.documents]
+        _, trace = retriever.retrieve_with_trace("q", "u1", k=n, mode=RetrievalMode.ADAPTIVE)
+        assert trace.similarity_gap < threshold
+        assert not trace.early_exit and reranker.calls >= 1
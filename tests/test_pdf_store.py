@@ -1,10 +1,16 @@
 """Tests for ingestion/pdf_store.py — pure functions only."""
 import io
 
+from langchain.schema import Document
+
 from rag_app.ingestion.pdf_store import (
     generate_doc_id_from_bytesio,
     create_document_filter,
     create_parser_additional_metadata,
+    tag_sections,
+    assign_chunk_ordinals,
+    count_pages,
+    _byte_size,
 )
 
 
@@ -32,6 +38,21 @@ class TestGenerateDocId:
         assert f.tell() == 3
 
 
+class TestRegistryFigures:
+    def test_count_pages(self):
+        docs = [Document(page_content="a", metadata={"page_number": 1}),
+                Document(page_content="b", metadata={"page_number": 1}),
+                Document(page_content="c", metadata={"page": 2}),
+                Document(page_content="d", metadata={})]
+        assert count_pages(docs) == 2
+
+    def test_byte_size_preserves_position(self):
+        f = io.BytesIO(b"0123456789")
+        f.seek(4)
+        assert _byte_size(f) == 10
+        assert f.tell() == 4
+
+
 class TestCreateDocumentFilter:
     def test_structure(self):
         filt = create_document_filter("user-1", "doc-abc")
@@ -51,3 +72,22 @@ class TestCreateParserAdditionalMetadata:
     def test_none_page(self):
         meta = create_parser_additional_metadata("doc.pdf", None)
         assert meta["page"] is None
+
+
+class TestChunkPositions:
+    def test_sections_start_at_headings(self):
+        docs = [
+            Document(page_content="intro", metadata={"category": "NarrativeText"}),
+            Document(page_content="Chapter 1", metadata={"category": "Title"}),
+            Document(page_content="body", metadata={"category": "NarrativeText"}),
+            Document(page_content="Chapter 2", metadata={"category": "Title"}),
+        ]
+        assert [d.metadata["section_id"] for d in tag_sections(docs)] == [0, 1, 1, 2]
+
+    def test_leading_heading_is_section_zero(self):
+        docs = [Document(page_content="Title", metadata={"category": "Title"}), Document(page_content="x")]
+        assert [d.metadata["section_id"] for d in tag_sections(docs)] == [0, 0]
+
+    def test_chunk_ordinals(self):
+        chunks = [Document(page_content=t) for t in "abc"]
+        assert [c.metadata["chunk_ordinal"] for c in assign_chunk_ordinals(chunks)] == [0, 1, 2]
@@ -0,0 +1,89 @@
+"""Tests for agent/prompt_builder.py — token-budgeted prompts and history windowing."""
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from rag_app.agent.prompt_builder import PromptBuilder, count_tokens, conversation_messages, split_history, \
+    format_document, summary_prompt, SUMMARY_PREFIX
+from rag_app.retrieval.pdf_retriever import DocumentFound
+
+
+def _thread(turns: int) -> list:
+    messages = []
+    for i in range(turns):
+        messages += [HumanMessage(f"question {i} " + "word " * 40), AIMessage(f"answer {i} " + "word " * 40)]
+    return messages
+
+
+def _retrieval_turn(question: str) -> list:
+    call = AIMessage("", tool_calls=[{"name": "retrieve_documents", "args": {"query": question}, "id": "c1"}])
+    return [HumanMessage(question), call, ToolMessage("docs", tool_call_id="c1")]
+
+
+def _docs(n: int, size: int = 400) -> list:
+    return [DocumentFound(i + 1, f"chunk {i} " + "x" * size, f"doc{i}.pdf") for i in range(n)]
+
+
+def _prompt_tokens(prompt) -> int:
+    return sum(count_tokens(m.content) + 4 for m in prompt)
+
+
+class TestHistory:
+    def test_conversation_skips_tool_traffic(self):
+        messages = _thread(1) + _retrieval_turn("what is it?")
+        assert [m.type for m in conversation_messages(messages)] == ["human", "ai", "human"]
+
+    def test_split_history_keeps_last_turns(self):
+        conversation = _thread(5) + [HumanMessage("now")]
+        older, recent = split_history(conversation, history_turns=2)
+        assert len(older) == 6 and len(recent) == 4
+        assert recent[0].content.startswith("question 3")
+
+
+class TestAnswerPrompt:
+    def test_within_budget_for_long_threads(self):
+        builder = PromptBuilder(token_budget=1500, history_turns=4)
+        medium = builder.build_answer_prompt(_thread(20) + _retrieval_turn("q?"), _docs(10))
+        long = builder.build_answer_prompt(_thread(200) + _retrieval_turn("q?"), _docs(10))
+        assert _prompt_tokens(long) <= 1500
+        assert _prompt_tokens(long) == _prompt_tokens(medium)
+        assert 2 < len(long) <= 1 + 8 + 1  # system, window, current question
+
+    def test_documents_packed_in_rank_order(self):
+        builder = PromptBuilder(token_budget=400, history_turns=0)
+        prompt = builder.build_answer_prompt(_retrieval_turn("q?"), _docs(10, size=200))
+        system = prompt[0].content
+        assert "[1] doc0.pdf p.1" in system
+        assert "[10] doc9.pdf" not in system
+        assert system.index("[1]") < system.index("[2]")
+
+    def test_best_document_truncated_when_nothing_fits(self):
+        builder = PromptBuilder(token_budget=200, history_turns=0)
+        prompt = builder.build_answer_prompt(_retrieval_turn("q?"), _docs(1, size=5000))
+        assert "[1] doc0.pdf" in prompt[0].content
+        assert _prompt_tokens(prompt) <= 200
+
+    def test_summary_in_system_message(self):
+        builder = PromptBuilder(token_budget=1500, history_turns=1)
+        prompt = builder.build_answer_prompt(_retrieval_turn("q?"), [], summary="user asked about invoices")
+        assert SUMMARY_PREFIX + "user asked about invoices" in prompt[0].content
+
+    def test_compact_document_format(self):
+        assert format_document(2, DocumentFound(7, "text", "a.pdf")) == "[2] a.pdf p.7\ntext"
+
+
+class TestWindowAndSummary:
+    def test_window_is_bounded(self):
+        builder = PromptBuilder(token_budget=3000, history_turns=3)
+        window = builder.window(_thread(100) + [HumanMessage("latest")], summary="earlier")
+        assert window[0].type == "system"
+        assert window[-1].content == "latest"
+        assert len(window) == 1 + 6 + 1
+
+    def test_unsummarized_counts_from_offset(self):
+        builder = PromptBuilder(token_budget=3000, history_turns=2)
+        messages = _thread(5)
+        assert len(builder.unsummarized(messages, summarized=0)) == 6
+        assert len(builder.unsummarized(messages, summarized=4)) == 2
+
+    def test_summary_prompt_lists_turns(self):
+        prompt = summary_prompt("old", [HumanMessage("hi"), AIMessage("hello")])
+        assert "User: hi" in prompt[0].content and "Assistant: hello" in prompt[0].content
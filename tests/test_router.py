@@ -0,0 +1,46 @@
+"""Tests for agent/router.py — local routing ahead of the tool-decision LLM call."""
+from rag_app.agent.router import Route, RouterMode, RuleRouter, EmbeddingRouter, AlwaysRetrieveRouter, get_router
+from rag_app.evaluation.fakes import HashingEmbeddings
+
+
+class TestRouterMode:
+    def test_parse_known(self):
+        assert RouterMode.parse(" Always ") == RouterMode.ALWAYS
+
+    def test_parse_missing(self):
+        assert RouterMode.parse(None) is None
+
+    def test_parse_unknown(self):
+        assert RouterMode.parse("magic") is None
+
+
+class TestRuleRouter:
+    def test_small_talk_is_unsure(self):
+        assert RuleRouter().route("Hello!") == Route.UNSURE
+
+    def test_question_retrieves(self):
+        assert RuleRouter().route("What does the contract say about termination?") == Route.RETRIEVE
+
+    def test_italian_question_retrieves(self):
+        assert RuleRouter().route("Riassumi il documento caricato ieri") == Route.RETRIEVE
+
+    def test_short_message_is_unsure(self):
+        assert RuleRouter().route("why?") == Route.UNSURE
+
+
+class TestEmbeddingRouter:
+    def test_close_to_retrieve_examples(self):
+        router = EmbeddingRouter(HashingEmbeddings(), margin=0.0)
+        assert router.route("Summarize the report") == Route.RETRIEVE
+
+    def test_close_to_chat_examples(self):
+        router = EmbeddingRouter(HashingEmbeddings(), margin=0.0)
+        assert router.route("Thanks a lot!") == Route.UNSURE
+
+
+class TestGetRouter:
+    def test_llm_mode_has_no_local_router(self):
+        assert get_router(RouterMode.LLM) is None
+
+    def test_always(self):
+        assert isinstance(get_router(RouterMode.ALWAYS), AlwaysRetrieveRouter)
@@ -0,0 +1,87 @@
+"""Tests for agent/singleflight.py — coalescing identical in-flight streams."""
+import asyncio
+
+from rag_app.agent.singleflight import SingleFlight, normalize_question
+
+
+async def _tokens(n: int, calls: list, delay: float = 0.01):
+    calls.append(1)
+    for i in range(n):
+        await asyncio.sleep(delay)
+        yield f"t{i}"
+
+
+async def _collect(flights: SingleFlight, key, source_factory):
+    flight, leader = flights.join(key, source_factory)
+    return leader, [chunk async for chunk in flight.subscribe()]
+
+
+class TestNormalizeQuestion:
+    def test_case_space_and_punctuation(self):
+        assert normalize_question("  What is  the TOTAL?? ") == normalize_question("what is the total")
+
+    def test_different_questions(self):
+        assert normalize_question("total?") != normalize_question("subtotal?")
+
+
+class TestSingleFlight:
+    async def test_concurrent_duplicates_share_one_run(self):
+        flights, calls = SingleFlight(), []
+        results = await asyncio.gather(*[_collect(flights, "k", lambda f: _tokens(3, calls)) for _ in range(5)])
+        assert len(calls) == 1
+        assert [leader for leader, _ in results].count(True) == 1
+        assert all(chunks == ["t0", "t1", "t2"] for _, chunks in results)
+        assert len(flights) == 0
+
+    async def test_different_keys_run_separately(self):
+        flights, calls = SingleFlight(), []
+        await asyncio.gather(_collect(flights, "a", lambda f: _tokens(2, calls)),
+                             _collect(flights, "b", lambda f: _tokens(2, calls)))
+        assert len(calls) == 2
+
+    async def test_late_follower_replays_from_start(self):
+        flights, calls = SingleFlight(), []
+        leader = asyncio.create_task(_collect(flights, "k", lambda f: _tokens(4, calls, delay=0.02)))
+        await asyncio.sleep(0.05)
+        _, chunks = await _collect(flights, "k", lambda f: _tokens(4, calls))
+        assert chunks == ["t0", "t1", "t2", "t3"]
+        await leader
+        assert len(calls) == 1
+
+    async def test_source_error_reaches_every_subscriber(self):
+        async def failing(flight):
+            yield "t0"
+            raise RuntimeError("llm down")
+
+        flights = SingleFlight()
+        results = await asyncio.gather(*[_collect(flights, "k", failing) for _ in range(2)], return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    async def test_source_cancelled_when_everyone_leaves(self):
+        cancelled = asyncio.Event()
+
+        async def endless(flight):
+            try:
+                while True:
+                    await asyncio.sleep(0.01)
+                    yield "t"
+            finally:
+                cancelled.set()
+
+        flights = SingleFlight()
+        flight, _ = flights.join("k", endless)
+        stream = flight.subscribe()
+        assert await stream.__anext__() == "t"
+        await stream.aclose()
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+        assert await flight.abandoned()
+
+    async def test_leader_leaving_keeps_flight_for_followers(self):
+        flights, calls = SingleFlight(), []
+        flight, _ = flights.join("k", lambda f: _tokens(3, calls, delay=0.02))
+        follower = asyncio.create_task(_collect(flights, "k", lambda f: _tokens(3, calls)))
+        leader_stream = flight.subscribe()
+        await leader_stream.__anext__()
+        await leader_stream.aclose()
+        _, chunks = await follower
+        assert chunks == ["t0", "t1", "t2"]
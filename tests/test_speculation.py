@@ -0,0 +1,58 @@
+"""Tests for agent/speculation.py — speculative retrieval bookkeeping."""
+import asyncio
+
+from rag_app.agent.speculation import queries_match, SpeculativeRetrievals
+
+
+async def _result(value, delay=0.0):
+    await asyncio.sleep(delay)
+    return value
+
+
+async def _fail():
+    raise RuntimeError("db down")
+
+
+class TestQueriesMatch:
+    def test_identical_ignoring_case_and_punctuation(self):
+        assert queries_match("What is the invoice total?", "what is the invoice total", 0.6)
+
+    def test_condensed_query_matches(self):
+        assert queries_match("what is the total of the invoice", "invoice total", 0.6)
+
+    def test_query_adding_words_does_not_match(self):
+        assert not queries_match("invoice total", "invoice total for March 2024 vendor", 0.6)
+
+    def test_different_query(self):
+        assert not queries_match("summarize my contract", "invoice total March", 0.6)
+
+    def test_empty(self):
+        assert not queries_match("", "anything", 0.1)
+
+
+class TestSpeculativeRetrievals:
+    async def test_claim_matching_query(self):
+        specs = SpeculativeRetrievals()
+        specs.start("i1", "invoice total", _result(["doc"]))
+        assert await specs.claim("i1", "invoice total", 0.6) == ["doc"]
+        assert "i1" not in specs
+
+    async def test_claim_different_query_cancels(self):
+        specs = SpeculativeRetrievals()
+        specs.start("i1", "invoice total", _result(["doc"], delay=10))
+        assert await specs.claim("i1", "contract clauses", 0.6) is None
+
+    async def test_claim_unknown_key(self):
+        assert await SpeculativeRetrievals().claim("missing", "q", 0.6) is None
+
+    async def test_failed_speculation_falls_back(self):
+        specs = SpeculativeRetrievals()
+        specs.start("i1", "q", _fail())
+        assert await specs.claim("i1", "q", 0.6) is None
+
+    async def test_discard(self):
+        specs = SpeculativeRetrievals()
+        specs.start("i1", "q", _result(["doc"], delay=10))
+        specs.discard("i1")
+        assert "i1" not in specs
+        assert await specs.claim("i1", "q", 0.6) is None
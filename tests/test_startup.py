@@ -0,0 +1,56 @@
+"""Tests for startup.py — warm-up retries, the readiness report and the import-time parser."""
+from rag_app.startup import Readiness, parse_importtime, warm_up
+
+
+class TestWarmUp:
+    async def test_retries_failed_steps_until_ready(self):
+        calls = {"ok": 0, "flaky": 0}
+        sleeps = []
+
+        async def ok():
+            calls["ok"] += 1
+
+        async def flaky():
+            calls["flaky"] += 1
+            if calls["flaky"] == 1:
+                raise ConnectionError("db down")
+
+        async def sleep(seconds):
+            sleeps.append(seconds)
+
+        readiness = Readiness(started=0.0)
+        await warm_up([("ok", ok), ("flaky", flaky)], readiness, retry_seconds=2.5, sleep=sleep)
+        report = readiness.report()
+        assert readiness.ready
+        assert calls == {"ok": 1, "flaky": 2}  # succeeded steps are not re-run
+        assert sleeps == [2.5]
+        assert report["steps"]["flaky"]["attempts"] == 2
+        assert report["steps"]["flaky"]["ok"] and report["steps"]["flaky"]["error"] is None
+        assert report["startup_seconds"] > 0
+
+    async def test_not_ready_while_a_step_fails(self):
+        readiness = Readiness()
+        readiness.record("db_pools", False, 0.1, "ConnectionError: db down")
+        assert not readiness.ready
+        assert readiness.report()["steps"]["db_pools"]["error"] == "ConnectionError: db down"
+
+
+class TestReadinessMetrics:
+    def test_render(self):
+        readiness = Readiness(started=0.0)
+        assert list(readiness.render_metrics()) == ["# TYPE rag_ready gauge", "rag_ready 0"]
+        readiness.record("graph", True, 0.25)
+        readiness.mark_ready()
+        lines = list(readiness.render_metrics())
+        assert "rag_ready 1" in lines
+        assert any(line.startswith("rag_startup_seconds ") for line in lines)
+        assert 'rag_startup_step_seconds{step="graph"} 0.25' in lines
+
+
+class TestParseImporttime:
+    def test_parses_rows_and_skips_header(self):
+        stderr = ("import time: self [us] | cumulative | imported package\n"
+                  "import time:       120 |        120 |   _io\n"
+                  "import time:      3000 |     250000 | rag_app.web_api.endpoints\n"
+                  "Traceback (most recent call last):\n")
+        assert parse_importtime(stderr) == [("_io", 120, 120), ("rag_app.web_api.endpoints", 3000, 250000)]
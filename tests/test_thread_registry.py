@@ -0,0 +1,155 @@
+"""Tests for thread_registry.py — in-memory batching in front of chat_threads (DB faked)."""
+from datetime import datetime, timezone
+
+from rag_app import thread_registry
+from rag_app.thread_registry import ThreadRegistry
+
+
+class FakeDB:
+    def __init__(self, rows=None, fail=False, owner_row=None):
+        self.rows = rows or []
+        self.owner_row = owner_row
+        self.fail = fail
+        self.upserts = []
+
+    def connect(self):
+        db = self
+
+        class Result:
+            def __init__(self, params=None, row=(None,)):
+                self.params = params
+                self.row = row
+
+            def fetchone(self):
+                return self.row
+
+            def fetchall(self):
+                return list(zip(self.params["thread_ids"], self.params["user_ids"]))
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params=None):
+                pass
+
+            def fetchall(self):
+                return db.rows
+
+        class Conn:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params=None):
+                if db.fail:
+                    raise ConnectionError("db down")
+                if params and "thread_ids" in params:
+                    db.upserts.append(params)
+                    return Result(params)
+                if sql.lstrip().startswith("SELECT user_id"):
+                    return Result(row=db.owner_row)
+                return Result()
+
+            def cursor(self):
+                return Cursor()
+
+        return Conn()
+
+
+def _registry(db: FakeDB) -> ThreadRegistry:
+    registry = ThreadRegistry(flush_seconds=3600, connect=db.connect)
+    registry._ensure_started = lambda: None  # flush explicitly in tests
+    return registry
+
+
+class TestThreadRegistry:
+    def test_touches_coalesce_into_one_upsert(self):
+        db = FakeDB()
+        registry = _registry(db)
+        for _ in range(5):
+            registry.touch("u1", "t1")
+        registry.touch("u1", "t2")
+        assert registry.flush() == 2
+        assert len(db.upserts) == 1
+        assert sorted(db.upserts[0]["thread_ids"]) == ["t1", "t2"]
+
+    def test_nothing_pending_writes_nothing(self):
+        db = FakeDB()
+        assert _registry(db).flush() == 0
+        assert db.upserts == []
+
+    def test_new_thread_wakes_flusher_known_does_not(self):
+        registry = _registry(FakeDB())
+        registry.touch("u1", "t1")
+        assert registry._wake.is_set()
+        registry.flush()
+        registry._wake.clear()
+        registry.touch("u1", "t1")
+        assert not registry._wake.is_set()
+
+    def test_failed_flush_keeps_pending(self):
+        db = FakeDB(fail=True)
+        registry = _registry(db)
+        registry.touch("u1", "t1")
+        assert registry.flush() == 0
+        db.fail = False
+        assert registry.flush() == 1
+
+    def test_list_merges_unflushed_activity(self):
+        old = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        registry = _registry(FakeDB(rows=[("t1", old, old), ("t2", old, old)]))
+        registry.touch("u1", "t2")
+        registry.touch("u2", "other")
+        threads = registry.list_threads("u1")
+        assert [t.thread_id for t in threads] == ["t2", "t1"]
+        assert threads[0].created_at == old and threads[0].updated_at > old
+
+    def test_forget_drops_pending(self):
+        db = FakeDB()
+        registry = _registry(db)
+        registry.touch("u1", "t1")
+        registry.forget("t1")
+        assert registry.flush() == 0
+
+    def test_flush_never_revives_a_deleted_thread(self):
+        # the bump only updates rows without a tombstone, and listings skip tombstoned rows
+        assert "WHERE chat_threads.deleted_at IS NULL" in thread_registry._UPSERT
+        assert "deleted_at IS NULL" in thread_registry._LIST and "deleted_at IS NULL" in thread_registry._OWNER
+
+    def test_later_page_skips_threads_bumped_past_the_cursor(self):
+        old = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        cursor = (datetime(2024, 6, 1, tzinfo=timezone.utc), "t9")
+        # the stored t2 row still sorts after the cursor, but its pending bump put it on the first page
+        registry = _registry(FakeDB(rows=[("t1", old, old), ("t2", old, old)]))
+        registry.touch("u1", "t2")
+        assert [t.thread_id for t in registry.list_threads("u1", after=cursor)] == ["t1"]
+        assert [t.thread_id for t in registry.list_threads("u1", limit=1)] == ["t2"]
+
+    def test_touch_never_changes_the_owner(self):
+        db = FakeDB()
+        registry = _registry(db)
+        registry.touch("u1", "t1")
+        registry.touch("intruder", "t1")  # pending
+        assert registry.owner("t1") == "u1"
+        registry.flush()
+        registry.touch("intruder", "t1")  # known
+        assert registry.flush() == 0
+        assert registry.list_threads("intruder") == []
+        assert db.upserts[0]["user_ids"] == ["u1"]
+
+    def test_stored_owner_wins_over_pending_activity(self):
+        registry = _registry(FakeDB(owner_row=("u1",)))
+        registry.touch("intruder", "t1")  # first seen in this process
+        assert registry.owner("t1") == "u1"
+
+    def test_owner_of_unflushed_thread(self):
+        registry = _registry(FakeDB())
+        registry.touch("u1", "t1")
+        assert registry.owner("t1") == "u1"
+        assert registry.owner("unknown") is None
@@ -0,0 +1,146 @@
+"""Tests for tracing.py — stage histograms, per-request traces and the Prometheus rendering."""
+import asyncio
+import logging
+
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import END, StateGraph
+
+from rag_app import tracing
+from rag_app.agent.agent_state import State
+from rag_app.logging_setup import ContextFilter
+from rag_app.tracing import (Histogram, STAGE_SECONDS, TimedCheckpointSaver, current_trace, merge_worker_metrics,
+                             observe, observe_tokens, render_metrics, span, start_trace, trace_ctx)
+
+
+class TestHistogram:
+    def test_buckets_are_cumulative(self):
+        h = Histogram("h", "help", "stage", (0.1, 1.0))
+        h.observe("a", 0.05)
+        h.observe("a", 0.5)
+        h.observe("a", 5.0)
+        lines = h.render()
+        assert 'h_bucket{stage="a",le="0.1"} 1' in lines
+        assert 'h_bucket{stage="a",le="1.0"} 2' in lines
+        assert 'h_bucket{stage="a",le="+Inf"} 3' in lines
+        assert 'h_count{stage="a"} 3' in lines
+        assert 'h_sum{stage="a"} 5.55' in lines
+
+    def test_header_and_label_escaping(self):
+        h = Histogram("h", "Some help.", "stage", (1.0,))
+        h.observe('we"ird', 0.5)
+        lines = h.render()
+        assert lines[:2] == ["# HELP h Some help.", "# TYPE h histogram"]
+        assert 'h_count{stage="we\\"ird"} 1' in lines
+
+
+class TestTrace:
+    def setup_method(self):
+        self._token = trace_ctx.set(None)
+
+    def teardown_method(self):
+        trace_ctx.reset(self._token)
+
+    def test_span_feeds_trace_and_histogram(self):
+        before = STAGE_SECONDS.count("test_stage")
+        trace = start_trace("rid-1")
+        with span("test_stage"):
+            pass
+        observe("test_stage", 0.01)
+        observe_tokens("answer", 120)
+        assert STAGE_SECONDS.count("test_stage") == before + 2
+        summary = trace.summary()
+        assert summary["request_id"] == "rid-1"
+        assert summary["spans_ms"]["test_stage"] >= 10.0
+        assert summary["prompt_tokens"] == {"answer": 120}
+
+    def test_span_without_trace(self):
+        before = STAGE_SECONDS.count("untraced")
+        with span("untraced"):
+            pass
+        assert current_trace() is None
+        assert STAGE_SECONDS.count("untraced") == before + 1
+
+    def test_span_recorded_on_error(self):
+        trace = start_trace("rid-2")
+        try:
+            with span("failing"):
+                raise ValueError("boom")
+        except ValueError:
+            pass
+        assert "failing" in trace.spans_ms
+
+    async def test_requests_keep_their_own_trace(self):
+        async def request(rid):
+            trace = start_trace(rid)
+            await asyncio.sleep(0)
+            await asyncio.to_thread(observe, f"stage_{rid}", 0.001)
+            return trace
+
+        a, b = await asyncio.gather(asyncio.create_task(request("a")), asyncio.create_task(request("b")))
+        assert list(a.spans_ms) == ["stage_a"]
+        assert list(b.spans_ms) == ["stage_b"]
+
+    def test_log_records_carry_the_trace(self):
+        trace = start_trace("rid-3")
+        record = logging.LogRecord("x", logging.INFO, __file__, 1, "msg", None, None)
+        ContextFilter().filter(record)
+        assert not hasattr(record, "trace")
+        observe("rerank", 0.002)
+        ContextFilter().filter(record)
+        assert record.trace["spans_ms"]["rerank"] == 2.0
+        assert record.trace == trace.summary()
+
+
+class TimedSaver(TimedCheckpointSaver, InMemorySaver):
+    pass
+
+
+class TestCheckpointTiming:
+    async def test_checkpoint_writes_are_timed(self):
+        def node(state: State):
+            return {}
+
+        builder = StateGraph(State)
+        builder.add_node(node)
+        builder.set_entry_point("node")
+        builder.add_edge("node", END)
+        graph = builder.compile(checkpointer=TimedSaver())
+
+        token = trace_ctx.set(None)
+        try:
+            trace = start_trace("rid-4")
+            await graph.ainvoke({"messages": [("user", "hi")]}, {"configurable": {"thread_id": "t"}})
+        finally:
+            trace_ctx.reset(token)
+        assert "checkpoint_write" in trace.spans_ms
+
+
+class TestRenderMetrics:
+    def test_exposition(self):
+        observe("render_check", 0.2)
+        text = render_metrics()
+        assert text.endswith("\n")
+        assert "# TYPE rag_stage_duration_seconds histogram" in text
+        assert "# TYPE rag_prompt_tokens histogram" in text
+        assert 'rag_stage_duration_seconds_count{stage="render_check"}' in text
+
+
+class TestWorkerMetrics:
+    def test_merge_labels_every_sample_with_its_worker(self):
+        lines = merge_worker_metrics({
+            1: ["# TYPE rag_ready gauge", "rag_ready 0", "# TYPE h histogram", 'h_count{stage="a"} 2'],
+            0: ["# TYPE rag_ready gauge", "rag_ready 1"],
+        })
+        assert lines == ["# TYPE rag_ready gauge", 'rag_ready{worker="0"} 1', 'rag_ready{worker="1"} 0',
+                         "# TYPE h histogram", 'h_count{worker="1",stage="a"} 2']
+
+    def test_scrape_serves_every_worker(self, monkeypatch, tmp_path):
+        (tmp_path / "worker-1.prom").write_text('# TYPE rag_stage_duration_seconds histogram\n'
+                                                'rag_stage_duration_seconds_count{stage="other_worker"} 7')
+        monkeypatch.setattr(tracing, "_shared", (str(tmp_path), 0))
+        observe("this_worker", 0.1)
+        text = render_metrics()
+        assert text.count("# TYPE rag_stage_duration_seconds histogram") == 1
+        assert 'rag_stage_duration_seconds_count{worker="0",stage="this_worker"} ' in text
+        assert 'rag_stage_duration_seconds_count{worker="1",stage="other_worker"} 7' in text
+        assert (tmp_path / "worker-0.prom").exists()  # published for the other workers' scrapes
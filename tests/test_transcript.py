@@ -0,0 +1,204 @@
+"""Tests for transcript.py — transcript rows, the page cache and the recording checkpointer (DB faked)."""
+from datetime import datetime, timezone
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.graph import END, StateGraph
+
+from rag_app import transcript
+from rag_app.agent.agent_state import State
+from rag_app.transcript import (TranscriptCache, TranscriptEntry, TranscriptRecorder, read_transcript,
+                                record_messages, to_entries)
+
+
+def _messages(turns):
+    messages = []
+    for i in range(turns):
+        kwargs = {"interaction_id": f"i{i}", "timestamp": f"2024-01-01T00:00:{i:02d}+00:00"}
+        messages += [HumanMessage(f"q{i}", additional_kwargs=kwargs),
+                     AIMessage("", tool_calls=[{"name": "retrieve_documents", "args": {}, "id": f"c{i}"}],
+                               additional_kwargs=dict(kwargs)),
+                     ToolMessage("docs", tool_call_id=f"c{i}", additional_kwargs=dict(kwargs)),
+                     AIMessage(f"a{i}", additional_kwargs=dict(kwargs))]
+    return messages
+
+
+class FakeTable:
+    """chat_transcript rows plus an optional latest messages blob, behind a fake async pool."""
+
+    def __init__(self, blob=None):
+        self.rows = {}
+        self.blob = blob
+        self.queries = []
+
+    def connection(self):
+        table = self
+
+        class Cursor:
+            def __init__(self, result=None):
+                self.result = result
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            async def fetchone(self):
+                return self.result[0] if self.result else None
+
+            async def fetchall(self):
+                return self.result
+
+            async def executemany(self, sql, rows):
+                for row in rows:
+                    table.rows.setdefault((row[0], row[1]), row[1:])
+
+        class Conn:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            def cursor(self):
+                return Cursor()
+
+            async def execute(self, sql, params):
+                table.queries.append(sql)
+                mine = sorted((seq, row) for (thread, seq), row in table.rows.items() if thread == params["thread_id"])
+                if "max(seq)" in sql:
+                    return Cursor([(mine[-1][0] + 1 if mine else 0,)])
+                if "EXISTS" in sql:
+                    return Cursor([(bool(mine),)])
+                if "checkpoint_blobs" in sql:
+                    return Cursor([table.blob] if table.blob else [])
+                rows = [(seq, *row[1:]) for seq, row in mine if seq > params["after_seq"]]
+                return Cursor(rows[:params["limit"]] if params["limit"] is not None else rows)
+
+        return Conn()
+
+
+@pytest.fixture
+def table(monkeypatch):
+    fake = FakeTable()
+
+    async def get_pool():
+        return fake
+    monkeypatch.setattr(transcript, "get_async_pool", get_pool)
+    monkeypatch.setattr(transcript, "_ready", True)
+    monkeypatch.setattr(transcript, "TRANSCRIPT_CACHE", TranscriptCache(max_threads=8))
+    monkeypatch.setattr(transcript, "_recorded", type(transcript._recorded)())
+    return fake
+
+
+class TestToEntries:
+    def test_keeps_human_and_ai_text(self):
+        entries = to_entries(_messages(2))
+        assert [(e.seq, e.type, e.content) for e in entries] == [(0, "human", "q0"), (3, "ai", "a0"),
+                                                                 (4, "human", "q1"), (7, "ai", "a1")]
+        assert entries[1].interaction_id == "i0"
+        assert entries[1].timestamp == datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    def test_from_start(self):
+        assert [e.seq for e in to_entries(_messages(2), start=4)] == [4, 7]
+
+
+class TestTranscriptCache:
+    def test_invalidate_drops_pages(self):
+        cache = TranscriptCache(max_threads=2)
+        entry = TranscriptEntry(0, "human", "q", "i", None)
+        cache.put("t1", (None, 10), [entry], cache.generation("t1"))
+        assert cache.get("t1", (None, 10)) == [entry]
+        cache.invalidate("t1")
+        assert cache.get("t1", (None, 10)) is None
+
+    def test_page_read_during_a_write_is_not_stored(self):
+        cache = TranscriptCache(max_threads=2)
+        generation = cache.generation("t1")
+        cache.invalidate("t1")
+        cache.put("t1", (None, 10), [], generation)
+        assert "t1" not in cache
+
+    def test_lru_bound(self):
+        cache = TranscriptCache(max_threads=2)
+        for thread in ("t1", "t2", "t3"):
+            cache.put(thread, (None, 10), [], cache.generation(thread))
+        assert "t1" not in cache and "t3" in cache
+
+
+class TestRecordAndRead:
+    async def test_each_checkpoint_appends_only_new_messages(self, table):
+        messages = _messages(1)
+        assert await record_messages("t1", messages) == 2
+        assert await record_messages("t1", messages + _messages(2)[4:]) == 2
+        assert sorted(seq for _, seq in table.rows) == [0, 3, 4, 7]
+        assert sum("max(seq)" in q for q in table.queries) == 1
+
+    async def test_pages_are_cached_until_the_next_turn(self, table):
+        await record_messages("t1", _messages(2))
+        first = await read_transcript("t1", None, limit=3)
+        assert [e.content for e in first] == ["q0", "a0", "q1"]
+        queries = len(table.queries)
+        assert await read_transcript("t1", None, limit=3) == first
+        assert len(table.queries) == queries
+        rest = await read_transcript("t1", None, limit=3, after_seq=first[-1].seq)
+        assert [e.content for e in rest] == ["a1"]
+
+        await record_messages("t1", _messages(3))
+        assert [e.content for e in await read_transcript("t1", None, limit=3, after_seq=first[-1].seq)] == \
+            ["a1", "q2", "a2"]
+
+    async def test_thread_not_in_the_table_reads_the_checkpoint(self, table):
+        serde = JsonPlusSerializer()
+        table.blob = serde.dumps_typed(_messages(2))
+        entries = await read_transcript("legacy", serde, limit=None, after_seq=0)
+        assert [e.content for e in entries] == ["a0", "q1", "a1"]
+
+    async def test_unknown_thread(self, table):
+        assert await read_transcript("missing", None, limit=10) == []
+
+    def test_forget_thread(self, table):
+        transcript._recorded["t1"] = 4
+        transcript.TRANSCRIPT_CACHE.put("t1", (None, 1), [], transcript.TRANSCRIPT_CACHE.generation("t1"))
+        transcript.forget_thread("t1")
+        assert "t1" not in transcript._recorded and "t1" not in transcript.TRANSCRIPT_CACHE
+
+
+class RecordingSaver(TranscriptRecorder, InMemorySaver):
+    pass
+
+
+class TestTranscriptRecorder:
+    async def test_graph_checkpoints_are_recorded(self, monkeypatch):
+        recorded = []
+
+        async def record(thread_id, messages):
+            recorded.append((thread_id, [m.content for m in messages]))
+        monkeypatch.setattr(transcript, "record_messages", record)
+
+        def answer(state: State):
+            return {"messages": [AIMessage("hello")]}
+
+        builder = StateGraph(State)
+        builder.add_node(answer)
+        builder.set_entry_point("answer")
+        builder.add_edge("answer", END)
+        graph = builder.compile(checkpointer=RecordingSaver())
+        await graph.ainvoke({"messages": [("user", "hi")]}, {"configurable": {"thread_id": "t"}},
+                            durability="exit")
+        assert recorded[-1] == ("t", ["hi", "hello"])
+
+    async def test_failures_do_not_fail_the_checkpoint(self, monkeypatch):
+        async def broken(thread_id, messages):
+            raise ConnectionError("db down")
+        monkeypatch.setattr(transcript, "record_messages", broken)
+        saver = RecordingSaver()
+        config = {"configurable": {"thread_id": "t", "checkpoint_ns": ""}}
+        checkpoint = empty_checkpoint()
+        checkpoint["channel_values"] = {"messages": [HumanMessage("hi")]}
+        checkpoint["channel_versions"] = {"messages": 1}
+        assert await saver.aput(config, checkpoint, {}, {"messages": 1})
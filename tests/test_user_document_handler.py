@@ -1,8 +1,11 @@
-"""Tests for document/user_document_handler.py — Pydantic model validation."""
-from datetime import datetime
+"""Tests for document/user_document_handler.py — Pydantic models and registry-backed listing."""
+from datetime import datetime, timedelta, timezone
 
 import pytest
+from fastapi import HTTPException
 
+from rag_app.document import user_document_handler as handler
+from rag_app.document.document_registry import DocumentRecord
 from rag_app.document.user_document_handler import UserDocument
 
 
@@ -18,3 +21,81 @@ class TestUserDocumentModel:
     def test_missing_required_field(self):
         with pytest.raises(Exception):
             UserDocument(user_id="u1", document_id="d1")  # missing file_name
+
+
+def _records(n):
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [DocumentRecord(document_id=f"d{i}", file_name=f"{i}.pdf", page_count=1, chunk_count=3, byte_size=10,
+                           created_at=base - timedelta(minutes=i), updated_at=base) for i in range(n)]
+
+
+class FakeRegistry:
+    """Stands in for document_registry.list_documents over a newest-first list."""
+
+    def __init__(self, records):
+        self.records = records
+        self.calls = []
+
+    def __call__(self, *, collection, user_id, limit, after=None):
+        self.calls.append((limit, after))
+        rows = self.records
+        if after:
+            rows = [r for r in rows if (r.created_at.isoformat(), r.document_id) < tuple(after)]
+        return rows[:limit]
+
+
+class TestListPages:
+    def test_pages_follow_the_cursor(self, monkeypatch):
+        registry = FakeRegistry(_records(5))
+        monkeypatch.setattr(handler, "list_documents", registry)
+        first = handler.list_user_documents_page("u1", limit=2)
+        assert [d.document_id for d in first.documents] == ["d0", "d1"]
+        assert first.documents[0].chunk_count == 3
+        second = handler.list_user_documents_page("u1", limit=2, cursor=first.next_cursor)
+        assert [d.document_id for d in second.documents] == ["d2", "d3"]
+        last = handler.list_user_documents_page("u1", limit=2, cursor=second.next_cursor)
+        assert [d.document_id for d in last.documents] == ["d4"]
+        assert last.next_cursor is None
+        assert registry.calls[0] == (3, None)
+
+    def test_bad_cursor_is_400(self, monkeypatch):
+        monkeypatch.setattr(handler, "list_documents", FakeRegistry([]))
+        with pytest.raises(HTTPException) as e:
+            handler.list_user_documents_page("u1", cursor="garbage")
+        assert e.value.status_code == 400
+
+    def test_full_listing_walks_every_page(self, monkeypatch):
+        monkeypatch.setattr(handler, "MAX_PAGE_SIZE", 2)
+        monkeypatch.setattr(handler, "list_documents", FakeRegistry(_records(5)))
+        assert [d.document_id for d in handler.list_user_documents("u1")] == ["d0", "d1", "d2", "d3", "d4"]
+
+    def test_full_listing_empty_is_404(self, monkeypatch):
+        monkeypatch.setattr(handler, "list_documents", FakeRegistry([]))
+        with pytest.raises(HTTPException) as e:
+            handler.list_user_documents("u1")
+        assert e.value.status_code == 404
+
+
+class FakePurgeJob:
+    def __init__(self):
+        self.woken = 0
+
+    def wake(self):
+        self.woken += 1
+
+
+class TestDelete:
+    def test_marks_deleted_and_wakes_the_purge(self, monkeypatch):
+        job, invalidated = FakePurgeJob(), []
+        monkeypatch.setattr(handler, "mark_deleted", lambda **kw: 42)
+        monkeypatch.setattr(handler, "get_purge_job", lambda: job)
+        monkeypatch.setattr(handler.USER_INDEX_CACHE, "invalidate", invalidated.append)
+        assert handler.delete_user_document("u1", "d1") == 42
+        assert job.woken == 1
+        assert invalidated == ["u1"]
+
+    def test_unknown_document_is_404(self, monkeypatch):
+        monkeypatch.setattr(handler, "mark_deleted", lambda **kw: None)
+        with pytest.raises(HTTPException) as e:
+            handler.delete_user_document("u1", "missing")
+        assert e.value.status_code == 404
@@ -0,0 +1,104 @@
+"""Tests for retrieval/user_index.py — in-memory search and LRU cache, no DB needed."""
+import numpy as np
+
+from rag_app.retrieval.user_index import UserVectorIndex, UserIndexCache
+
+
+def _index(user_id: str = "u1", n: int = 4, dim: int = 3) -> UserVectorIndex:
+    rng = np.random.default_rng(0)
+    embeddings = [rng.normal(size=dim).astype(np.float32) for _ in range(n)]
+    return UserVectorIndex.build(
+        user_id=user_id,
+        ids=[f"c{i}" for i in range(n)],
+        embeddings=embeddings,
+        contents=[f"chunk {i}" for i in range(n)],
+        metadatas=[{"document_id": "d1" if i % 2 == 0 else "d2", "page_number": i} for i in range(n)],
+    )
+
+
+class TestUserVectorIndex:
+    def test_matrix_is_contiguous_float32_and_normalised(self):
+        idx = _index()
+        assert idx.matrix.dtype == np.float32
+        assert idx.matrix.flags["C_CONTIGUOUS"]
+        assert np.allclose(np.linalg.norm(idx.matrix, axis=1), 1.0)
+
+    def test_exact_match_ranks_first(self):
+        idx = _index()
+        hits = idx.search(idx.matrix[2] * 5, k=2)
+        assert hits.documents[0].id == "c2"
+        assert hits.similarities[0] > hits.similarities[1]
+        assert np.allclose(hits.embeddings[0], idx.matrix[2])
+
+    def test_document_filter(self):
+        idx = _index(n=6)
+        hits = idx.search(idx.matrix[1], k=6, document_id="d1")
+        assert {doc.metadata["document_id"] for doc in hits.documents} == {"d1"}
+        assert len(hits) == 3
+
+    def test_k_larger_than_index(self):
+        assert len(_index(n=3).search([1.0, 0.0, 0.0], k=10)) == 3
+
+    def test_empty_index(self):
+        idx = UserVectorIndex.build(user_id="u1", ids=[], embeddings=[], contents=[], metadatas=[])
+        assert len(idx.search([1.0, 0.0], k=5)) == 0
+
+
+class TestUserIndexCache:
+    def test_loaded_only_when_hot(self):
+        loads = []
+        cache = UserIndexCache(budget_bytes=10 ** 9, hot_threshold=2, loader=lambda u: loads.append(u) or _index(u))
+        assert cache.get("u1") is None
+        assert cache.get("u1") is not None
+        assert cache.get("u1") is not None
+        assert loads == ["u1"]
+
+    def test_lru_eviction_under_budget(self):
+        size = _index().size_bytes
+        cache = UserIndexCache(budget_bytes=2 * size, loader=_index)
+        cache.get("a")
+        cache.get("b")
+        cache.get("a")  # refresh a
+        cache.get("c")  # evicts b
+        assert "a" in cache and "c" in cache and "b" not in cache
+        assert cache.used_bytes <= 2 * size
+
+    def test_oversized_index_not_cached(self):
+        cache = UserIndexCache(budget_bytes=1, loader=_index)
+        assert cache.get("u1") is None
+        assert cache.used_bytes == 0
+
+    def test_oversized_index_not_reloaded_until_invalidated(self):
+        loads = []
+        cache = UserIndexCache(budget_bytes=1, loader=lambda u: loads.append(u) or _index(u))
+        assert cache.get("u1") is None and cache.get("u1") is None
+        assert loads == ["u1"]
+        cache.invalidate("u1")
+        assert cache.get("u1") is None
+        assert loads == ["u1", "u1"]
+        assert cache._load_locks == {}
+
+    def test_failed_load_retried_after_a_pause(self):
+        now = [0.0]
+        loads = []
+
+        def loader(user_id):
+            loads.append(user_id)
+            raise RuntimeError("db down")
+
+        cache = UserIndexCache(budget_bytes=10 ** 9, loader=loader, clock=lambda: now[0])
+        assert cache.get("u1") is None and cache.get("u1") is None
+        assert loads == ["u1"]
+        now[0] += 61
+        assert cache.get("u1") is None
+        assert loads == ["u1", "u1"]
+        assert cache._load_locks == {}
+
+    def test_invalidate_forces_reload(self):
+        loads = []
+        cache = UserIndexCache(budget_bytes=10 ** 9, loader=lambda u: loads.append(u) or _index(u))
+        cache.get("u1")
+        cache.invalidate("u1")
+        assert "u1" not in cache
+        cache.get("u1")
+        assert loads == ["u1", "u1"]
@@ -0,0 +1,115 @@
+"""Tests for web_api/workers.py and shared_generations.py — forked workers and cross-process invalidation."""
+import os
+import signal
+import time
+
+import pytest
+
+from rag_app.retrieval.user_index import UserIndexCache, UserVectorIndex
+from rag_app.shared_generations import SharedGenerations
+from rag_app.transcript import TranscriptCache
+from rag_app.web_api import workers
+from rag_app.web_api.workers import WorkerSupervisor
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+
+
+def _in_child(fn):
+    """Run `fn` in a forked child, as a worker would, and wait for it."""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            fn()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+
+
+def _wait_for(condition, supervisor, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        supervisor.tick()
+        time.sleep(0.02)
+
+
+class TestSharedGenerations:
+    def test_bump_in_a_child_is_seen_by_the_parent(self):
+        generations = SharedGenerations(slots=16)
+        before = generations.get("t1")
+        _in_child(lambda: generations.bump("t1"))
+        assert generations.get("t1") == before + 1
+
+    def test_transcript_page_invalidated_by_another_worker(self):
+        cache = TranscriptCache(max_threads=4, generations=SharedGenerations())
+        cache.put("t1", (None, 10), [], cache.generation("t1"))
+        assert cache.get("t1", (None, 10)) == []
+        _in_child(lambda: cache.invalidate("t1"))
+        assert cache.get("t1", (None, 10)) is None
+
+    def test_user_index_invalidated_by_another_worker(self):
+        loads = []
+
+        def loader(user_id):
+            loads.append(user_id)
+            return UserVectorIndex.build(user_id, ids=["a"], embeddings=[[1.0, 0.0]], contents=["x"],
+                                         metadatas=[{}])
+
+        cache = UserIndexCache(budget_bytes=1 << 20, loader=loader, generations=SharedGenerations())
+        assert cache.get("u1") is not None and cache.get("u1") is not None
+        _in_child(lambda: cache.invalidate("u1"))
+        assert cache.get("u1") is not None
+        assert loads == ["u1", "u1"]
+
+
+class TestWorkerSupervisor:
+    def test_exited_worker_is_replaced_with_its_index(self, tmp_path):
+        def target(index):
+            (tmp_path / f"{index}-{os.getpid()}").touch()
+            if index == 1 and len(list(tmp_path.glob("1-*"))) == 1:
+                return  # first worker 1 exits at once, like a recycled worker
+            time.sleep(30)
+
+        supervisor = WorkerSupervisor(target, workers=2, graceful_timeout=2.0)
+        try:
+            supervisor.start()
+            _wait_for(lambda: len(list(tmp_path.glob("1-*"))) == 2, supervisor)
+            assert sorted(index for index, _ in supervisor.children.values()) == [0, 1]
+        finally:
+            supervisor.shutdown()
+        assert supervisor.children == {}
+        assert len(list(tmp_path.glob("0-*"))) == 1
+
+    def test_recycle_replaces_every_worker(self):
+        supervisor = WorkerSupervisor(lambda index: time.sleep(30), workers=2, graceful_timeout=2.0)
+        try:
+            supervisor.start()
+            first = set(supervisor.children)
+            supervisor.recycle()
+            _wait_for(lambda: len(supervisor.children) == 2 and not first & set(supervisor.children), supervisor)
+        finally:
+            supervisor.shutdown()
+
+    def test_shutdown_kills_workers_ignoring_sigterm(self, monkeypatch):
+        monkeypatch.setattr(workers, "_LIFESPAN_SHUTDOWN_SECONDS", 0.2)
+
+        def target(index):
+            signal.signal(signal.SIGTERM, signal.SIG_IGN)
+            time.sleep(30)
+
+        supervisor = WorkerSupervisor(target, workers=1, graceful_timeout=0.0)
+        supervisor.start()
+        time.sleep(0.1)
+        start = time.monotonic()
+        supervisor.shutdown()
+        assert supervisor.children == {}
+        assert time.monotonic() - start < 2
+
+
+class TestBackgroundJobs:
+    def test_only_worker_zero(self, monkeypatch):
+        assert workers.runs_background_jobs()
+        monkeypatch.setattr(workers, "_worker_index", 0)
+        assert workers.runs_background_jobs()
+        monkeypatch.setattr(workers, "_worker_index", 1)
+        assert not workers.runs_background_jobs()